@@ -6,6 +6,8 @@ from urllib.parse import (
 )
 
 from dateutil import parser as date_parser
+from django.conf import settings
+from django.db.models import Q
 from django.views.generic.list import BaseListView
 from django.views.generic.base import View, TemplateResponseMixin
 
@@ -69,15 +71,18 @@ class OAIPaginationMixin(View):
     The resumptionToken is a query parameter that allows a consumer of the OAI
     interface to resume consuming elements of a listed query when the bounds
     of such list are larger than the maximum number of records allowed per
-    response. This is achieved by encoding the page number details in the
-    querystring as the resumptionToken itself.
+    response. This is achieved by encoding a cursor (the date_published and pk
+    of the last record returned) in the querystring as the resumptionToken
+    itself, so that the next batch can be fetched without an OFFSET scan.
     Furthermore, any filters provided as queryparams need to be encoded
     into the resumptionToken as per the spec, it is not mandatory for the
     consumer to provide filters on subsequent queries for the same list. This
     is addressed in the `dispatch` method where we have no option but to mutate
     the self.request.GET member in order to inject those querystring filters.
     """
-    page_kwarg = "token_page"
+    cursor_fields = ("date_published", "pk")
+    # Page size of the tokens issued before cursors were introduced
+    legacy_page_size = 50
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -96,27 +101,47 @@ class OAIPaginationMixin(View):
                 self.request.GET[key] = value
         return super().dispatch(*args, **kwargs)
 
+    def get_batch_size(self):
+        return settings.OAI_BATCH_SIZE
+
     def get_context_data(self, **kwargs):
-        self.kwargs["token_page"] = self.page
-        context = super().get_context_data(**kwargs)
-        if context["is_paginated"] and context["page_obj"].has_next():
+        queryset = kwargs.pop("object_list", self.object_list)
+        queryset = queryset.order_by(*self.cursor_fields)
+        batch_size = self.get_batch_size()
+
+        cursor = self.cursor
+        if cursor:
+            date_published, pk = cursor
+            queryset = queryset.filter(
+                Q(date_published__gt=date_published)
+                | Q(date_published=date_published, pk__gt=pk)
+            )
+        elif self.page:
+            start = (self.page - 1) * self.legacy_page_size
+            queryset = queryset[start:]
+
+        # Fetch one extra record to find out if there is a next batch
+        records = list(queryset[:batch_size + 1])
+        has_next = len(records) > batch_size
+        context = super().get_context_data(
+            object_list=records[:batch_size],
+            **kwargs
+        )
+        if has_next:
             context["resumption_token"] = self.encode_token(context)
-            total_items = context["paginator"].count
-            if total_items == 0:
-                raise exceptions.OAINoRecordsMatch()
-            context["total"] = total_items
         return context
 
     def get_token_context(self, context):
+        last = context["object_list"][-1]
         return {
-                "page": context["page_obj"].next_page_number(),
+            "cursor": "{},{}".format(last.date_published.isoformat(), last.pk),
         }
 
     def encode_token(self, context):
         token_data = {}
         for key, value in self.request.GET.items():
             # verb is an exception as per OAI spec
-            if key not in {'resumptionToken', "verb"}:
+            if key not in {'resumptionToken', "verb", "page"}:
                 token_data[key] = value
         token_data.update(self.get_token_context(context))
 
@@ -130,10 +155,24 @@ class OAIPaginationMixin(View):
             except ValueError:
                 raise exceptions.OAIBadToken()
 
+    @property
+    def cursor(self):
+        if self._decoded_token and "cursor" in self._decoded_token:
+            try:
+                date_str, pk = self._decoded_token["cursor"].rsplit(",", 1)
+                return date_parser.parse(date_str), int(pk)
+            except ValueError:
+                raise exceptions.OAIBadToken()
+        return None
+
     @property
     def page(self):
+        """ The page number of tokens issued before cursors were introduced"""
         if self._decoded_token:
-            return int(self._decoded_token.get("page", 1))
+            try:
+                return int(self._decoded_token.get("page", 1))
+            except ValueError:
+                raise exceptions.OAIBadToken()
         return None
 
 
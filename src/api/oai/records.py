@@ -0,0 +1,144 @@
+"""
+Rendering and caching of the OAI-PMH record fragments for articles.
+
+Records are rendered on their own, without context processors, and cached
+per article. The cache key includes the article's effective_last_modified
+date, so changes to an article or its related objects invalidate its records,
+and the versions of the settings, journal and press they also show.
+"""
+import os
+from hashlib import sha1
+from xml.dom import minidom
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from utils import setting_handler
+from utils.function_cache import get_tag_versions, model_tag
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RECORD_TEMPLATES = {
+    'oai_dc': 'apis/OAI_record.xml',
+    'jats': 'apis/OAI_record_jats_stub.xml',
+}
+HEADER_TEMPLATE = 'apis/OAI_record_header.xml'
+
+
+def _site_key(request):
+    """ Records link to the site they were requested from"""
+    journal = getattr(request, 'journal', None)
+    site = '{}:{}'.format(
+        request.get_host(),
+        journal.pk if journal else '',
+    )
+    return sha1(site.encode('utf-8')).hexdigest()
+
+
+def get_journal_versions(journal_id):
+    """ Returns the versions of the data records show besides their article:
+    the settings of its journal (e.g. its name and ISSN), the journal itself
+    and the press
+    """
+    from journal import models as journal_models
+    from press import models as press_models
+
+    return [setting_handler.get_setting_cache_version()] + get_tag_versions([
+        '{}:{}'.format(model_tag(journal_models.Journal), journal_id),
+        model_tag(press_models.Press),
+    ])
+
+
+def get_record_cache_key(template_name, article, request, versions=None):
+    last_modified = article.effective_last_modified or article.last_modified
+    if versions is None:
+        versions = get_journal_versions(article.journal_id)
+    return 'oai_record:{}:{}:{}:{}:{}'.format(
+        template_name,
+        article.pk,
+        last_modified.timestamp() if last_modified else '',
+        _site_key(request),
+        versions,
+    )
+
+
+def render_record(template_name, article, request):
+    """ Renders a single record fragment for the given article
+    :param template_name: The record template, e.g. RECORD_TEMPLATES['jats']
+    :param article: A submission.models.Article
+    :param request: The HttpRequest the record is rendered for
+    :return: The rendered record as a string
+    """
+    return render_to_string(
+        template_name,
+        {
+            'article': article,
+            'journal': getattr(request, 'journal', None),
+            'request': request,
+        },
+    )
+
+
+def iter_records(template_name, articles, request):
+    """ Yields the rendered record for each article, from the cache if
+    possible. Cached records are fetched for the whole batch at once.
+    :param template_name: The record template, e.g. RECORD_TEMPLATES['jats']
+    :param articles: An iterable of submission.models.Article
+    :param request: The HttpRequest the records are rendered for
+    """
+    versions = {}
+    keys = []
+    for article in articles:
+        if article.journal_id not in versions:
+            versions[article.journal_id] = get_journal_versions(
+                article.journal_id,
+            )
+        keys.append(get_record_cache_key(
+            template_name, article, request, versions[article.journal_id],
+        ))
+    cached = cache.get_many(keys)
+    for key, article in zip(keys, articles):
+        record = cached.get(key)
+        if record is None:
+            record = render_record(template_name, article, request)
+            cache.set(key, record, settings.OAI_RECORD_CACHE_TIMEOUT)
+        yield record
+
+
+def get_record(template_name, article, request):
+    """ Returns the rendered record for a single article"""
+    return next(iter_records(template_name, [article], request))
+
+
+def get_jats(article):
+    """
+    Fetches the JATS XML of the article's render galley, if it has one.
+    The parsed document is cached against the galley file's mtime.
+    @param article: the article on which to operate
+    @return: JATS XML (bytes) or None
+    """
+    render_galley = article.get_render_galley
+    if not render_galley:
+        return None
+    path = render_galley.file.get_file_path(article)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    key = 'oai_jats:{}:{}:{}'.format(article.pk, render_galley.file.pk, mtime)
+    jats = cache.get(key)
+    if jats is None:
+        jats = b''
+        with open(path, 'r') as galley:
+            contents = galley.read()
+        if 'DTD JATS' in contents:
+            # assume this is a JATS XML file
+            # we need to strip the XML header, though
+            domified_xml = minidom.parseString(contents)
+            jats = domified_xml.documentElement.toxml('utf-8')
+        # Non JATS galleys are cached as an empty string
+        cache.set(key, jats, settings.OAI_RECORD_CACHE_TIMEOUT)
+    return jats or None
@@ -1,20 +1,24 @@
 """
 A django implementation of the OAI-PMH interface
 """
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.views.generic.base import TemplateView
 
-from api.oai import exceptions
+from api.oai import exceptions, records
 from api.oai.base import OAIPagedModelView, metadata_formats
 from identifiers.models import Identifier
 from submission import models as submission_models
 from utils.upgrade import shared
 from journal import models as journal_models
-from xml.dom import minidom
 
 # We default `verb` to ListRecords for backwards compatibility.
 DEFAULT_ENDPOINT = "ListRecords"
 DEFAULT_METADATA_PREFIX = 'oai_dc'
+# Marks where the records are streamed into the rendered list template
+RECORDS_PLACEHOLDER = "OAI-RECORDS-PLACEHOLDER"
 
 
 def oai_view_factory(request, *args, **kwargs):
@@ -38,11 +42,15 @@ def oai_view_factory(request, *args, **kwargs):
 
 
 class OAIListRecords(OAIPagedModelView):
+    """ Streams a batch of records
+
+    The list template is rendered with a placeholder for the records, which
+    are then streamed in one at a time from the record cache.
+    """
 
     # default is OAI_DC
     template_name = "apis/OAI_ListRecords.xml"
     queryset = submission_models.Article.objects.all()
-    paginate_by = 50
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -103,8 +111,37 @@ class OAIListRecords(OAIPagedModelView):
         context = super().get_context_data(*args, **kwargs)
         context["verb"] = self.request.GET.get("verb", DEFAULT_ENDPOINT)
         context["metadataPrefix"] = self.request.GET.get("metadataPrefix", DEFAULT_METADATA_PREFIX)
+        context["records"] = RECORDS_PLACEHOLDER
         return context
 
+    def get_record_template_name(self, metadata_prefix):
+        return records.RECORD_TEMPLATES.get(metadata_prefix)
+
+    def render_to_response(self, context, **response_kwargs):
+        rendered = render_to_string(
+            self.get_template_names(), context, request=self.request,
+        )
+        template_name = self.get_record_template_name(
+            context["metadataPrefix"],
+        )
+        return StreamingHttpResponse(
+            self.stream(rendered, template_name, context["object_list"]),
+            content_type=self.content_type,
+        )
+
+    def stream(self, rendered, template_name, articles):
+        if RECORDS_PLACEHOLDER not in rendered:
+            # The template renders the records itself
+            yield rendered
+            return
+        head, tail = rendered.split(RECORDS_PLACEHOLDER, 1)
+        yield head
+        if template_name:
+            yield from records.iter_records(
+                template_name, articles, self.request,
+            )
+        yield tail
+
 
 class OAIGetRecord(TemplateView):
     template_name = "apis/OAI_GetRecord.xml"
@@ -116,6 +153,11 @@ class OAIGetRecord(TemplateView):
         context["verb"] = self.request.GET.get("verb")
         context["metadataPrefix"] = self.request.GET.get("metadataPrefix", DEFAULT_METADATA_PREFIX)
         context["jats"], context["stub"] = self.get_jats(context["article"])
+        template_name = records.RECORD_TEMPLATES.get(context["metadataPrefix"])
+        if template_name:
+            context["record"] = mark_safe(records.get_record(
+                template_name, context["article"], self.request,
+            ))
         return context
 
     def get_jats(self, article):
@@ -125,24 +167,13 @@ class OAIGetRecord(TemplateView):
         @return: JATS XML or a metadata stub, True or False for whether this is
         a stub (False = full JATS, True = stub only)
         """
-        render_galley = article.get_render_galley
-
-        # check if this is a JATS XML file
         try:
-            if render_galley:
-                with open(render_galley.file.get_file_path(article),
-                          'r') as galley:
-                    contents = galley.read()
-
-                    if 'DTD JATS' in contents:
-                        # assume this is a JATS XML file
-                        # we need to strip the XML header, though
-                        domified_xml = minidom.parseString(contents)
-                        return domified_xml.documentElement.toxml('utf-8'), \
-                               False
-        except:
+            jats = records.get_jats(article)
+        except Exception:
             # a broad catch that lets us generate a stub if anything goes wrong
-            pass
+            jats = None
+        if jats:
+            return jats, False
 
         return None, True
 
@@ -176,6 +207,9 @@ class OAIGetRecord(TemplateView):
 class OAIListIdentifiers(OAIListRecords):
     template_name = "apis/OAI_ListIdentifiers.xml"
 
+    def get_record_template_name(self, metadata_prefix):
+        return records.HEADER_TEMPLATE
+
 
 class OAIListMetadataFormats(TemplateView):
     template_name = 'apis/OAI_ListMetadataFormats.xml'
@@ -4,6 +4,7 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 from urllib.parse import unquote_plus
+from django.core.cache import cache
 from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.utils.http import urlencode
@@ -11,8 +12,10 @@ from django.utils.http import urlencode
 from freezegun import freeze_time
 from lxml import etree
 
+from api.oai import records
 from api.oai.base import OAIPaginationMixin
 from submission import models as sm_models
+from utils import setting_handler
 from utils.testing import helpers
 
 
@@ -49,13 +52,16 @@ class TestOAIViews(TestCase):
         xml_dom = etree.XML(xml)
         return xml_schema.validate(xml_dom)
 
+    @staticmethod
+    def streamed_content(response):
+        return b"".join(response.streaming_content).decode("utf-8")
 
     @override_settings(URL_CONFIG="domain")
     @freeze_time("2012-01-14")
     def test_list_records_dc(self):
         expected = LIST_RECORDS_DATA_DC
         response = self.client.get(reverse('OAI_list_records'), SERVER_NAME="testserver")
-        self.assertEqual(str(response.rendered_content).split(), expected.split())
+        self.assertEqual(self.streamed_content(response).split(), expected.split())
 
     @override_settings(URL_CONFIG="domain")
     @freeze_time("2012-01-14")
@@ -71,7 +77,7 @@ class TestOAIViews(TestCase):
             f'{path}?{query_string}',
             SERVER_NAME="testserver"
         )
-        self.assertEqual(str(response.rendered_content).split(), expected.split())
+        self.assertEqual(self.streamed_content(response).split(), expected.split())
 
     @override_settings(URL_CONFIG="domain")
     @freeze_time("2012-01-14")
@@ -126,7 +132,7 @@ class TestOAIViews(TestCase):
             SERVER_NAME="testserver"
         )
 
-        self.assertEqual(str(response.rendered_content).split(), expected.split())
+        self.assertEqual(self.streamed_content(response).split(), expected.split())
 
     @override_settings(URL_CONFIG="domain")
     @freeze_time("2012-01-14")
@@ -165,7 +171,7 @@ class TestOAIViews(TestCase):
             SERVER_NAME="testserver"
         )
 
-        self.assertEqual(str(response.rendered_content).split(), expected.split())
+        self.assertEqual(self.streamed_content(response).split(), expected.split())
 
     @override_settings(URL_CONFIG="domain")
     @freeze_time("2012-01-14")
@@ -251,6 +257,85 @@ class TestOAIViews(TestCase):
             "Query parameter has not been encoded into resumption_token",
         )
 
+    @override_settings(URL_CONFIG="domain", OAI_BATCH_SIZE=2)
+    @freeze_time("1980-01-01")
+    def test_oai_resumption_token_cursor(self):
+        # Articles sharing a date_published are ordered by pk
+        for i in range(4):
+            helpers.create_submission(
+                journal_id=self.journal.pk,
+                stage=sm_models.STAGE_PUBLISHED,
+                date_published="1976-07-12T17:00:00.000+0200",
+                authors=[self.author],
+            )
+        path = reverse('OAI_list_records')
+        query_params = dict(verb="ListIdentifiers", metadataPrefix="oai_dc")
+        identifiers = []
+        while True:
+            response = self.client.get(path, query_params)
+            xml = etree.XML(self.streamed_content(response).encode("utf-8"))
+            namespaces = {"oai": "http://www.openarchives.org/OAI/2.0/"}
+            batch = xml.xpath("//oai:identifier/text()", namespaces=namespaces)
+            self.assertLessEqual(len(batch), 2)
+            identifiers.extend(batch)
+            token = xml.xpath(
+                "//oai:resumptionToken/text()", namespaces=namespaces,
+            )
+            if not token:
+                break
+            self.assertIn("cursor", unquote_plus(token[0]))
+            query_params = dict(verb="ListIdentifiers", resumptionToken=token[0])
+
+        expected = [
+            "oai:TST:id:{}".format(article.pk)
+            for article in sm_models.Article.objects.filter(
+                journal=self.journal,
+                date_published__year=1976,
+            ).order_by("date_published", "pk")
+        ]
+        self.assertEqual(identifiers, expected)
+
+    @override_settings(URL_CONFIG="domain", OAI_RECORD_CACHE_TIMEOUT=60)
+    def test_record_cache_invalidated_by_last_modified(self):
+        cache.clear()
+        request = RequestFactory().get("/api/oai/")
+        request.journal = self.journal
+        template_name = records.RECORD_TEMPLATES["oai_dc"]
+
+        record = records.get_record(template_name, self.article, request)
+        self.assertIn("A Test Article", record)
+
+        sm_models.Article.objects.filter(pk=self.article.pk).update(
+            title="A Cached Title",
+        )
+        article = sm_models.Article.objects.get(pk=self.article.pk)
+        self.assertEqual(
+            records.get_record(template_name, article, request), record,
+        )
+
+        article.save()
+        self.assertIn(
+            "A Cached Title",
+            records.get_record(template_name, article, request),
+        )
+
+    @override_settings(URL_CONFIG="domain", OAI_RECORD_CACHE_TIMEOUT=60)
+    def test_record_cache_invalidated_by_journal_settings(self):
+        cache.clear()
+        request = RequestFactory().get("/api/oai/")
+        request.journal = self.journal
+        template_name = records.RECORD_TEMPLATES["oai_dc"]
+        records.get_record(template_name, self.article, request)
+
+        setting_handler.save_setting(
+            "general", "publisher_name", self.journal, "Voyager Press",
+        )
+
+        self.assertIn(
+            "<dc:publisher>Voyager Press</dc:publisher>",
+            records.get_record(template_name, self.article, request),
+        )
+
 
 LIST_RECORDS_DATA_DC = """
     <?xml version="1.0" encoding="UTF-8"?>
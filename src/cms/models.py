@@ -12,6 +12,7 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
 
+from cms import nav_cache
 from core.file_system import JanewayFileSystemStorage
 from utils.logic import build_url_for_request
 
@@ -64,6 +65,9 @@ class NavigationItem(models.Model):
         return self.link_name
 
     def sub_nav_items(self):
+        # Attached to the items of the cached navigation tree
+        if hasattr(self, '_sub_nav_items'):
+            return self._sub_nav_items
         return NavigationItem.objects.filter(top_level_nav=self)
 
     @property
@@ -185,3 +189,12 @@ class MediaFile(models.Model):
         return build_url_for_request(
             path=self.file.url,
         )
+
+
+for model in (Page, NavigationItem):
+    models.signals.post_save.connect(
+        nav_cache.invalidate_site_navigation, sender=model,
+    )
+    models.signals.post_delete.connect(
+        nav_cache.invalidate_site_navigation, sender=model,
+    )
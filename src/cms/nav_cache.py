@@ -0,0 +1,97 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+The navigation of each site, loaded in one query and kept in the cache.
+
+The NavigationItems of a journal, repository or press are read together and
+arranged into a tree: the top level items, each with its sub navigation
+items attached so that NavigationItem.sub_nav_items doesn't query the
+database. The tree is kept in the shared cache and memoized on the current
+request, under a tag that is invalidated whenever a NavigationItem or Page
+of the site is saved or deleted.
+"""
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+
+from utils import request_cache
+from utils.function_cache import get_tag_versions, invalidate_tags
+
+NAMESPACE = 'nav_cache'
+KEY_PREFIX = 'nav_cache'
+
+
+def navigation_tag(content_type_id, object_id):
+    return 'cms.navigation:{}:{}'.format(content_type_id, object_id)
+
+
+def load_navigation(content_type_id, object_id):
+    """ Returns the top level NavigationItems of a site from the database,
+    with their sub navigation items attached
+    """
+    from cms import models
+
+    items = list(
+        models.NavigationItem.objects.filter(
+            content_type_id=content_type_id,
+            object_id=object_id,
+        ).order_by('sequence', 'pk')
+    )
+    children = {}
+    for item in items:
+        item._sub_nav_items = children.setdefault(item.pk, [])
+    top_nav_items = []
+    for item in items:
+        if item.top_level_nav_id is None:
+            top_nav_items.append(item)
+        elif item.top_level_nav_id in children:
+            children[item.top_level_nav_id].append(item)
+    return top_nav_items
+
+
+def get_navigation(content_type, object_id):
+    """ Returns the top level NavigationItems of a site
+    :param content_type: The ContentType of the site model
+    :param object_id: The pk of the journal, repository or press
+    :return: A list of NavigationItems
+    """
+    site_key = (content_type.pk, object_id)
+    memo = request_cache.get_cache(NAMESPACE)
+    if memo is not None and site_key in memo:
+        return memo[site_key]
+
+    tag = navigation_tag(*site_key)
+    key = '{}:{}:{}:{}'.format(
+        KEY_PREFIX, content_type.pk, object_id, get_tag_versions([tag])[0],
+    )
+    top_nav_items = None
+    if settings.NAVIGATION_CACHE_TIMEOUT:
+        top_nav_items = django_cache.get(key)
+    if top_nav_items is None:
+        top_nav_items = load_navigation(*site_key)
+        if settings.NAVIGATION_CACHE_TIMEOUT:
+            django_cache.set(
+                key, top_nav_items, settings.NAVIGATION_CACHE_TIMEOUT,
+            )
+
+    if memo is not None:
+        memo[site_key] = top_nav_items
+    return top_nav_items
+
+
+def invalidate_navigation(content_type_id, object_id):
+    """ Discards the cached navigation of a site"""
+    invalidate_tags(navigation_tag(content_type_id, object_id))
+    memo = request_cache.get_cache(NAMESPACE)
+    if memo is not None:
+        memo.pop((content_type_id, object_id), None)
+
+
+def invalidate_site_navigation(sender, instance, raw=False, **kwargs):
+    """ Signal receiver for saved and deleted NavigationItems and Pages"""
+    if raw or instance.content_type_id is None:
+        return
+    invalidate_navigation(instance.content_type_id, instance.object_id)
@@ -15,3 +15,17 @@ class CoreConfig(AppConfig):
         from core.model_utils import SearchLookup
         models.CharField.register_lookup(SearchLookup)
         models.TextField.register_lookup(SearchLookup)
+
+        from core import routing
+        for model in (
+            'journal.Journal',
+            'repository.Repository',
+            'press.Press',
+            'core.DomainAlias',
+        ):
+            for signal in (models.signals.post_save, models.signals.post_delete):
+                signal.connect(
+                    routing.invalidate_routing_table,
+                    sender=model,
+                    dispatch_uid='invalidate_routing_table',
+                )
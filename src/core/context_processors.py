@@ -7,7 +7,7 @@ from django.core.exceptions import ObjectDoesNotExist
 
 from journal import models as journal_models
 from press import models as press_models
-from cms import models as cms_models
+from cms import nav_cache
 from core import logic
 
 
@@ -71,8 +71,9 @@ def navigation(request):
     :param request: the active request
     :return: the active path that corresponds to this request or an empty string if at root
     """
-    top_nav_items = cms_models.NavigationItem.objects.filter(content_type=request.model_content_type,
-                                                             object_id=request.site_type.pk,
-                                                             top_level_nav__isnull=True).order_by('sequence')
+    top_nav_items = nav_cache.get_navigation(
+        request.model_content_type,
+        request.site_type.pk,
+    )
 
     return {'navigation_items': top_nav_items}
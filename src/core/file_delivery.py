@@ -0,0 +1,239 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+Delivery of files stored under files/ to the browser.
+
+Views run their permission checks and then hand the path of the file over
+to the backend set by FILE_DELIVERY_BACKEND:
+
+    core.file_delivery.PythonBackend: streams the file from the worker,
+        answering single byte ranges and conditional requests.
+    core.file_delivery.XAccelRedirectBackend: nginx sends the file from the
+        internal location FILE_DELIVERY_INTERNAL_URL, mapped to files/.
+    core.file_delivery.XSendfileBackend: Apache's mod_xsendfile (or
+        lighttpd) sends the file.
+
+With the last two the worker is free as soon as the headers are built, and
+the web server deals with ranges, conditional requests and slow clients.
+Files outside of files/ are always streamed by Python.
+"""
+
+import hashlib
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.module_loading import import_string
+
+FILE_CHUNK_SIZE = 64 * 1024
+FILES_ROOT = os.path.join(settings.BASE_DIR, 'files')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_etag(stat):
+    """ Returns the entity tag of a file from its size and modification time
+
+    Hashing the contents would mean reading the whole file on every request,
+    and files are always rewritten when they are replaced.
+    :param stat: The os.stat_result of the file
+    """
+    return quote_etag(hashlib.md5(
+        '{}-{}'.format(stat.st_size, stat.st_mtime_ns).encode('utf-8'),
+    ).hexdigest())
+
+
+def parse_range(header, size):
+    """ Parses a Range header asking for a single range of bytes
+    :param header: The value of the Range header
+    :param size: The size of the file
+    :return: A (first byte, last byte) tuple, None when the header is missing
+        or unsupported, so that the whole file is sent, or False when none of
+        the bytes asked for exist.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # A suffix range, e.g. bytes=-500 for the last 500 bytes
+        length = int(end)
+        if not length or not size:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+class FileIterator(object):
+    """ Iterates over the bytes of a file, from an offset and up to a length
+
+    Closed by the response once sent, which closes the file.
+    """
+    def __init__(self, file_, start, length, chunk_size=FILE_CHUNK_SIZE):
+        self.file = file_
+        self.remaining = length
+        self.chunk_size = chunk_size
+        self.file.seek(start)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.remaining <= 0:
+            raise StopIteration
+        chunk = self.file.read(min(self.chunk_size, self.remaining))
+        if not chunk:
+            raise StopIteration
+        self.remaining -= len(chunk)
+        return chunk
+
+    def close(self):
+        self.file.close()
+
+
+class FileDeliveryBackend(object):
+    def serve(self, request, file_path, content_type):
+        """ Returns a response delivering a file
+        :param request: HttpRequest object or None
+        :param file_path: The absolute path of the file
+        :param content_type: The mime type of the file
+        :raises: FileNotFoundError when the file doesn't exist
+        """
+        raise NotImplementedError
+
+
+class PythonBackend(FileDeliveryBackend):
+    """ Streams files from the worker"""
+
+    def serve(self, request, file_path, content_type):
+        file_ = open(file_path, 'rb')
+        try:
+            stat = os.fstat(file_.fileno())
+            etag = get_etag(stat)
+            last_modified = http_date(stat.st_mtime)
+            response = None
+            file_range = None
+            if request is not None:
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=int(stat.st_mtime),
+                )
+                file_range = parse_range(
+                    request.META.get('HTTP_RANGE'), stat.st_size,
+                )
+                if_range = request.META.get('HTTP_IF_RANGE')
+                if if_range and if_range not in {etag, last_modified}:
+                    # The client's copy is stale, it needs the whole file
+                    file_range = None
+        except BaseException:
+            file_.close()
+            raise
+
+        if response is not None:
+            file_.close()
+        elif file_range is False:
+            file_.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+        elif file_range:
+            start, end = file_range
+            response = StreamingHttpResponse(
+                FileIterator(file_, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(
+                start, end, stat.st_size,
+            )
+            response['Content-Length'] = end - start + 1
+        else:
+            response = StreamingHttpResponse(
+                FileIterator(file_, 0, stat.st_size),
+                content_type=content_type,
+            )
+            response['Content-Length'] = stat.st_size
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        return response
+
+
+class OffloadBackend(FileDeliveryBackend):
+    """ Hands files over to the web server with a header"""
+    header = None
+
+    def get_header_value(self, file_path):
+        raise NotImplementedError
+
+    def serve(self, request, file_path, content_type):
+        real_path = os.path.realpath(file_path)
+        if os.path.commonpath(
+            [real_path, os.path.realpath(FILES_ROOT)],
+        ) != os.path.realpath(FILES_ROOT):
+            return PythonBackend().serve(request, file_path, content_type)
+        # Views rely on missing files raising, as the Python backend does
+        os.stat(real_path)
+        response = HttpResponse(content_type=content_type)
+        response[self.header] = self.get_header_value(real_path)
+        return response
+
+
+class XAccelRedirectBackend(OffloadBackend):
+    """ Lets nginx send files. Requires an internal location, e.g.:
+
+        location /internal-files/ {
+            internal;
+            alias /path/to/janeway/src/files/;
+        }
+    """
+    header = 'X-Accel-Redirect'
+
+    def get_header_value(self, file_path):
+        relative_path = os.path.relpath(
+            file_path, os.path.realpath(FILES_ROOT),
+        )
+        return '{}/{}'.format(
+            settings.FILE_DELIVERY_INTERNAL_URL.rstrip('/'),
+            quote(relative_path.replace(os.sep, '/')),
+        )
+
+
+class XSendfileBackend(OffloadBackend):
+    """ Lets Apache's mod_xsendfile send files. Requires XSendFile On and
+    XSendFilePath set to the files/ directory.
+    """
+    header = 'X-Sendfile'
+
+    def get_header_value(self, file_path):
+        return file_path
+
+
+def get_backend():
+    return import_string(settings.FILE_DELIVERY_BACKEND)()
+
+
+def file_response(request, file_path, content_type, encoding=None):
+    """ Returns a response delivering a file with the configured backend
+    :param request: HttpRequest object, used to answer ranges and conditional
+        requests. Can be None.
+    :param file_path: The path of the file
+    :param content_type: The mime type of the file
+    :param encoding: The Content-Encoding of the file, e.g. gzip
+    :raises: FileNotFoundError when the file doesn't exist
+    """
+    response = get_backend().serve(request, file_path, content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
@@ -10,6 +10,8 @@ from uuid import uuid4
 from wsgiref.util import FileWrapper
 from lxml import etree
 import shutil
+import tempfile
+import zipfile
 import magic
 import hashlib
 
@@ -17,8 +19,9 @@ from bs4 import BeautifulSoup
 from django.conf import settings
 from django.contrib import messages
 from django.http import Http404
-from django.http import StreamingHttpResponse, HttpResponseRedirect, HttpResponse
+from django.http import StreamingHttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
 from django.utils.html import strip_tags
 from django.utils.text import slugify
 from django.views.decorators.cache import patch_cache_control
@@ -29,6 +32,7 @@ from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfparser import PDFParser
 
+from core import file_delivery, xslt
 from utils import models as util_models
 from utils.logger import get_logger
 
@@ -347,17 +351,17 @@ def transform_with_xsl(xml_path, xsl_path, recover=False):
             xml_dom = etree.parse(xml_path, parser=parser)
         else:
             raise
-    xsl_transform = etree.XSLT(etree.parse(xsl_path))
-    try:
-        transformed_dom = xsl_transform(xml_dom)
-        return transformed_dom
-    except Exception as err:
-        logger.error(err)
-        for xsl_error in xsl_transform.error_log:
-            logger.error(xsl_error)
-        if not recover:
-            raise
-        return ''
+    with xslt.stylesheet(xsl_path) as xsl_transform:
+        try:
+            transformed_dom = xsl_transform(xml_dom)
+            return transformed_dom
+        except Exception as err:
+            logger.error(err)
+            for xsl_error in xsl_transform.error_log:
+                logger.error(xsl_error)
+            if not recover:
+                raise
+            return ''
 
 
 def serve_any_file(request, file_to_serve, public=False, hide_name=False,
@@ -376,6 +380,7 @@ def serve_any_file(request, file_to_serve, public=False, hide_name=False,
             file_to_serve,
             public=public,
             hide_name=hide_name,
+            request=request,
         )
     except IOError:
         messages.add_message(request, messages.ERROR, 'File not found. {0}'.format(file_path))
@@ -407,30 +412,26 @@ def serve_file(request, file_to_serve, article, public=False, hide_name=False):
 # URL, which leads to browsers wrongly serving the old cached version.
 # @cache_control(max_age=600)
 def serve_file_to_browser(file_path, file_to_serve, public=False,
-                          hide_name=False):
-    """ Stream a file to the browser in a safe way
+                          hide_name=False, request=None):
+    """ Delivers a file to the browser with the FILE_DELIVERY_BACKEND
 
     :param file_path: the path on disk to the file
     :param file_to_serve: the core.models.File object to serve
     :param public: boolean
     :param hide_name: boolean
-    :return: HttpStreamingResponse object
+    :param request: HttpRequest object, used to answer range and conditional
+        requests
+    :return: HttpResponse or StreamingHttpResponse object
     """
-    # stream the response to the browser
     # we use the UUID filename to avoid any security risks of putting user content in headers
-    # we set a chunk size of 8192 so that the entire file isn't loaded into memory if it's large
     filename, extension = os.path.splitext(file_to_serve.original_filename)
 
+    response = file_delivery.file_response(
+        request, file_path, file_to_serve.mime_type,
+    )
     if file_to_serve.mime_type in IMAGE_MIMETYPES:
-        response = HttpResponse(
-            FileWrapper(open(file_path, 'rb'), 8192),
-            content_type=file_to_serve.mime_type,
-        )
         patch_cache_control(response, max_age=600)
-    else:
-        response = StreamingHttpResponse(FileWrapper(open(file_path, 'rb'), 8192), content_type=file_to_serve.mime_type)
 
-    response['Content-Length'] = os.path.getsize(file_path)
     if public:
         response['Content-Disposition'] = 'attachment; filename="{0}"'.format(file_to_serve.public_download_name())
     elif hide_name:
@@ -460,11 +461,7 @@ def serve_pdf_galley_to_browser(request, file, article):
     )
 
     try:
-        response = HttpResponse(
-            FileWrapper(open(file_path, 'rb')),
-            content_type=file.mime_type
-        )
-        return response
+        return file_delivery.file_response(request, file_path, file.mime_type)
     except IOError:
         messages.add_message(request, messages.ERROR, 'File not found.')
         raise Http404
@@ -611,7 +608,9 @@ def serve_journal_cover(request, file_to_serve):
                              str(file_to_serve.uuid_filename))
 
     try:
-        response = serve_file_to_browser(file_path, file_to_serve)
+        response = serve_file_to_browser(
+            file_path, file_to_serve, request=request,
+        )
         return response
     except IOError:
         messages.add_message(request, messages.ERROR, 'File not found. {0}'.format(file_path))
@@ -630,7 +629,9 @@ def serve_press_cover(request, file_to_serve):
     file_path = os.path.join(settings.BASE_DIR, 'files', 'press', str(file_to_serve.uuid_filename))
 
     try:
-        response = serve_file_to_browser(file_path, file_to_serve)
+        response = serve_file_to_browser(
+            file_path, file_to_serve, request=request,
+        )
         return response
     except IOError:
         messages.add_message(request, messages.ERROR, 'File not found. {0}'.format(file_path))
@@ -805,6 +806,152 @@ def zip_article_files(files, article_folders=False):
     return zip_path, file_name
 
 
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStream(object):
+    """ A write-only file object collecting the output of a ZipFile, which
+    zip_stream hands over to the response as it is written
+    """
+
+    def __init__(self, copy_to=None):
+        self.chunks = []
+        self.position = 0
+        self.copy_to = copy_to
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        if self.copy_to:
+            self.copy_to.write(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def get_article_zip_entries(files, article_folders=False):
+    """ Returns the paths and archive names of files related to an article,
+    laid out as zip_article_files does. Missing files are left out.
+    :param files: A list or queryset of File objects that have article_ids
+    :param article_folders: Boolean, if true splits files into folders with
+    article name.
+    :return: A list of (path, name in the archive) tuples
+    """
+    from submission import models as submission_models
+
+    files = [file for file in files if file.article_id]
+    titles = {}
+    if article_folders:
+        titles = dict(
+            submission_models.Article.objects.filter(
+                pk__in={file.article_id for file in files},
+            ).values_list('pk', 'title')
+        )
+
+    entries = []
+    for file in files:
+        path = file.self_article_path()
+        if not os.path.isfile(path):
+            logger.warning('File %s is missing from %s', file.pk, path)
+            continue
+        name = os.path.basename(path)
+        if article_folders:
+            name = os.path.join(
+                '{id} - {title}'.format(
+                    id=file.article_id,
+                    title=strip_tags(titles.get(file.article_id, '')),
+                ),
+                name,
+            )
+        entries.append((path, name))
+    return entries
+
+
+def zip_stream(entries, copy_to=None):
+    """ Generates a zip archive of files chunk by chunk, reading each file
+    as it goes rather than building the archive first.
+    :param entries: A list of (path, name in the archive) tuples
+    :param copy_to: An optional file object the archive is also written to
+    :return: A generator of bytes
+    """
+    stream = _ZipStream(copy_to=copy_to)
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path, name in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname=name)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as source, \
+                    archive.open(info, 'w', force_zip64=True) as dest:
+                for chunk in iter(lambda: source.read(ZIP_CHUNK_SIZE), b''):
+                    dest.write(chunk)
+                    data = stream.pop()
+                    if data:
+                        yield data
+    # The central directory is written when the archive is closed
+    yield stream.pop()
+
+
+def _zip_stream_to_file(entries, store_path):
+    """ Streams a zip archive while storing it at store_path. Incomplete
+    archives (e.g. when the download is interrupted) are discarded.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(store_path),
+        prefix='.tmp_',
+    )
+    completed = False
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in zip_stream(entries, copy_to=temp_file):
+                yield chunk
+        completed = True
+    finally:
+        if completed:
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, store_path)
+        else:
+            os.unlink(temp_path)
+
+
+def serve_zip_stream(entries, file_name, store_path=None):
+    """ Streams a zip archive of files to the browser as it is built
+    :param entries: A list of (path, name in the archive) tuples
+    :param file_name: The name the archive is downloaded as
+    :param store_path: An optional path where the archive is kept once
+        built, and served from when it exists already.
+    :return: StreamingHttpResponse
+    """
+    filename, extension = os.path.splitext(file_name)
+    if store_path and os.path.isfile(store_path):
+        response = file_delivery.file_response(
+            None, store_path, 'application/zip',
+        )
+    elif store_path:
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        response = StreamingHttpResponse(
+            _zip_stream_to_file(entries, store_path),
+            content_type='application/zip',
+        )
+    else:
+        response = StreamingHttpResponse(
+            zip_stream(entries),
+            content_type='application/zip',
+        )
+    response['Content-Disposition'] = 'attachment; filename="{0}{1}"'.format(
+        slugify(filename), extension,
+    )
+    return response
+
+
 def serve_temp_file(file_path, file_name):
     filename, extension = os.path.splitext(file_name)
     mime_type = guess_mime(file_name)
@@ -832,23 +979,57 @@ def checksum(file_path):
     return hash_md5.hexdigest()
 
 
-def serve_sitemap_file(path_parts):
+def write_file_atomically(file_path, content):
+    """ Writes to a temporary file which is then moved into place, so that
+    readers never see a half written file.
+    :param file_path: The path of the file to write
+    :param content: bytes
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path),
+        prefix='.tmp_',
+    )
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def serve_sitemap_file(path_parts, request=None):
+    """ Serves a sitemap, using its gzipped copy if the client accepts it
+    :param path_parts: The path of the sitemap under files/sitemaps
+    :param request: HttpRequest object
+    :return: StreamingHttpResponse
+    """
     file_path = os.path.join(
         settings.BASE_DIR,
         'files',
         'sitemaps',
         *path_parts,
     )
-    return StreamingHttpResponse(
-        FileWrapper(
-            open(file_path, 'rb'),
-            8192,
-        ),
-        content_type='application/xml',
+    accept_encoding = ''
+    if request:
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+    encoding = None
+    gzip_path = '{}.gz'.format(file_path)
+    if 'gzip' in accept_encoding and os.path.isfile(gzip_path):
+        file_path = gzip_path
+        encoding = 'gzip'
+
+    response = file_delivery.file_response(
+        request, file_path, 'application/xml', encoding=encoding,
     )
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
 
 
-def serve_robots_file(journal=None, repository=None):
+def serve_robots_file(journal=None, repository=None, request=None):
     base_path = os.path.join(
         settings.BASE_DIR,
         'files',
@@ -869,13 +1050,7 @@ def serve_robots_file(journal=None, repository=None):
             base_path,
             'robots.txt',
         )
-    return StreamingHttpResponse(
-        FileWrapper(
-            open(file_path, 'rb'),
-            8192,
-        ),
-        content_type='text/plain',
-    )
+    return file_delivery.file_response(request, file_path, 'text/plain')
 
 
 def copy_preprint_file_to_article(preprint, article, manuscript=True):
@@ -929,7 +1104,7 @@ def html_to_text(file_path):
         soup = BeautifulSoup(f.read(), "html.parser")
         body = soup.find("body")
         if body:
-            body.text
+            text = body.text
         else:
             text = soup.text
 
@@ -0,0 +1,196 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+A store of XML galleys rendered to HTML, so that the XSLT transform runs
+once per version of a galley rather than on every article view.
+
+Renders are keyed by the checksums of the galley file and of the XSL file,
+and by RENDERER_VERSION, so replacing either file (or changing how galleys
+are rendered) misses the store. They are kept on disk, along with the index
+of the tables in the HTML, under files/rendered_galleys/<galley pk>/.
+"""
+
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+import json
+import os
+import shutil
+import threading
+
+from django.conf import settings
+
+from core import files
+from cron import jobs
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when a change to the rendering would change its output
+RENDERER_VERSION = 1
+# Number of renders also kept in memory by each process
+MEMORY_CACHE_SIZE = 100
+
+RenderedGalley = namedtuple('RenderedGalley', ['html', 'tables'])
+
+_memory_cache = OrderedDict()
+_memory_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=10000)
+def _checksum(path, mtime, size):
+    return files.checksum(path)
+
+
+def file_checksum(path):
+    """ Returns the checksum of a file, only reading it if it was modified"""
+    stat = os.stat(path)
+    return _checksum(path, stat.st_mtime_ns, stat.st_size)
+
+
+def get_store_dir(galley):
+    return os.path.join(
+        settings.BASE_DIR, 'files', 'rendered_galleys', str(galley.pk),
+    )
+
+
+def get_xsl_path(galley):
+    """ Mirrors the choice of XSL made by core.files.render_xml"""
+    xsl_path = None
+    if galley.xsl_file:
+        xsl_path = galley.xsl_file.file.path
+    if not xsl_path or not os.path.isfile(xsl_path):
+        xsl_path = os.path.join(settings.BASE_DIR, 'transform/xsl/default.xsl')
+    return xsl_path
+
+
+def get_store_key(galley, recover=False):
+    """ Returns the key of the current render of a galley, or None if the
+    galley file is missing
+    """
+    xml_path = galley.file.get_file_path(galley.article)
+    try:
+        xml_checksum = file_checksum(xml_path)
+        xsl_checksum = file_checksum(get_xsl_path(galley))
+    except FileNotFoundError:
+        return None
+    version = '{}-{}-v{}'.format(xml_checksum, xsl_checksum, RENDERER_VERSION)
+    return '{}{}'.format(version, '-recover' if recover else '')
+
+
+def _remember(key, rendered):
+    with _memory_cache_lock:
+        _memory_cache[key] = rendered
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def _recall(key):
+    with _memory_cache_lock:
+        rendered = _memory_cache.get(key)
+        if rendered is not None:
+            _memory_cache.move_to_end(key)
+        return rendered
+
+
+def _load(store_path):
+    try:
+        with open(store_path, 'r', encoding='utf-8') as store_file:
+            data = json.load(store_file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logger.warning('Discarding corrupt galley render %s', store_path)
+        return None
+    return RenderedGalley(data['html'], data['tables'])
+
+
+def _render(galley, recover=False):
+    from journal import logic as journal_logic
+    html = str(galley.render(recover=recover))
+    return RenderedGalley(html, journal_logic.get_all_tables_from_html(html))
+
+
+def _store(store_path, rendered, version):
+    store_dir = os.path.dirname(store_path)
+    os.makedirs(store_dir, exist_ok=True)
+    files.write_file_atomically(
+        store_path,
+        json.dumps(rendered._asdict()).encode('utf-8'),
+    )
+    # Drop the renders of previous versions of the galley
+    for file_name in os.listdir(store_dir):
+        if not file_name.startswith((version, '.tmp_')):
+            try:
+                os.remove(os.path.join(store_dir, file_name))
+            except FileNotFoundError:
+                pass
+
+
+def get_rendered_galley(galley, recover=False):
+    """ Returns the HTML render of an XML galley and the tables found in it,
+    rendering and storing it if needed.
+    :param galley: core.models.Galley
+    :param recover: Passed to core.files.transform_with_xsl
+    :return: RenderedGalley
+    """
+    key = get_store_key(galley, recover)
+    if key is None:
+        # render_xml logs the missing file
+        return _render(galley, recover)
+
+    store_path = os.path.join(get_store_dir(galley), '{}.json'.format(key))
+    rendered = _recall(store_path) or _load(store_path)
+    if rendered is None:
+        rendered = _render(galley, recover)
+        try:
+            _store(store_path, rendered, key.replace('-recover', ''))
+        except OSError as e:
+            logger.error('Unable to store galley render: %s', e)
+    _remember(store_path, rendered)
+    return rendered
+
+
+def warm_galley(galley):
+    """ Renders an XML galley into the store ahead of it being viewed"""
+    if galley.file.mime_type not in files.XML_MIMETYPES:
+        return
+    try:
+        # The article page renders in recover mode
+        get_rendered_galley(galley, recover=True)
+    except Exception as e:
+        logger.error('Unable to warm render of galley %s: %s', galley.pk, e)
+
+
+@jobs.job(queue='galleys', priority=jobs.PRIORITY_LOW)
+def warm_galley_in_background(galley_id):
+    """ Renders a galley whose file was replaced into the store"""
+    from core import models
+
+    try:
+        galley = models.Galley.objects.select_related(
+            'file', 'xsl_file', 'article',
+        ).get(pk=galley_id)
+    except models.Galley.DoesNotExist:
+        return
+    warm_galley(galley)
+
+
+def warm_article_galleys(**kwargs):
+    """ Event handler warming the galleys of a newly published article"""
+    article = kwargs.get('article')
+    for galley in article.galley_set.filter(public=True):
+        warm_galley(galley)
+
+
+def invalidate_galley(galley):
+    """ Removes the stored renders of a galley"""
+    store_dir = get_store_dir(galley)
+    with _memory_cache_lock:
+        for key in list(_memory_cache):
+            if os.path.dirname(key) == store_dir:
+                del _memory_cache[key]
+    shutil.rmtree(store_dir, ignore_errors=True)
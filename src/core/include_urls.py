@@ -200,6 +200,7 @@ urlpatterns = [
     url(r'^robots.txt$', press_views.robots, name='website_robots'),
     url(r'^sitemap.xml$', press_views.sitemap, name='website_sitemap'),
     url(r'^(?P<issue_id>\d+)_sitemap.xml$', journal_views.sitemap, name='website_sitemap'),
+    url(r'^(?P<issue_id>\d+)_sitemap_(?P<shard>\d+).xml$', journal_views.sitemap, name='website_sitemap'),
 
     url(r'^download/file/(?P<file_id>\d+)/$', journal_views.download_journal_file, name='journal_file'),
 
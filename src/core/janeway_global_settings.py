@@ -106,6 +106,7 @@ INSTALLED_APPS += plugin_installed_apps.load_plugin_apps(BASE_DIR)
 INSTALLED_APPS += plugin_installed_apps.load_homepage_element_apps(BASE_DIR)
 
 MIDDLEWARE_CLASSES = (
+    'utils.request_cache.RequestCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -439,6 +440,8 @@ DATETIME_FORMAT = "Y-m-d H:i"
 AUTH_USER_MODEL = 'core.Account'
 
 PLUGIN_HOOKS = {}
+# Plugin hooks taking longer than this many seconds to render are logged
+PLUGIN_HOOK_SLOW_SECONDS = 0.5
 
 NOTIFY_FUNCS = []
 
@@ -482,6 +485,57 @@ WORKFLOW_PLUGINS = {}
 
 SILENT_IMPORT_CACHE = False
 
+# Number of seconds setting values are kept in the cache. Saving a setting
+# bumps a version kept in the database, which invalidates the cache of every
+# process, so this can be fairly long.
+SETTING_CACHE_TIMEOUT = 60 * 60
+
+# Number of seconds the roles of a user are kept in the shared cache. Saving or
+# deleting one of their roles invalidates the cache in every process.
+ROLE_CACHE_TIMEOUT = 60 * 60
+
+# Number of seconds the navigation menu of each site is kept in the shared
+# cache. Editing a navigation item or CMS page of the site invalidates it.
+NAVIGATION_CACHE_TIMEOUT = 60 * 60
+
+# Number of records returned per OAI-PMH ListRecords/ListIdentifiers response
+OAI_BATCH_SIZE = 100
+
+# Number of seconds rendered OAI-PMH records are cached for. Records are keyed
+# by the article's effective_last_modified date, so edits invalidate them
+# straight away.
+OAI_RECORD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# When enabled, article views and downloads are queued during the request and
+# recorded in batches by the process_article_accesses command (also run by
+# execute_cron_tasks)
+BUFFER_ARTICLE_ACCESSES = False
+
+# When enabled, the zip archives of issue galleys are kept on disk once built
+# and served as is until the galleys of the issue change
+CACHE_ISSUE_ARCHIVES = False
+
+# Number of seconds the public journal pages rendered for anonymous readers
+# are cached for, 0 to disable. Changes to the articles, issues, CMS pages and
+# settings of a journal invalidate its pages straight away.
+PUBLIC_PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Backend sending files to the browser once Janeway has checked they can be
+# accessed. core.file_delivery.XAccelRedirectBackend and XSendfileBackend let
+# nginx or Apache send them, keeping workers free during long downloads.
+FILE_DELIVERY_BACKEND = 'core.file_delivery.PythonBackend'
+# Internal nginx location mapped to the files directory, used by
+# XAccelRedirectBackend
+FILE_DELIVERY_INTERNAL_URL = '/internal-files/'
+
+# When enabled, emails, Crossref deposits, full-text indexing and sitemap
+# regeneration are queued as background jobs, run by the run_jobs command
+# (and drained by execute_cron_tasks). Otherwise they run straight away.
+QUEUE_BACKGROUND_JOBS = False
+# Seconds after which a running job whose worker has not finished it is
+# considered abandoned and run again
+JOB_TIMEOUT = 60 * 10
+
 # Default timeout for outgoing HTTP connections
 HTTP_TIMEOUT_SECONDS = 5
 
@@ -489,6 +543,15 @@ HTTP_TIMEOUT_SECONDS = 5
 # are first uploaded
 DEFAULT_XSL_FILE_LABEL = 'Janeway default (1.4.2)'
 
+# The test runner doesn't roll back the cache between tests, so caches that
+# outlive a request are disabled there. Tests enable them with override_settings
+if IN_TEST_RUNNER:
+    SETTING_CACHE_TIMEOUT = 0
+    ROLE_CACHE_TIMEOUT = 0
+    NAVIGATION_CACHE_TIMEOUT = 0
+    OAI_RECORD_CACHE_TIMEOUT = 0
+    PUBLIC_PAGE_CACHE_TIMEOUT = 0
+
 # Skip migrations by default on sqlite for faster execution
 if (
     IN_TEST_RUNNER
@@ -548,3 +611,6 @@ if os.environ.get("DB_VENDOR") == "postgres":
     CORE_FILETEXT_MODEL = "core.PGFileText"
 
 ENABLE_FULL_TEXT_SEARCH = False
+# Maximum number of characters of text extracted from a galley for full-text
+# search, Postgres can't build search vectors out of very large texts
+FULL_TEXT_MAX_LENGTH = 500000
@@ -8,6 +8,7 @@ from PIL import Image, UnidentifiedImageError
 import uuid
 from importlib import import_module
 from datetime import timedelta
+from collections.abc import Mapping
 import operator
 import re
 from functools import reduce
@@ -15,6 +16,7 @@ from functools import reduce
 from django.conf import settings
 from django.contrib.auth import logout
 from django.contrib import messages
+from django.core.cache import cache as django_cache
 from django.template.loader import get_template
 from django.db.models import Q
 from django.http import JsonResponse
@@ -24,7 +26,6 @@ from django.utils import timezone
 from django.utils.translation import get_language, ugettext_lazy as _
 
 from core import models, files, plugin_installed_apps
-from utils.function_cache import cache
 from review import models as review_models
 from utils import render_template, notify_helpers, setting_handler
 from submission import models as submission_models
@@ -178,36 +179,85 @@ def resize_and_crop(img_path, size, crop_type='middle'):
     img.save(img_path, "png")
 
 
+# The setting groups available to templates as journal_settings
+CONTEXT_SETTING_GROUPS = ('general', 'crosscheck', 'article', 'news', 'styling')
+
+
 def settings_for_context(request):
     if request.journal:
-        return cached_settings_for_context(request.journal, get_language())
+        return JournalSettings(request.journal)
     else:
         return {}
 
 
-@cache(600)
-def cached_settings_for_context(journal, language):
-    setting_groups = ['general', 'crosscheck', 'article', 'news', 'styling']
-    _dict = {group: {} for group in setting_groups}
+class JournalSettings(Mapping):
+    """ The journal_settings of templates, a dict of setting group names to
+    dicts of setting names to processed values.
+
+    Settings are only loaded when a template first looks one up.
+    """
 
-    for group in setting_groups:
-        settings = models.Setting.objects.filter(group__name=group)
+    def __init__(self, journal):
+        self.journal = journal
+        self._groups = None
 
-        for setting in settings:
-            _dict[group][setting.name] = setting_handler.get_setting(
-                group,
-                setting.name,
-                journal,
-            ).processed_value
-    return _dict
+    def _load(self):
+        if self._groups is None:
+            self._groups = cached_settings_for_context(
+                self.journal, get_language(),
+            )
+        return self._groups
+
+    def __getitem__(self, group_name):
+        return self._load()[group_name]
+
+    def __iter__(self):
+        return iter(CONTEXT_SETTING_GROUPS)
+
+    def __len__(self):
+        return len(CONTEXT_SETTING_GROUPS)
+
+
+def cached_settings_for_context(journal, language):
+    """ Returns the processed values of the settings of a journal in the
+    CONTEXT_SETTING_GROUPS, loaded in a single query.
+
+    Values are kept in the shared cache under the version of the setting
+    cache, which is read from the database, so saving any setting value
+    invalidates them in every process.
+    :param journal: A Journal
+    :param language: The language the values are loaded for
+    :return: A dict of group name to a dict of setting name to value
+    """
+    key = 'context_settings:{}:{}:{}'.format(
+        setting_handler.get_setting_cache_version(), journal.pk, language,
+    )
+    context_settings = django_cache.get(key)
+    if context_settings is None:
+        group_settings = setting_handler.get_group_settings(
+            CONTEXT_SETTING_GROUPS, journal,
+        )
+        context_settings = {
+            group_name: {
+                name: setting_value.processed_value
+                for name, setting_value in setting_values.items()
+            }
+            for group_name, setting_values in group_settings.items()
+        }
+        django_cache.set(
+            key, context_settings, settings.SETTING_CACHE_TIMEOUT,
+        )
+    return context_settings
 
 
 def process_setting_list(settings_to_get, type, journal):
+    group_settings = setting_handler.get_settings(type, journal)
     settings = []
     for setting in settings_to_get:
         settings.append({
             'name': setting,
-            'object': setting_handler.get_setting(type, setting, journal),
+            'object': group_settings.get(setting)
+            or setting_handler.get_setting(type, setting, journal),
         })
 
     return settings
@@ -221,6 +271,13 @@ def get_settings_to_edit(display_group, journal):
     ):
         review_form_choices.append([form.pk, form])
 
+    # Load the groups in bulk so the get_setting calls below are answered
+    # from the request cache.
+    if display_group in {'submission', 'review'}:
+        setting_handler.get_settings('general', journal)
+    elif display_group == 'styling':
+        setting_handler.get_settings('styling', journal)
+
     if display_group == 'submission':
         settings = [
             {'name': 'disable_journal_submission',
@@ -18,12 +18,9 @@ from django.conf import settings
 from django.urls import set_script_prefix
 from django.utils import timezone
 
-from press import models as press_models
 from utils import models as util_models, setting_handler
 from utils.logger import get_logger
-from core import models as core_models
-from journal import models as journal_models
-from repository import models as repository_models
+from core import routing
 
 logger = get_logger(__name__)
 
@@ -31,35 +28,24 @@ logger = get_logger(__name__)
 def get_site_resources(request):
     """ Attempts to match the relevant resources for the request url
 
-    Each site type is given a chance to resolve the url by domain or path
+    Each site type is given a chance to resolve the url by domain or path.
+    Sites are matched against the in-memory routing table, so no queries
+    are made unless a site has changed since the table was built.
     :param request: A Django HttpRequest
     :return: press.models.Press,journal.models.Journal,HttpResponseRedirect
     """
-    # Match a journal
-    journal = repository = press = redirect_obj = site_path = None
-    journal, site_path = journal_models.Journal.get_by_request(request)
-    if journal:
-        press = journal.press
-    else:
-        # Match a Repository
-        repository, site_path = repository_models.Repository.get_by_request(request)
-        if repository:
-            press = repository.press
-        else:
-            # Match the press site
-            press, path_mode = press_models.Press.get_by_request(request)
+    redirect_obj = None
+    journal, repository, press, alias, site_path = routing.get_routing_table(
+    ).resolve(request)
 
     # Match a Domain Alias
-    if not press:
-        alias, site_path = core_models.DomainAlias.get_by_request(request)
-        if alias and alias.redirect:
-            logger.debug("Matched a redirect: %s" % alias.redirect_url)
-            redirect_obj = redirect(
-                alias.build_redirect_url(path=request.path))
-        elif alias:
-            journal = alias.journal
-            press = journal.press if journal else alias.press
-
+    if alias and alias.redirect:
+        logger.debug("Matched a redirect: %s" % alias.redirect_url)
+        redirect_obj = redirect(
+            alias.build_redirect_url(path=request.path))
+        press = None
+    elif alias:
+        journal = alias.journal
 
     #  Couldn't match any resources
     if not press and not redirect_obj:
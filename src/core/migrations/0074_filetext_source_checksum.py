@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0073_auto_20220630_1608'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filetext',
+            name='source_checksum',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='pgfiletext',
+            name='source_checksum',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
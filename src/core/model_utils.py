@@ -457,6 +457,73 @@ class AbstractLastModifiedModel(models.Model):
         return last_mod_date
 
 
+def touch_effective_last_modified(queryset, date=None):
+    """ Moves the effective_last_modified date of the given objects forward
+    :param queryset: A queryset of a model with an effective_last_modified
+        field
+    :param date: The date of the change, defaults to now.
+    """
+    if date is None:
+        date = timezone.now()
+    queryset = queryset.filter(
+        Q(effective_last_modified__lt=date)
+        | Q(effective_last_modified__isnull=True)
+    )
+    # Bypass querysets that also bump last_modified on update
+    QuerySet.update(queryset, effective_last_modified=date)
+
+
+def track_effective_last_modified(model, dependencies, m2m_dependencies):
+    """ Maintains the effective_last_modified field of a model
+
+    effective_last_modified is the denormalised equivalent of
+    AbstractLastModifiedModel.best_last_modified_date: it is set when an
+    instance is saved and moved forward whenever one of the related objects
+    it depends upon is saved, deleted, added or removed.
+    :param model: The model class with an effective_last_modified field
+    :param dependencies: A dict mapping the labels of the models depended
+        upon to the lookup from `model` to an instance of them.
+    :param m2m_dependencies: A dict mapping the labels of the through
+        models of many to many relationships to the lookup from `model` to
+        the other side of the relationship.
+    """
+    def on_save(sender, instance, raw=False, **kwargs):
+        if not raw:
+            instance.effective_last_modified = timezone.now()
+
+    def make_dependency_receiver(lookup):
+        def on_dependency_changed(sender, instance, raw=False, **kwargs):
+            if not raw and instance.pk:
+                touch_effective_last_modified(
+                    model._base_manager.filter(**{lookup: instance}),
+                )
+        return on_dependency_changed
+
+    def make_m2m_receiver(lookup):
+        def on_m2m_changed(sender, instance, action, pk_set, **kwargs):
+            if action not in {'post_add', 'post_remove', 'pre_clear'}:
+                return
+            if isinstance(instance, model):
+                queryset = model._base_manager.filter(pk=instance.pk)
+            elif pk_set:
+                queryset = model._base_manager.filter(pk__in=pk_set)
+            else:
+                queryset = model._base_manager.filter(**{lookup: instance})
+            touch_effective_last_modified(queryset)
+        return on_m2m_changed
+
+    # Receivers are closures, so they must be strongly referenced
+    models.signals.pre_save.connect(on_save, sender=model, weak=False)
+    for label, lookup in dependencies.items():
+        receiver = make_dependency_receiver(lookup)
+        models.signals.post_save.connect(receiver, sender=label, weak=False)
+        models.signals.pre_delete.connect(receiver, sender=label, weak=False)
+    for label, lookup in m2m_dependencies.items():
+        models.signals.m2m_changed.connect(
+            make_m2m_receiver(lookup), sender=label, weak=False,
+        )
+
+
 class SearchLookup(PGSearchLookup):
     """ A Search lookup that works across multiple databases.
     Django dropped support for the search lookup when using MySQLin 1.10
@@ -560,3 +627,33 @@ class SearchVector(DjangoSearchVector):
     # Override template to ignore function
     function = None
     template = '%(expressions)s'
+
+
+class FilterSearchVector(models.Func):
+    """ Keeps only the lexemes of a tsvector that have one of the given
+    weights, e.g. FilterSearchVector('document', weights=['A', 'B'])
+    """
+    function = 'ts_filter'
+    output_field = SearchVectorField()
+
+    def __init__(self, expression, weights, **extra):
+        weights = models.Func(
+            models.Value('{%s}' % ','.join(weights)),
+            template='%(expressions)s::"char"[]',
+        )
+        super().__init__(expression, weights, **extra)
+
+
+class WeightedSearchRank(models.Func):
+    """ ts_rank with explicit factors for the D, C, B and A weights, which
+    Django's SearchRank doesn't support
+    """
+    function = 'ts_rank'
+    output_field = fields.FloatField()
+
+    def __init__(self, vector, query, weights, **extra):
+        weights = models.Func(
+            models.Value(weights),
+            template='%(expressions)s::float4[]',
+        )
+        super().__init__(weights, vector, query, **extra)
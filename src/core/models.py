@@ -30,7 +30,7 @@ from django.dispatch import receiver
 from django.urls import reverse
 import swapper
 
-from core import files, validators
+from core import files, galley_cache, role_cache, text_extraction, validators
 from core.file_system import JanewayFileSystemStorage
 from core.model_utils import (
     AbstractLastModifiedModel,
@@ -38,6 +38,7 @@ from core.model_utils import (
     PGCaseInsensitiveEmailField,
     SearchLookup,
 )
+from cron import jobs
 from review import models as review_models
 from copyediting import models as copyediting_models
 from submission import models as submission_models
@@ -362,11 +363,7 @@ class Account(AbstractBaseUser, PermissionsMixin):
         AccountRole.objects.get(role=role, user=self, journal=journal).delete()
 
     def check_role(self, journal, role):
-        return AccountRole.objects.filter(
-            user=self,
-            journal=journal,
-            role__slug=role
-        ).exists() or self.is_staff
+        return self.is_staff or role_cache.has_role(self, journal, role)
 
     def is_editor(self, request, journal=None):
         if not journal:
@@ -559,6 +556,16 @@ class AccountRole(models.Model):
         return "{0} {1} {2}".format(self.user, self.journal, self.role.name)
 
 
+models.signals.post_save.connect(
+    role_cache.invalidate_account_roles, sender=AccountRole,
+)
+models.signals.post_delete.connect(
+    role_cache.invalidate_account_roles, sender=AccountRole,
+)
+models.signals.post_save.connect(role_cache.invalidate_all_roles, sender=Role)
+models.signals.post_delete.connect(role_cache.invalidate_all_roles, sender=Role)
+
+
 class Interest(models.Model):
     name = models.CharField(max_length=250)
 
@@ -721,8 +728,15 @@ class SettingValue(models.Model):
         self.setting.validate(self.value)
 
     def save(self, *args, **kwargs):
+        from utils import setting_handler
         self.validate()
         super().save(*args, **kwargs)
+        setting_handler.invalidate_setting_cache()
+
+    def delete(self, *args, **kwargs):
+        from utils import setting_handler
+        super().delete(*args, **kwargs)
+        setting_handler.invalidate_setting_cache()
 
 
 class File(AbstractLastModifiedModel):
@@ -890,26 +904,29 @@ class File(AbstractLastModifiedModel):
         :return: A bool indicating if the file has been succesfully indexed
         """
         indexed = False
-        try:
-            # TODO: Only aricle files are supported at the moment since File
-            # objects don't know the path to the actual file unless you also
-            # know the context (article/preprint/journal...) of the file
-            path = self.self_article_path()
-            if not path:
-                return indexed
-            text_parser = files.MIME_TO_TEXT_PARSER[self.mime_type]
-        except KeyError:
+        # TODO: Only aricle files are supported at the moment since File
+        # objects don't know the path to the actual file unless you also
+        # know the context (article/preprint/journal...) of the file
+        path = self.self_article_path()
+        if not path or self.mime_type not in files.MIME_TO_TEXT_PARSER:
             # We have no support for indexing files of this type yet
             return indexed
-        parsed_text = text_parser(path)
+        checksum = text_extraction.source_checksum(path)
+        if self.text and self.text.source_checksum == checksum:
+            # The text was extracted from this version of the file already
+            return True
+        parsed_text = text_extraction.extract_text(path, self.mime_type)
         FileTextModel = swapper.load_model("core", "FileText")
         preprocessed_text = FileTextModel.preprocess_contents(parsed_text)
         if self.text:
-            self.text.update_contents(preprocessed_text)
+            self.text.contents = preprocessed_text
+            self.text.source_checksum = checksum
+            self.text.save()
             indexed = True
         else:
             file_text_obj = FileTextModel.objects.create(
                 contents=preprocessed_text,
+                source_checksum=checksum,
                 file=self,
             )
             self.text = file_text_obj
@@ -930,6 +947,8 @@ class File(AbstractLastModifiedModel):
 class AbstractFileText(models.Model):
     contents = models.TextField(blank=True, null=True)
     date_populated = models.DateTimeField(default=timezone.now)
+    # Identifies the version of the file the contents were extracted from
+    source_checksum = models.CharField(max_length=100, blank=True, null=True)
 
     class Meta:
         abstract = True
@@ -938,6 +957,11 @@ class AbstractFileText(models.Model):
     def preprocess_contents(text, lang=None):
         return text
 
+    @classmethod
+    def preprocess_contents_bulk(cls, texts, lang=None):
+        """ Preprocesses a list of texts, see preprocess_contents"""
+        return [cls.preprocess_contents(text, lang) for text in texts]
+
     def update_contents(self, text, lang=None):
         self.contents = self.preprocess_contents(text)
         self.save()
@@ -978,6 +1002,20 @@ class PGFileText(AbstractFileText):
         result = cursor.execute("SELECT to_tsvector(%s) as vector", [text])
         return cursor.fetchone()[0]
 
+    @classmethod
+    def preprocess_contents_bulk(cls, texts, lang=None):
+        """ Casts a list of texts into TSVectors with a single query"""
+        if not texts:
+            return []
+        texts = [text.replace("\x00", "\uFFFD") for text in texts]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT to_tsvector(text) FROM unnest(%s::text[]) "
+                "WITH ORDINALITY AS texts(text, position) ORDER BY position",
+                [texts],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
 
 @receiver(models.signals.pre_save, sender=File)
 def update_file_index(sender, instance, **kwargs):
@@ -986,7 +1024,22 @@ def update_file_index(sender, instance, **kwargs):
         return False
 
     if settings.ENABLE_FULL_TEXT_SEARCH and instance.text:
-        instance.index_full_text(save=False)
+        if settings.QUEUE_BACKGROUND_JOBS:
+            index_file_in_background.enqueue(
+                file_id=instance.pk,
+                unique_key='index_file:{}'.format(instance.pk),
+            )
+        else:
+            instance.index_full_text(save=False)
+
+
+@jobs.job(queue='indexing', priority=jobs.PRIORITY_LOW)
+def index_file_in_background(file_id):
+    try:
+        file_ = File.objects.get(pk=file_id)
+    except File.DoesNotExist:
+        return False
+    return file_.index_full_text()
 
 
 class FileHistory(models.Model):
@@ -1120,7 +1173,7 @@ class Galley(AbstractLastModifiedModel):
         if self.file.mime_type == "text/html" or dont_render:
             return self.file.get_file(self.article)
         elif self.file.mime_type in files.XML_MIMETYPES:
-            return self.render(recover=recover)
+            return galley_cache.get_rendered_galley(self, recover=recover).html
 
     def path(self):
         url = reverse('article_download_galley',
@@ -1142,6 +1195,31 @@ class Galley(AbstractLastModifiedModel):
         super().save(*args, **kwargs)
 
 
+@receiver(models.signals.post_delete, sender=Galley)
+def remove_rendered_galley(sender, instance, **kwargs):
+    """ Removes the stored HTML renders of a deleted galley """
+    galley_cache.invalidate_galley(instance)
+
+
+@receiver(models.signals.post_save, sender=File)
+def warm_replaced_galleys(sender, instance, created, raw=False, **kwargs):
+    """ Renders the new version of a published XML galley into the store
+    when its file is replaced, so that readers don't wait for the XSLT.
+    """
+    if raw or created or instance.mime_type not in files.XML_MIMETYPES:
+        return
+    galley_ids = Galley.objects.filter(
+        file=instance,
+        public=True,
+        article__date_published__isnull=False,
+    ).values_list('pk', flat=True)
+    for galley_id in galley_ids:
+        galley_cache.warm_galley_in_background.enqueue(
+            galley_id=galley_id,
+            unique_key='warm_galley:{}'.format(galley_id),
+        )
+
+
 def upload_to_journal(instance, filename):
     instance.original_filename = filename
     if instance.journal:
@@ -0,0 +1,187 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+The registry of plugin hooks, with their callables resolved once.
+
+core.plugin_loader.load collects the hooks plugins declare in their
+hook_registry and compiles them here, so rendering a hook doesn't import
+anything. A hook is declared as a dict:
+
+    {
+        'module': 'plugins.example.hooks',
+        'function': 'inject_banner',
+        # Optional: caches the HTML of the hook for this many seconds,
+        # keyed on the site, the language and the arguments of the tag.
+        # Only for hooks whose output doesn't depend on the user.
+        'cache_timeout': 600,
+    }
+
+Each call is timed. The counters of this process are returned by get_stats
+and calls slower than PLUGIN_HOOK_SLOW_SECONDS are logged, so that slow
+plugins can be told apart.
+"""
+
+from collections import defaultdict
+from hashlib import sha1
+from importlib import import_module
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.utils import translation
+from django.utils.html import mark_safe
+
+from utils.function_cache import Uncacheable, default_key
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+KEY_PREFIX = 'plugin_hooks'
+
+_registry = {}
+_registry_source = None
+_registry_lock = threading.Lock()
+_stats = defaultdict(lambda: defaultdict(int))
+_stats_lock = threading.Lock()
+
+
+class Hook(object):
+    """ A plugin hook with its callable resolved"""
+
+    def __init__(self, hook_name, definition):
+        self.hook_name = hook_name
+        self.name = definition.get('name')
+        self.module = definition.get('module')
+        self.function_name = definition.get('function')
+        self.cache_timeout = definition.get('cache_timeout')
+        self.function = getattr(
+            import_module(self.module), self.function_name,
+        )
+
+    @property
+    def label(self):
+        return '{}:{}.{}'.format(
+            self.hook_name, self.module, self.function_name,
+        )
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.function(*args, **kwargs)
+        finally:
+            record(self.label, 'calls', time.perf_counter() - start)
+
+
+def compile_hooks(hook_definitions):
+    """ Resolves the callables of the given hooks, replacing the registry
+    :param hook_definitions: A dict of hook name to a list of hook dicts,
+        i.e. settings.PLUGIN_HOOKS
+    """
+    global _registry, _registry_source
+    registry = {}
+    for hook_name, definitions in hook_definitions.items():
+        hooks = registry[hook_name] = []
+        for definition in definitions:
+            try:
+                hooks.append(Hook(hook_name, definition))
+            except (ImportError, AttributeError, TypeError):
+                logger.exception(
+                    "Can't load the %s hook %s", hook_name, definition,
+                )
+    with _registry_lock:
+        _registry = registry
+        _registry_source = hook_definitions
+
+
+def get_hooks(hook_name):
+    """ Returns the Hooks registered under a name"""
+    if _registry_source is not settings.PLUGIN_HOOKS:
+        # e.g. settings overridden by a test
+        compile_hooks(settings.PLUGIN_HOOKS)
+    return _registry.get(hook_name, [])
+
+
+def record(label, event, seconds=None):
+    with _stats_lock:
+        stats = _stats[label]
+        stats[event] += 1
+        if seconds is not None:
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+    if seconds is not None and seconds > settings.PLUGIN_HOOK_SLOW_SECONDS:
+        logger.warning("Slow plugin hook %s: %.3fs", label, seconds)
+
+
+def get_stats():
+    """ Returns the calls, cache hits, errors and time spent of each hook
+    in this process, slowest first
+    """
+    with _stats_lock:
+        stats = {
+            label: {
+                key: counts.get(key, 0)
+                for key in ('calls', 'hits', 'errors', 'seconds',
+                            'max_seconds')
+            }
+            for label, counts in _stats.items()
+        }
+    for counts in stats.values():
+        counts['average_seconds'] = (
+            counts['seconds'] / counts['calls'] if counts['calls'] else 0
+        )
+    return dict(sorted(
+        stats.items(), key=lambda item: item[1]['seconds'], reverse=True,
+    ))
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _cache_key(hook, context, args, kwargs):
+    request = context.get('request')
+    site = getattr(request, 'site_type', None)
+    key = '|'.join([
+        hook.label,
+        default_key(site),
+        translation.get_language() or '',
+        default_key(*args, **kwargs),
+    ])
+    return '{}:{}'.format(KEY_PREFIX, sha1(key.encode('utf-8')).hexdigest())
+
+
+def render_hook(hook, context, *args, **kwargs):
+    """ Returns the HTML of a hook, from the cache when it is cacheable"""
+    if not hook.cache_timeout:
+        return hook(context, *args, **kwargs)
+    try:
+        key = _cache_key(hook, context, args, kwargs)
+    except Uncacheable:
+        return hook(context, *args, **kwargs)
+
+    html = django_cache.get(key)
+    if html is None:
+        html = hook(context, *args, **kwargs)
+        django_cache.set(key, html, hook.cache_timeout)
+    else:
+        record(hook.label, 'hits')
+    return html
+
+
+def render_hooks(hook_name, context, *args, **kwargs):
+    """ Renders all the hooks registered under a name. A failing hook is
+    logged and left out, without affecting the others.
+    """
+    html = []
+    for hook in get_hooks(hook_name):
+        try:
+            html.append(render_hook(hook, context, *args, **kwargs) or '')
+        except Exception:
+            record(hook.label, 'errors')
+            logger.exception('Error rendering hook %s', hook.label)
+    return mark_safe(''.join(html))
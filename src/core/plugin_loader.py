@@ -10,6 +10,7 @@ from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.db.utils import OperationalError, ProgrammingError
 
+from core import plugin_hooks
 from core.workflow import ELEMENT_STAGES, STAGES_ELEMENTS
 from submission.models import PLUGIN_WORKFLOW_STAGES
 from utils import models
@@ -76,6 +77,8 @@ def load(directory="plugins", prefix="plugins", permissive=False):
     for k, v in super_hooks.items():
         settings.PLUGIN_HOOKS[k] = v
 
+    plugin_hooks.compile_hooks(settings.PLUGIN_HOOKS)
+
     return plugins
 
 
@@ -0,0 +1,117 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+The roles of users, loaded once and answered from memory.
+
+The (journal pk, role slug) pairs of a user's AccountRoles are read in a
+single query, kept in the shared cache and memoized on the current request,
+so that Account.check_role and the security decorators built on it don't
+query the database on each call.
+
+Each user's roles are stored under a version number that is bumped whenever
+one of their AccountRoles is saved or deleted. Renaming a Role bumps the
+version shared by all users. The versions are kept in the database (see
+utils.cache_versions) so that a change is seen by every process.
+"""
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+
+from utils import cache_versions, request_cache
+
+NAMESPACE = 'role_cache'
+VERSION = 'role_cache'
+
+cache_versions.preload(VERSION)
+
+
+def _version_name(user_id=None):
+    if user_id is None:
+        return VERSION
+    return '{}:{}'.format(VERSION, user_id)
+
+
+def _get_versions(user_id):
+    return cache_versions.get_versions(
+        [_version_name(), _version_name(user_id)],
+    )
+
+
+def load_roles(user_id):
+    """ Returns the (journal pk, role slug) pairs of a user from the
+    database
+    """
+    from core import models
+
+    return frozenset(
+        models.AccountRole.objects.filter(
+            user_id=user_id,
+        ).values_list('journal_id', 'role__slug')
+    )
+
+
+def get_roles(user):
+    """ Returns the (journal pk, role slug) pairs of the roles of a user
+    :param user: An Account
+    :return: frozenset
+    """
+    if user.pk is None:
+        return frozenset()
+    memo = request_cache.get_cache(NAMESPACE)
+    if memo is not None and user.pk in memo:
+        return memo[user.pk]
+
+    key = 'role_cache:roles:{}:{}'.format(user.pk, _get_versions(user.pk))
+    roles = django_cache.get(key)
+    if roles is None:
+        roles = load_roles(user.pk)
+        django_cache.set(key, roles, settings.ROLE_CACHE_TIMEOUT)
+
+    if memo is not None:
+        memo[user.pk] = roles
+    return roles
+
+
+def has_role(user, journal, role_slug):
+    """ Checks if a user has a role on a journal
+    :param user: An Account
+    :param journal: A Journal, its pk or None
+    :param role_slug: The slug of a Role
+    """
+    journal_id = getattr(journal, 'pk', journal)
+    return (journal_id, role_slug) in get_roles(user)
+
+
+def journal_role_slugs(user, journal):
+    """ Returns the slugs of the roles a user has on a journal"""
+    journal_id = getattr(journal, 'pk', journal)
+    return sorted(
+        slug for role_journal_id, slug in get_roles(user)
+        if role_journal_id == journal_id
+    )
+
+
+def invalidate_roles(user_id=None):
+    """ Discards the cached roles of a user
+    :param user_id: The pk of the user, None for all users
+    """
+    cache_versions.bump(_version_name(user_id))
+    if user_id is None:
+        request_cache.clear(NAMESPACE)
+    else:
+        memo = request_cache.get_cache(NAMESPACE)
+        if memo is not None:
+            memo.pop(user_id, None)
+
+
+def invalidate_account_roles(sender, instance, **kwargs):
+    """ Signal receiver for saved and deleted AccountRoles"""
+    invalidate_roles(instance.user_id)
+
+
+def invalidate_all_roles(sender, instance, **kwargs):
+    """ Signal receiver for saved and deleted Roles"""
+    invalidate_roles()
@@ -0,0 +1,178 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+An in-memory routing table matching requests to sites (journals,
+repositories, the press and domain aliases).
+
+The table is built once per process and rebuilt whenever a site model is
+saved or deleted in any process, which is signalled by bumping a version
+number kept in the database (see utils.cache_versions). Site objects are
+kept pickled so that every request gets its own copy without querying the
+database. Domains are matched case insensitively.
+"""
+
+import pickle
+import threading
+
+from django.http.request import split_domain_port
+
+from utils import cache_versions
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+VERSION = 'core.routing'
+
+cache_versions.preload(VERSION)
+
+_lock = threading.Lock()
+_table = None
+
+
+class RoutingTable(object):
+    def __init__(self, version):
+        from core import models as core_models
+        from journal import models as journal_models
+        from press import models as press_models
+        from repository import models as repository_models
+
+        self.version = version
+        self.objects = {}
+
+        presses = list(
+            press_models.Press.objects.select_related('thumbnail_image')
+        )
+        # Journals are always served under the first press, see Journal.press
+        self.press = self._store('press', presses[0]) if presses else None
+        self.press_domains = self._index_domains('press', presses)
+
+        journals = list(
+            journal_models.Journal.objects.select_related(
+                'press_image_override',
+            )
+        )
+        self.journal_domains = self._index_domains('journal', journals)
+        self.journal_codes = {
+            journal.code: ('journal', journal.pk) for journal in journals
+        }
+
+        repositories = list(
+            repository_models.Repository.objects.select_related(
+                'press__thumbnail_image',
+            )
+        )
+        self.repository_domains = self._index_domains(
+            'repository', repositories,
+        )
+        self.repository_short_names = {
+            repository.short_name: ('repository', repository.pk)
+            for repository in repositories
+        }
+
+        aliases = list(
+            core_models.DomainAlias.objects.select_related(
+                'journal__press_image_override',
+                'press__thumbnail_image',
+            )
+        )
+        self.alias_domains = self._index_domains('alias', aliases)
+
+    def _store(self, kind, obj):
+        key = (kind, obj.pk)
+        self.objects[key] = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        return key
+
+    def _index_domains(self, kind, objects):
+        return {
+            obj.domain.lower(): self._store(kind, obj)
+            for obj in objects if obj.domain
+        }
+
+    def get(self, key):
+        """ Returns a fresh copy of a site object, so requests can't leak
+        state into one another.
+        """
+        if key is None:
+            return None
+        return pickle.loads(self.objects[key])
+
+    @staticmethod
+    def _match_domain(domains, host):
+        # Lookup by domain with/without port
+        if host in domains:
+            return domains[host]
+        domain, _port = split_domain_port(host)
+        return domains.get(domain)
+
+    @staticmethod
+    def _match_path(names, path):
+        try:
+            name = path.split('/')[1]
+        except IndexError:
+            return None, None
+        key = names.get(name)
+        if not key:
+            return None, None
+        return key, name
+
+    def resolve(self, request):
+        """ Matches the sites for a request, mirroring the lookups made by
+        the get_by_request methods of each site model.
+        :param request: A Django HttpRequest
+        :return: A tuple of journal, repository, press, domain alias and
+            the path under which the site was matched.
+        """
+        journal = repository = press = alias = site_path = None
+        host = request.get_host().lower()
+
+        key = self._match_domain(self.journal_domains, host)
+        if not key:
+            key, site_path = self._match_path(self.journal_codes, request.path)
+        if key:
+            journal = self.get(key)
+            press = self.get(self.press)
+            return journal, repository, press, alias, site_path
+
+        key = self._match_domain(self.repository_domains, host)
+        if not key:
+            key, site_path = self._match_path(
+                self.repository_short_names, request.path,
+            )
+        if key:
+            repository = self.get(key)
+            return journal, repository, repository.press, alias, site_path
+
+        key = self._match_domain(self.press_domains, host)
+        if key:
+            return journal, repository, self.get(key), alias, site_path
+
+        key = self._match_domain(self.alias_domains, host)
+        if key:
+            alias = self.get(key)
+            press = self.get(self.press) if alias.journal else alias.press
+
+        return journal, repository, press, alias, site_path
+
+
+def get_routing_table():
+    """ Returns the routing table, rebuilding it if a site has changed"""
+    global _table
+    version = cache_versions.get_version(VERSION)
+    table = _table
+    if table is None or table.version != version:
+        with _lock:
+            if _table is None or _table.version != version:
+                logger.debug("Building site routing table v%s" % version)
+                _table = RoutingTable(version)
+            table = _table
+    return table
+
+
+def invalidate_routing_table(**kwargs):
+    """ Signal receiver that forces every process to rebuild its table"""
+    global _table
+    cache_versions.bump(VERSION)
+    _table = None
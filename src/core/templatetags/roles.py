@@ -1,6 +1,6 @@
 from django import template
 
-from core import models
+from core import models, role_cache
 
 register = template.Library()
 
@@ -15,12 +15,7 @@ def user_has_role(request, role):
 @register.simple_tag
 def user_roles(journal, user, slugs=False):
     if slugs:
-        return [
-            ar.role.slug
-            for ar in models.AccountRole.objects.filter(
-                user=user, journal=journal
-            )
-        ]
+        return role_cache.journal_role_slugs(user, journal)
     else:
         return [
             ar
@@ -0,0 +1,100 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from cms import models as cms_models, nav_cache
+from core import context_processors
+from utils import request_cache
+from utils.models import CacheVersion
+from utils.testing import helpers
+
+
+@override_settings(NAVIGATION_CACHE_TIMEOUT=60)
+class TestNavigation(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.request = helpers.Request()
+        self.request.site_type = self.journal_one
+        self.request.model_content_type = ContentType.objects.get_for_model(
+            self.journal_one,
+        )
+        self.about = self.create_item('About', sequence=2, has_sub_nav=True)
+        self.contact = self.create_item('Contact', top_level_nav=self.about)
+        self.news = self.create_item('News', sequence=1)
+
+    def create_item(self, link_name, journal=None, **kwargs):
+        return cms_models.NavigationItem.objects.create(
+            object=journal or self.journal_one,
+            link_name=link_name,
+            link='/{}/'.format(link_name.lower()),
+            **kwargs
+        )
+
+    def get_navigation(self):
+        return context_processors.navigation(self.request)['navigation_items']
+
+    def test_navigation_tree(self):
+        navigation = self.get_navigation()
+
+        self.assertEqual(navigation, [self.news, self.about])
+        with self.assertNumQueries(0):
+            self.assertEqual(navigation[1].sub_nav_items(), [self.contact])
+            self.assertEqual(navigation[0].sub_nav_items(), [])
+
+    def test_navigation_is_cached(self):
+        self.get_navigation()
+
+        # Only the version of the navigation is read
+        with self.assertNumQueries(1):
+            navigation = self.get_navigation()
+            navigation[1].sub_nav_items()
+
+    def test_navigation_is_loaded_once_per_request(self):
+        request_cache.activate()
+        try:
+            self.get_navigation()
+            cache.clear()
+            with self.assertNumQueries(0):
+                self.get_navigation()
+        finally:
+            request_cache.deactivate()
+
+    def test_editing_an_item_invalidates_the_navigation(self):
+        self.get_navigation()
+        self.contact.link_name = 'Get in touch'
+        self.contact.save()
+        self.news.delete()
+
+        navigation = self.get_navigation()
+
+        self.assertEqual(navigation, [self.about])
+        self.assertEqual(
+            navigation[0].sub_nav_items()[0].link_name, 'Get in touch',
+        )
+
+    def test_other_sites_are_kept(self):
+        self.get_navigation()
+        self.create_item('Other', journal=self.journal_two)
+
+        # Only the version of the navigation is read
+        with self.assertNumQueries(1):
+            self.get_navigation()
+
+    def test_changes_made_by_other_processes_are_seen(self):
+        self.get_navigation()
+        cms_models.NavigationItem.objects.filter(
+            pk=self.news.pk,
+        ).update(link_name='Latest news')
+        CacheVersion.objects.filter(
+            name__endswith=nav_cache.navigation_tag(
+                self.request.model_content_type.pk, self.journal_one.pk,
+            ),
+        ).update(version=F('version') + 1)
+
+        navigation = self.get_navigation()
+
+        self.assertEqual(navigation[0].link_name, 'Latest news')
@@ -1,17 +1,20 @@
+from io import BytesIO
 import os
 import shutil
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+import zipfile
 
 from django.urls import reverse
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.utils import timezone
+from mock import patch
 import pdfkit
 
 from utils.testing import helpers
 from submission import models as submission_models
-from core import files
+from core import file_delivery, files, text_extraction, xslt
 
 
 class TestFilesHandler(TestCase):
@@ -166,3 +169,210 @@ class TestFilesHandler(TestCase):
 
         self.assertTrue(indexed)
 
+    def test_unchanged_file_is_not_indexed_again(self):
+        file_ = files.save_file_to_article(
+            self.test_xml_file,
+            article=self.article_in_production,
+            owner=self.request.user,
+            label="test-xml",
+        )
+        file_.index_full_text()
+
+        with patch.object(text_extraction, 'extract_text') as extract_text:
+            indexed = file_.index_full_text()
+
+        self.assertTrue(indexed)
+        extract_text.assert_not_called()
+
+    def test_index_articles(self):
+        file_ = files.save_file_to_article(
+            self.test_xml_file,
+            article=self.article_in_production,
+            owner=self.request.user,
+            label="test-xml",
+        )
+        helpers.create_galley(self.article_in_production, file_)
+        articles = submission_models.Article.objects.filter(
+            pk=self.article_in_production.pk,
+        )
+
+        with TemporaryDirectory() as temp_dir:
+            checkpoint = os.path.join(temp_dir, 'test.checkpoint')
+            stats = text_extraction.index_articles(
+                articles, processes=1, checkpoint=checkpoint,
+            )
+            self.assertFalse(os.path.exists(checkpoint))
+        rerun_stats = text_extraction.index_articles(articles, processes=1)
+
+        file_.refresh_from_db()
+        self.assertEqual(stats['indexed'], 1)
+        self.assertEqual(rerun_stats['unchanged'], 1)
+        self.assertIsNotNone(file_.text.source_checksum)
+
+    def test_index_articles_resumes_from_checkpoint(self):
+        articles = submission_models.Article.objects.filter(
+            pk=self.article_in_production.pk,
+        )
+        with TemporaryDirectory() as temp_dir:
+            checkpoint = os.path.join(temp_dir, 'test.checkpoint')
+            text_extraction.write_checkpoint(
+                checkpoint, {'last_article_id': self.article_in_production.pk},
+            )
+            stats = text_extraction.index_articles(
+                articles, processes=1, checkpoint=checkpoint,
+            )
+
+        self.assertEqual(stats['articles'], 0)
+
+    def test_zip_stream(self):
+        file_ = files.save_file_to_article(
+            self.test_xml_file,
+            article=self.article_in_production,
+            owner=self.request.user,
+            label="test-xml",
+        )
+        self.files.append(file_)
+        entries = files.get_article_zip_entries([file_], article_folders=True)
+
+        archive = zipfile.ZipFile(BytesIO(b''.join(files.zip_stream(entries))))
+
+        self.assertEqual(archive.namelist(), [
+            '{} - A Test Article/{}'.format(self.pk_string, file_.uuid_filename),
+        ])
+        self.assertIn(b'<article>test</article>', archive.read(archive.namelist()[0]))
+
+    def test_serve_zip_stream_stores_archive(self):
+        file_ = files.save_file_to_article(
+            self.test_xml_file,
+            article=self.article_in_production,
+            owner=self.request.user,
+            label="test-xml",
+        )
+        self.files.append(file_)
+        entries = files.get_article_zip_entries([file_])
+
+        with TemporaryDirectory() as temp_dir:
+            store_path = os.path.join(temp_dir, 'archive.zip')
+            response = files.serve_zip_stream(
+                entries, 'archive.zip', store_path=store_path,
+            )
+            content = b''.join(response.streaming_content)
+            stored_response = files.serve_zip_stream(
+                [], 'archive.zip', store_path=store_path,
+            )
+            stored_content = b''.join(stored_response.streaming_content)
+
+        self.assertEqual(content, stored_content)
+        self.assertEqual(stored_response['Content-Length'], str(len(content)))
+
+    def _save_text_file(self):
+        file_ = files.save_file_to_article(
+            self.test_file_two,
+            article=self.article_in_production,
+            owner=self.request.user,
+        )
+        self.files.append(file_)
+        return file_.self_article_path()
+
+    def test_file_response_serves_range(self):
+        path = self._save_text_file()
+        request = RequestFactory().get('/', HTTP_RANGE='bytes=2-4')
+
+        response = file_delivery.file_response(request, path, 'text/plain')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'nte')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/7')
+        self.assertEqual(response['Content-Length'], '3')
+
+    def test_file_response_unsatisfiable_range(self):
+        path = self._save_text_file()
+        request = RequestFactory().get('/', HTTP_RANGE='bytes=10-')
+
+        response = file_delivery.file_response(request, path, 'text/plain')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */7')
+
+    def test_file_response_not_modified(self):
+        path = self._save_text_file()
+        response = file_delivery.file_response(None, path, 'text/plain')
+        request = RequestFactory().get(
+            '/', HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+
+        conditional_response = file_delivery.file_response(
+            request, path, 'text/plain',
+        )
+
+        self.assertEqual(conditional_response.status_code, 304)
+
+    @override_settings(
+        FILE_DELIVERY_BACKEND='core.file_delivery.XAccelRedirectBackend',
+    )
+    def test_file_response_x_accel_redirect(self):
+        path = self._save_text_file()
+
+        response = file_delivery.file_response(None, path, 'text/plain')
+
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/internal-files/articles/{}/{}'.format(
+                self.pk_string, os.path.basename(path),
+            ),
+        )
+        self.assertEqual(response.content, b'')
+
+
+XSL_TEMPLATE = """<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:template match="/"><p>{}<xsl:value-of select="/a"/></p></xsl:template>
+</xsl:stylesheet>
+"""
+
+
+class TestXSLTPool(TestCase):
+
+    def setUp(self):
+        xslt.clear()
+        self.temp_dir = TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.xml_path = os.path.join(self.temp_dir.name, 'article.xml')
+        self.xsl_path = os.path.join(self.temp_dir.name, 'article.xsl')
+        with open(self.xml_path, 'w') as xml_file:
+            xml_file.write('<a>text</a>')
+        self._write_xsl('v1:')
+
+    def _write_xsl(self, prefix, mtime=None):
+        with open(self.xsl_path, 'w') as xsl_file:
+            xsl_file.write(XSL_TEMPLATE.format(prefix))
+        if mtime:
+            os.utime(self.xsl_path, (mtime, mtime))
+
+    def test_stylesheet_is_compiled_once(self):
+        for _ in range(3):
+            result = files.transform_with_xsl(self.xml_path, self.xsl_path)
+
+        self.assertIn('<p>v1:text</p>', str(result))
+        stats = xslt.get_stats()
+        self.assertEqual(stats['compiled'], 1)
+        self.assertEqual(stats['reused'], 2)
+        self.assertEqual(stats['pooled'], 1)
+
+    def test_modified_stylesheet_is_compiled_again(self):
+        files.transform_with_xsl(self.xml_path, self.xsl_path)
+        self._write_xsl('v2:', mtime=os.stat(self.xsl_path).st_mtime + 10)
+
+        result = files.transform_with_xsl(self.xml_path, self.xsl_path)
+
+        self.assertIn('<p>v2:text</p>', str(result))
+        stats = xslt.get_stats()
+        self.assertEqual(stats['compiled'], 2)
+        self.assertEqual(stats['pooled'], 1)
+
+    def test_concurrent_use_gets_separate_copies(self):
+        with xslt.stylesheet(self.xsl_path) as first:
+            with xslt.stylesheet(self.xsl_path) as second:
+                self.assertIsNot(first, second)
+
+        self.assertEqual(xslt.get_stats()['pooled'], 2)
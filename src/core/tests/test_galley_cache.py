@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from mock import patch
+
+from core import galley_cache, models
+from submission import models as submission_models
+from utils.testing import helpers
+
+
+class TestGalleyCache(TestCase):
+
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_submission(
+            journal_id=self.journal_one.pk,
+            stage=submission_models.STAGE_PUBLISHED,
+        )
+        self.temp_dir = tempfile.mkdtemp()
+        self.xml_path = os.path.join(self.temp_dir, 'galley.xml')
+        self._write_xml('<article><p>One</p></article>')
+        xml_file = models.File.objects.create(
+            article_id=self.article.pk,
+            mime_type='application/xml',
+            original_filename='galley.xml',
+            uuid_filename='galley.xml',
+        )
+        self.galley = models.Galley.objects.create(
+            article=self.article,
+            file=xml_file,
+            type='xml',
+        )
+
+        patchers = [
+            patch.object(
+                models.File, 'get_file_path', return_value=self.xml_path,
+            ),
+            patch.object(
+                galley_cache, 'get_store_dir',
+                side_effect=lambda galley: os.path.join(
+                    self.temp_dir, 'rendered', str(galley.pk),
+                ),
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.addCleanup(galley_cache._memory_cache.clear)
+
+    def _write_xml(self, content):
+        with open(self.xml_path, 'w') as xml_file:
+            xml_file.write(content)
+
+    @patch.object(models.Galley, 'render')
+    def test_render_is_stored(self, render):
+        render.return_value = '<table id="t1"><tr><td>1</td></tr></table>'
+
+        first = galley_cache.get_rendered_galley(self.galley)
+        galley_cache._memory_cache.clear()
+        second = galley_cache.get_rendered_galley(self.galley)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(second.html, render.return_value)
+
+    @patch.object(models.Galley, 'render')
+    def test_changed_galley_file_is_rendered_again(self, render):
+        render.return_value = '<p>One</p>'
+        galley_cache.get_rendered_galley(self.galley)
+
+        render.return_value = '<p>Two, a longer paragraph</p>'
+        self._write_xml('<article><p>Two, a longer paragraph</p></article>')
+        rendered = galley_cache.get_rendered_galley(self.galley)
+
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(rendered.html, '<p>Two, a longer paragraph</p>')
+        self.assertEqual(
+            len(os.listdir(galley_cache.get_store_dir(self.galley))), 1,
+        )
+
+    @patch.object(models.Galley, 'render')
+    def test_deleting_galley_removes_renders(self, render):
+        render.return_value = '<p>One</p>'
+        galley_cache.get_rendered_galley(self.galley)
+        store_dir = galley_cache.get_store_dir(self.galley)
+        self.assertTrue(os.path.isdir(store_dir))
+
+        self.galley.delete()
+
+        self.assertFalse(os.path.isdir(store_dir))
+
+    @override_settings(QUEUE_BACKGROUND_JOBS=False)
+    @patch.object(models.Galley, 'render')
+    def test_replaced_galley_file_is_warmed(self, render):
+        render.return_value = '<p>Two</p>'
+        submission_models.Article.objects.filter(pk=self.article.pk).update(
+            date_published=timezone.now(),
+        )
+
+        self._write_xml('<article><p>Two</p></article>')
+        self.galley.file.save()
+        rendered = galley_cache.get_rendered_galley(self.galley, recover=True)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(rendered.html, '<p>Two</p>')
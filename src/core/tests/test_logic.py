@@ -1,7 +1,11 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase, override_settings
 
 from core import logic
-from core.models import SettingGroup
+from core.models import SettingGroup, SettingValue
+from utils import setting_handler
+from utils.models import CacheVersion
 from utils.testing import helpers
 
 class TestLogic(TestCase):
@@ -23,3 +27,58 @@ class TestLogic(TestCase):
             nested_settings=[('support_email','general')],
         )
         self.assertEqual(expected_rendered_setting, rendered_setting)
+
+
+@override_settings(SETTING_CACHE_TIMEOUT=60)
+class TestJournalSettingsContext(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.request = helpers.Request()
+        self.request.journal = self.journal_one
+
+    def test_settings_are_loaded_on_first_access(self):
+        with self.assertNumQueries(0):
+            journal_settings = logic.settings_for_context(self.request)
+
+        self.assertEqual(
+            journal_settings['general']['journal_name'],
+            setting_handler.get_setting(
+                'general', 'journal_name', self.journal_one,
+            ).processed_value,
+        )
+
+    def test_settings_are_cached(self):
+        logic.settings_for_context(self.request)['general']
+
+        # Only the version of the setting cache is read
+        with self.assertNumQueries(1):
+            logic.settings_for_context(self.request)['styling']
+
+    def test_saving_a_setting_invalidates_the_context(self):
+        logic.settings_for_context(self.request)['general']
+        setting_handler.save_setting(
+            'general', 'journal_name', self.journal_one, 'Voyager Journal',
+        )
+
+        journal_settings = logic.settings_for_context(self.request)
+
+        self.assertEqual(
+            journal_settings['general']['journal_name'], 'Voyager Journal',
+        )
+
+    def test_changes_made_by_other_processes_are_seen(self):
+        logic.settings_for_context(self.request)['general']
+        SettingValue.objects.filter(
+            setting__name='journal_name',
+        ).update(value='Voyager Journal')
+        CacheVersion.objects.filter(
+            name=setting_handler.SETTING_CACHE_VERSION,
+        ).update(version=F('version') + 1)
+
+        journal_settings = logic.settings_for_context(self.request)
+
+        self.assertEqual(
+            journal_settings['general']['journal_name'], 'Voyager Journal',
+        )
@@ -2,6 +2,7 @@
 Unit tests for janeway core middleware
 """
 from django.contrib.auth.models import AnonymousUser
+from django.db.models import F
 from django.shortcuts import redirect
 from django.test import TestCase, override_settings
 from django.test.client import RequestFactory
@@ -12,10 +13,12 @@ from core.middleware import (
         SiteSettingsMiddleware,
         TimezoneMiddleware,
 )
+from core import routing
 from core.models import Account, Setting
 from journal.tests.utils import make_test_journal
 from journal.models import Journal
 from press.models import Press
+from utils.models import CacheVersion
 from utils.testing import helpers
 
 
@@ -132,6 +135,56 @@ class TestSiteMiddleware(TestCase):
             fetch_redirect_response=False,
         )
 
+    @override_settings(URL_CONFIG="domain")
+    def test_site_resolution_is_cached(self):
+        # Builds the routing table
+        request = self.request_factory.get("/", SERVER_NAME="journal.org")
+        self.middleware.process_request(request)
+
+        request = self.request_factory.get("/", SERVER_NAME="journal.org")
+        # Only the version of the routing table is read
+        with self.assertNumQueries(1):
+            get_site_resources(request)
+
+    @override_settings(URL_CONFIG="domain")
+    def test_site_resolution_ignores_case(self):
+        self.journal.domain = "Journal.org"
+        self.journal.save()
+
+        request = self.request_factory.get("/", SERVER_NAME="JOURNAL.ORG")
+        journal, *_ = get_site_resources(request)
+
+        self.assertEqual(journal, self.journal)
+
+    @override_settings(URL_CONFIG="domain")
+    def test_site_resolution_after_change_in_another_process(self):
+        request = self.request_factory.get("/", SERVER_NAME="journal.org")
+        self.middleware.process_request(request)
+        # Saved by another process, whose signals don't run in this one
+        Journal.objects.filter(pk=self.journal.pk).update(
+            domain="new-journal.org",
+        )
+        CacheVersion.objects.filter(name=routing.VERSION).update(
+            version=F("version") + 1,
+        )
+
+        request = self.request_factory.get("/", SERVER_NAME="new-journal.org")
+        journal, *_ = get_site_resources(request)
+
+        self.assertEqual(journal, self.journal)
+
+    @override_settings(URL_CONFIG="domain")
+    def test_site_resolution_after_domain_change(self):
+        request = self.request_factory.get("/", SERVER_NAME="journal.org")
+        self.middleware.process_request(request)
+        self.journal.domain = "new-journal.org"
+        self.journal.save()
+
+        request = self.request_factory.get("/", SERVER_NAME="new-journal.org")
+        journal, *_ = get_site_resources(request)
+
+        self.assertEqual(journal, self.journal)
+
 
 class TestTimezoneMiddleware(TestCase):
 
@@ -2,14 +2,18 @@ from datetime import timedelta
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db import IntegrityError
+from django.db.models import F
 from django.forms import Form
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from freezegun import freeze_time
 
-from core import forms, models
+from core import forms, models, role_cache
 from core.model_utils import merge_models, SVGImageFieldForm
 from journal import models as journal_models
+from utils import request_cache
+from utils.models import CacheVersion
 from utils.testing import helpers
 from submission import models as submission_models
 
@@ -203,6 +207,69 @@ class TestAccount(TestCase):
         self.assertEqual('Sky', author.full_name())
 
 
+class TestRoleCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        helpers.create_roles(['editor', 'reviewer'])
+        self.user = helpers.create_user(
+            'editor@voyager.com', roles=['editor'], journal=self.journal_one,
+        )
+
+    def test_check_role(self):
+        self.assertTrue(self.user.check_role(self.journal_one, 'editor'))
+        self.assertFalse(self.user.check_role(self.journal_one, 'reviewer'))
+        self.assertFalse(self.user.check_role(self.journal_two, 'editor'))
+
+    def test_roles_are_loaded_once_per_request(self):
+        request_cache.activate()
+        try:
+            self.user.check_role(self.journal_one, 'editor')
+            with self.assertNumQueries(0):
+                self.user.is_editor(None, journal=self.journal_one)
+                self.user.check_role(self.journal_one, 'reviewer')
+                self.user.check_role(self.journal_two, 'editor')
+        finally:
+            request_cache.deactivate()
+
+    @override_settings(ROLE_CACHE_TIMEOUT=60)
+    def test_roles_are_shared_between_requests(self):
+        self.user.check_role(self.journal_one, 'editor')
+
+        # Only the versions of the roles are read
+        with self.assertNumQueries(1):
+            self.user.check_role(self.journal_one, 'editor')
+
+    @override_settings(ROLE_CACHE_TIMEOUT=60)
+    def test_changes_made_by_other_processes_are_seen(self):
+        self.user.check_role(self.journal_one, 'editor')
+        models.AccountRole.objects.filter(
+            user=self.user,
+        ).update(journal=self.journal_two)
+        CacheVersion.objects.filter(
+            name=role_cache._version_name(self.user.pk),
+        ).update(version=F('version') + 1)
+
+        self.assertFalse(self.user.check_role(self.journal_one, 'editor'))
+        self.assertTrue(self.user.check_role(self.journal_two, 'editor'))
+
+    @override_settings(ROLE_CACHE_TIMEOUT=60)
+    def test_adding_a_role_invalidates_the_cache(self):
+        self.user.check_role(self.journal_one, 'reviewer')
+        self.user.add_account_role('reviewer', self.journal_one)
+
+        self.assertTrue(self.user.check_role(self.journal_one, 'reviewer'))
+
+    @override_settings(ROLE_CACHE_TIMEOUT=60)
+    def test_removing_a_role_invalidates_the_cache(self):
+        self.user.check_role(self.journal_one, 'editor')
+        self.user.remove_account_role('editor', self.journal_one)
+
+        self.assertFalse(self.user.check_role(self.journal_one, 'editor'))
+
+
 class TestSVGImageFormField(TestCase):
     def test_upload_svg_to_svg_image_form_field(self):
         svg_data = """
@@ -364,3 +431,67 @@ class TestLastModifiedModel(TestCase):
 
         # Test
         self.assertEqual(self.article.best_last_modified_date(), file_date)
+
+    def test_effective_last_modified_set_on_save(self):
+        with freeze_time("2021-01-01"):
+            self.article.save()
+
+        self.article.refresh_from_db()
+        self.assertEqual(
+            self.article.effective_last_modified,
+            self.article.last_modified,
+        )
+
+    def test_effective_last_modified_follows_frozen_author(self):
+        with freeze_time("2021-01-01"):
+            self.article.save()
+        with freeze_time("2021-01-02"):
+            frozen_author = submission_models.FrozenAuthor.objects.create(
+                article=self.article,
+                first_name="Frozen",
+            )
+
+        self.article.refresh_from_db()
+        self.assertEqual(
+            self.article.effective_last_modified,
+            frozen_author.last_modified,
+        )
+
+    def test_effective_last_modified_follows_file(self):
+        with freeze_time("2021-01-01"):
+            file_obj = models.File.objects.create()
+            helpers.create_galley(self.article, file_obj)
+            self.article.save()
+        with freeze_time("2021-01-03"):
+            file_obj.save()
+
+        self.article.refresh_from_db()
+        self.assertEqual(
+            self.article.effective_last_modified,
+            file_obj.last_modified,
+        )
+
+    def test_effective_last_modified_follows_issue_membership(self):
+        with freeze_time("2021-01-01"):
+            self.article.save()
+        with freeze_time("2021-01-02"):
+            self.issue.articles.add(self.article)
+
+        self.article.refresh_from_db()
+        self.assertEqual(
+            self.article.effective_last_modified.date().isoformat(),
+            "2021-01-02",
+        )
+
+    def test_effective_last_modified_never_moves_back(self):
+        with freeze_time("2021-01-02"):
+            self.issue.articles.add(self.article)
+            self.article.save()
+        with freeze_time("2021-01-01"):
+            self.issue.save()
+
+        self.article.refresh_from_db()
+        self.assertEqual(
+            self.article.effective_last_modified.date().isoformat(),
+            "2021-01-02",
+        )
@@ -1,9 +1,11 @@
 from collections import namedtuple
 
 from django.core.exceptions import ImproperlyConfigured
-from django.test import TestCase
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase, override_settings
 
-from core import plugin_loader
+from core import plugin_hooks, plugin_loader
 from utils.models import Version
 
 MockSettings = namedtuple("MockSettings", ["JANEWAY_VERSION", "PLUGIN_NAME"])
@@ -46,3 +48,74 @@ class TestPluginLoader(TestCase):
         )
 
         plugin_loader.validate_plugin_version(mock_settings)
+
+
+HOOK_CALLS = []
+
+
+def sample_hook(context, word='hook'):
+    HOOK_CALLS.append(word)
+    return '<p>{}</p>'.format(word)
+
+
+def failing_hook(context):
+    raise ValueError('Broken plugin')
+
+
+def hook_definition(function, **kwargs):
+    return dict(module=__name__, function=function, **kwargs)
+
+
+class TestPluginHooks(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        HOOK_CALLS.clear()
+        plugin_hooks.reset_stats()
+
+    def render(self, template):
+        return Template('{% load hooks %}' + template).render(Context())
+
+    @override_settings(PLUGIN_HOOKS={
+        'test_hook': [
+            hook_definition('failing_hook'),
+            hook_definition('sample_hook'),
+        ],
+    })
+    def test_failing_hook_does_not_hide_others(self):
+        html = self.render('{% hook "test_hook" "word" %}')
+
+        self.assertEqual(html, '<p>word</p>')
+        stats = plugin_hooks.get_stats()
+        self.assertEqual(
+            stats['test_hook:{}.failing_hook'.format(__name__)]['errors'], 1,
+        )
+
+    @override_settings(PLUGIN_HOOKS={
+        'test_hook': [hook_definition('sample_hook')],
+    })
+    def test_hook_calls_are_timed(self):
+        self.render('{% hook "test_hook" %}')
+        self.render('{% hook "test_hook" %}')
+
+        stats = plugin_hooks.get_stats()
+        self.assertEqual(
+            stats['test_hook:{}.sample_hook'.format(__name__)]['calls'], 2,
+        )
+
+    @override_settings(PLUGIN_HOOKS={
+        'test_hook': [hook_definition('sample_hook', cache_timeout=60)],
+    })
+    def test_cacheable_hook_is_rendered_once(self):
+        self.render('{% hook "test_hook" "word" %}')
+        html = self.render('{% hook "test_hook" "word" %}')
+        self.render('{% hook "test_hook" "other" %}')
+
+        self.assertEqual(html, '<p>word</p>')
+        self.assertEqual(HOOK_CALLS, ['word', 'other'])
+
+    @override_settings(PLUGIN_HOOKS={
+        'test_hook': [{'module': __name__, 'function': 'missing_hook'}],
+    })
+    def test_missing_hook_is_skipped(self):
+        self.assertEqual(self.render('{% hook "test_hook" %}'), '')
@@ -1,9 +1,11 @@
 from django.conf import settings
+from django.db.models import F
 from django.test import TestCase, override_settings
 
-from core.models import SettingGroup
+from core.models import SettingGroup, SettingValue
 from utils.testing import helpers
-from utils import setting_handler
+from utils import request_cache, setting_handler
+from utils.models import CacheVersion
 
 
 class TestSettingHandler(TestCase):
@@ -251,3 +253,128 @@ class TestSettingHandler(TestCase):
 
         self.assertEqual(result, setting_value)
         self.assertEqual(xl_result, xl_setting_value)
+
+    def test_get_settings_prefers_journal_values(self):
+        for setting_name in ("test_bulk_default", "test_bulk_override"):
+            setting_handler.create_setting(
+                "test_group", setting_name,
+                type="text",
+                pretty_name="Pretty Name",
+                description=None,
+                is_translatable=False,
+            )
+            setting_handler.save_setting(
+                "test_group", setting_name,
+                journal=None,
+                value="default",
+            )
+        setting_handler.save_setting(
+            "test_group", "test_bulk_override",
+            journal=self.journal_one,
+            value="override",
+        )
+
+        result = setting_handler.get_settings("test_group", self.journal_one)
+
+        self.assertEqual(result["test_bulk_default"].value, "default")
+        self.assertEqual(result["test_bulk_override"].value, "override")
+
+    @override_settings(SETTING_CACHE_TIMEOUT=300)
+    def test_save_setting_invalidates_cache(self):
+        setting_name = "test_save_setting_invalidates_cache"
+        setting_handler.create_setting(
+            "test_group", setting_name,
+            type="text",
+            pretty_name="Pretty Name",
+            description=None,
+            is_translatable=False,
+        )
+        setting_handler.save_setting(
+            "test_group", setting_name,
+            journal=None,
+            value="default",
+        )
+        request_cache.activate()
+        self.addCleanup(request_cache.deactivate)
+
+        # Caches the fallback to the default value
+        setting_handler.get_setting(
+            "test_group", setting_name,
+            journal=self.journal_one,
+        )
+        setting_handler.save_setting(
+            "test_group", setting_name,
+            journal=self.journal_one,
+            value="override",
+        )
+        result = setting_handler.get_setting(
+            "test_group", setting_name,
+            journal=self.journal_one,
+        )
+
+        self.assertEqual(result.value, "override")
+
+    @override_settings(SETTING_CACHE_TIMEOUT=300)
+    def test_get_setting_is_memoized_per_request(self):
+        setting_name = "test_get_setting_is_memoized_per_request"
+        setting_handler.create_setting(
+            "test_group", setting_name,
+            type="text",
+            pretty_name="Pretty Name",
+            description=None,
+            is_translatable=False,
+        )
+        setting_handler.save_setting(
+            "test_group", setting_name,
+            journal=None,
+            value="default",
+        )
+        request_cache.activate()
+        self.addCleanup(request_cache.deactivate)
+        setting_handler.get_setting(
+            "test_group", setting_name,
+            journal=self.journal_one,
+        )
+
+        with self.assertNumQueries(0):
+            result = setting_handler.get_setting(
+                "test_group", setting_name,
+                journal=self.journal_one,
+            )
+
+        self.assertEqual(result.value, "default")
+
+    @override_settings(SETTING_CACHE_TIMEOUT=300)
+    def test_changes_made_by_other_processes_are_seen(self):
+        setting_name = "test_changes_made_by_other_processes_are_seen"
+        setting_handler.create_setting(
+            "test_group", setting_name,
+            type="text",
+            pretty_name="Pretty Name",
+            description=None,
+            is_translatable=False,
+        )
+        setting_handler.save_setting(
+            "test_group", setting_name,
+            journal=None,
+            value="default",
+        )
+        setting_handler.get_setting(
+            "test_group", setting_name,
+            journal=self.journal_one,
+        )
+
+        # Another process saves the setting and bumps the version in the
+        # database, its cache isn't shared with this one.
+        SettingValue.objects.filter(
+            setting__name=setting_name,
+        ).update(value="changed")
+        CacheVersion.objects.filter(
+            name=setting_handler.SETTING_CACHE_VERSION,
+        ).update(version=F("version") + 1)
+        result = setting_handler.get_setting(
+            "test_group", setting_name,
+            journal=self.journal_one,
+        )
+
+        self.assertEqual(result.value, "changed")
@@ -0,0 +1,285 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+Extraction of the text of galleys for full text search, in bulk.
+
+Each article is indexed from one of its galleys: the render galley when it
+has one, otherwise the first galley whose text can be extracted. Parsing
+PDFs and XML is CPU bound, so it is fanned out over a pool of processes
+while the main process writes the results in batches.
+
+The checksum of the file a text was extracted from is stored along with
+the text, so files that haven't changed are not parsed again. Progress is
+saved to a checkpoint file after each batch, so that an interrupted run can
+pick up where it stopped.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+import swapper
+
+from core import files
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when a change to the extractors would change the extracted text
+EXTRACTOR_VERSION = 1
+DEFAULT_BATCH_SIZE = 100
+
+Candidate = namedtuple(
+    'Candidate', ['file_id', 'path', 'mime_type', 'source_checksum'],
+)
+Extraction = namedtuple(
+    'Extraction', ['article_id', 'file_id', 'source_checksum', 'text', 'error'],
+)
+
+
+def get_checkpoint_path(name='full_text'):
+    return os.path.join(files.TEMP_DIR, '{}.checkpoint'.format(name))
+
+
+def source_checksum(path):
+    """ Returns the key identifying the text extracted from a file"""
+    return '{}-v{}-{}'.format(
+        files.checksum(path), EXTRACTOR_VERSION, settings.FULL_TEXT_MAX_LENGTH,
+    )
+
+
+def extract_text(path, mime_type):
+    """ Extracts the text of a file, up to FULL_TEXT_MAX_LENGTH characters
+    :return: The text or None if the file type isn't supported
+    """
+    try:
+        text_parser = files.MIME_TO_TEXT_PARSER[mime_type]
+    except KeyError:
+        return None
+    text = text_parser(path) or ''
+    # Postgres can't build a tsvector out of a very large text
+    return text[:settings.FULL_TEXT_MAX_LENGTH]
+
+
+def extract_article_text(article_id, candidates, force=False):
+    """ Extracts the text of the first galley of an article that has one
+
+    Runs in the worker processes, so it must not touch the database.
+    :param article_id: The pk of the article
+    :param candidates: A list of Candidate, in order of preference
+    :param force: Extract the text even if the file is unchanged
+    :return: Extraction. Its text is None when the file is unchanged
+    """
+    errors = []
+    for candidate in candidates:
+        try:
+            checksum = source_checksum(candidate.path)
+            if not force and checksum == candidate.source_checksum:
+                return Extraction(
+                    article_id, candidate.file_id, checksum, None, None,
+                )
+            text = extract_text(candidate.path, candidate.mime_type)
+        except Exception as e:
+            errors.append('File {}: {!r}'.format(candidate.file_id, e))
+            continue
+        if text is not None:
+            return Extraction(
+                article_id, candidate.file_id, checksum, text, None,
+            )
+    return Extraction(article_id, None, None, None, '; '.join(errors) or None)
+
+
+def get_candidates(articles):
+    """ Returns the files each article could be indexed from
+    :param articles: A queryset of submission.models.Article
+    :return: A dict of article pk to a list of Candidate
+    """
+    from core import models as core_models
+
+    render_galleys = dict(
+        articles.filter(
+            render_galley__isnull=False,
+        ).values_list('pk', 'render_galley_id')
+    )
+    galleys = core_models.Galley.objects.filter(
+        article__in=articles,
+        file__isnull=False,
+        file__mime_type__in=list(files.MIME_TO_TEXT_PARSER),
+    ).select_related(
+        'file__text',
+    ).order_by('article_id', 'sequence', 'pk')
+
+    candidates = {}
+    for galley in galleys:
+        # Only article files are supported, see File.index_full_text
+        path = galley.file.self_article_path()
+        if not path:
+            continue
+        text = galley.file.text
+        candidate = Candidate(
+            galley.file.pk,
+            path,
+            galley.file.mime_type,
+            text.source_checksum if text else None,
+        )
+        article_candidates = candidates.setdefault(galley.article_id, [])
+        if render_galleys.get(galley.article_id) == galley.pk:
+            article_candidates.insert(0, candidate)
+        else:
+            article_candidates.append(candidate)
+    return candidates
+
+
+def save_extractions(extractions):
+    """ Stores the texts extracted for a batch of articles
+
+    Texts are preprocessed in a single query where the FileText model
+    supports it and, on postgres, inserted in a single query. Each article
+    keeps only the text of the file it was indexed from.
+    :param extractions: An iterable of Extraction
+    :return: The number of texts that were stored
+    """
+    from core import models as core_models
+    from submission import search
+
+    FileTextModel = swapper.load_model("core", "FileText")
+    extracted = [e for e in extractions if e.file_id and e.text is not None]
+    kept_files = [e.file_id for e in extractions if e.file_id]
+    article_ids = [e.article_id for e in extractions]
+
+    contents = FileTextModel.preprocess_contents_bulk(
+        [e.text for e in extracted]
+    )
+    with transaction.atomic():
+        # The texts of other files and of the files being replaced go away
+        FileTextModel.objects.filter(
+            file__article_id__in=article_ids,
+        ).exclude(
+            file__pk__in=set(kept_files) - {e.file_id for e in extracted},
+        ).delete()
+
+        text_objects = [
+            FileTextModel(contents=content, source_checksum=e.source_checksum)
+            for e, content in zip(extracted, contents)
+        ]
+        if connection.features.can_return_ids_from_bulk_insert:
+            FileTextModel.objects.bulk_create(text_objects)
+        else:
+            for text_object in text_objects:
+                text_object.save()
+
+        for e, text_object in zip(extracted, text_objects):
+            # Avoids File.save, which would index the file again
+            core_models.File.objects.filter(pk=e.file_id).update(
+                text=text_object,
+            )
+
+    # bulk_create doesn't send the signals search documents rely on
+    search.queue_update(e.article_id for e in extracted)
+    return len(extracted)
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_checkpoint(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    files.write_file_atomically(path, json.dumps(data).encode('utf-8'))
+
+
+def clear_checkpoint(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def index_articles(
+    articles, processes=None, batch_size=DEFAULT_BATCH_SIZE, force=False,
+    checkpoint=None, progress=None,
+):
+    """ Extracts and stores the text of articles in batches
+
+    :param articles: A queryset of submission.models.Article
+    :param processes: The number of worker processes, defaults to the number
+        of CPUs. With 1 the texts are extracted in the current process.
+    :param batch_size: The number of articles written per transaction
+    :param force: Extract texts even when their files are unchanged
+    :param checkpoint: The path of a checkpoint file. When given, articles
+        that were processed by a previous interrupted run are skipped.
+    :param progress: A callable called with a dict of counters after each
+        batch
+    :return: A dict of counters: articles, indexed, unchanged, skipped
+        and errors, a list of (article pk, error) tuples
+    """
+    stats = {
+        'articles': 0, 'indexed': 0, 'unchanged': 0, 'skipped': 0,
+        'errors': [],
+    }
+    if checkpoint:
+        last_article_id = read_checkpoint(checkpoint).get('last_article_id')
+        if last_article_id:
+            articles = articles.filter(pk__gt=last_article_id)
+            logger.info('Resuming text extraction after %s', last_article_id)
+
+    article_ids = list(articles.order_by('pk').values_list('pk', flat=True))
+    processes = processes or os.cpu_count() or 1
+    executor = None
+    if processes > 1:
+        # Forked workers would share the database connection of this process
+        executor = ProcessPoolExecutor(
+            processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+    try:
+        for i in range(0, len(article_ids), batch_size):
+            batch = article_ids[i:i + batch_size]
+            candidates = get_candidates(articles.filter(pk__in=batch))
+            jobs = [
+                (article_id, candidates.get(article_id, []), force)
+                for article_id in batch
+            ]
+            if executor:
+                extractions = list(executor.map(
+                    extract_article_text, *zip(*jobs),
+                ))
+            else:
+                extractions = [extract_article_text(*job) for job in jobs]
+
+            stats['indexed'] += save_extractions(extractions)
+            for extraction in extractions:
+                if extraction.error:
+                    stats['errors'].append(
+                        (extraction.article_id, extraction.error),
+                    )
+                elif not extraction.file_id:
+                    stats['skipped'] += 1
+                elif extraction.text is None:
+                    stats['unchanged'] += 1
+            stats['articles'] += len(batch)
+
+            if checkpoint:
+                write_checkpoint(checkpoint, {'last_article_id': batch[-1]})
+            if progress:
+                progress(stats)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    if checkpoint:
+        clear_checkpoint(checkpoint)
+    return stats
@@ -0,0 +1,89 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+A process-wide pool of compiled XSLT stylesheets.
+
+Compiling a large stylesheet (e.g. the JATS ones) is often slower than the
+transform itself, so compiled stylesheets are kept and reused, keyed by the
+path and mtime of the XSL file. Replacing a file on disk therefore compiles
+it again on next use.
+
+A compiled stylesheet keeps the error log of its last run, so it is only
+lent to one thread at a time: threads transforming with the same stylesheet
+concurrently each get their own copy.
+"""
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import os
+import threading
+
+from lxml import etree
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Idle copies kept of each stylesheet
+MAX_IDLE_COPIES = 4
+
+_idle = defaultdict(list)
+_stats = Counter()
+_lock = threading.Lock()
+
+
+def _get_key(xsl_path):
+    return os.path.abspath(xsl_path), os.stat(xsl_path).st_mtime_ns
+
+
+def _compile(xsl_path):
+    logger.debug('Compiling XSLT stylesheet %s', xsl_path)
+    return etree.XSLT(etree.parse(xsl_path))
+
+
+@contextmanager
+def stylesheet(xsl_path):
+    """ Lends a compiled stylesheet from the pool, compiling it if needed
+    :param xsl_path: The path to the XSL file
+    :return: An lxml.etree.XSLT
+    """
+    key = _get_key(xsl_path)
+    with _lock:
+        idle = _idle.get(key)
+        xsl_transform = idle.pop() if idle else None
+        _stats['reused' if xsl_transform else 'compiled'] += 1
+
+    if xsl_transform is None:
+        xsl_transform = _compile(xsl_path)
+
+    try:
+        yield xsl_transform
+    finally:
+        with _lock:
+            # Drop copies compiled from previous versions of the file
+            for stale in [k for k in _idle if k[0] == key[0] and k != key]:
+                del _idle[stale]
+            if len(_idle[key]) < MAX_IDLE_COPIES:
+                _idle[key].append(xsl_transform)
+
+
+def get_stats():
+    """ Returns how many stylesheets were compiled and reused by this
+    process, and how many are currently pooled
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats['pooled'] = sum(len(idle) for idle in _idle.values())
+    stats.setdefault('compiled', 0)
+    stats.setdefault('reused', 0)
+    return stats
+
+
+def clear():
+    """ Empties the pool and resets its stats"""
+    with _lock:
+        _idle.clear()
+        _stats.clear()
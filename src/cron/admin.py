@@ -12,6 +12,12 @@ class CronTaskAdmin(admin.ModelAdmin):
     list_display = ('pk', 'task_type', 'run_at', 'article')
 
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'task', 'queue', 'status', 'priority', 'attempts',
+                    'run_at', 'worker')
+    list_filter = ('status', 'queue', 'task')
+
+
 class SentReminderAdmin(admin.ModelAdmin):
     list_display = ('type', 'object_id', 'sent')
 
@@ -22,6 +28,7 @@ class ReminderAdmin(admin.ModelAdmin):
 
 admin_list = [
     (models.CronTask, CronTaskAdmin),
+    (models.Job, JobAdmin),
     (models.Reminder, ReminderAdmin),
     (models.SentReminder, SentReminderAdmin),
 ]
@@ -0,0 +1,328 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+A database backed queue of background jobs.
+
+Functions are made into jobs with the job decorator and queued with their
+enqueue method. Jobs are claimed by workers (see the run_jobs command) in
+order of priority, using SELECT ... FOR UPDATE SKIP LOCKED where the database
+supports it so that workers never wait on one another. Failed jobs are
+retried with an exponential backoff until they run out of attempts. Jobs
+whose concurrency is limited are only claimed while fewer of them are
+running, which workers check in turn by locking a JobLock row of the task.
+
+When settings.QUEUE_BACKGROUND_JOBS is disabled, enqueue runs the job
+straight away instead.
+
+    @jobs.job(queue='email', priority=jobs.PRIORITY_HIGH)
+    def send_message(**message):
+        ...
+
+    send_message.enqueue(subject='...', to=['...'])
+"""
+
+from functools import wraps
+from importlib import import_module
+import json
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+# Upper bound of the delay between retries
+MAX_RETRY_DELAY = 60 * 60 * 6
+
+_registry = {}
+
+
+class JobDelayed(Exception):
+    """ Raised by a job to be run again later without using up an attempt"""
+
+
+def get_task(name):
+    """ Returns the function registered as a job under the given name,
+    importing the module it is defined in if needed
+    """
+    if name not in _registry:
+        module_name = name.rsplit('.', 1)[0]
+        try:
+            import_module(module_name)
+        except ImportError:
+            pass
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError('No job registered as {}'.format(name))
+
+
+def _encode(kwargs):
+    return json.dumps(kwargs, cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def job(name=None, queue='default', priority=None, max_attempts=5,
+        retry_delay=60, concurrency=None):
+    """ Registers a function as a background job
+    :param name: Name of the job, defaults to the function's dotted path
+    :param queue: The queue the job is run from, workers can be dedicated
+        to some queues
+    :param priority: Default priority of the job, e.g. PRIORITY_HIGH
+    :param max_attempts: How many times the job is tried before failing
+    :param retry_delay: Seconds before the first retry, doubled each time
+    :param concurrency: Maximum number of instances of the job running at
+        once, across all workers. None for no limit.
+    """
+    def decorator(f):
+        task_name = name or '{}.{}'.format(f.__module__, f.__qualname__)
+
+        @wraps(f)
+        def wrapper(**kwargs):
+            return f(**kwargs)
+
+        def enqueue(run_at=None, unique_key=None, job_priority=None,
+                    **kwargs):
+            """ Queues the job with the given keyword arguments, which must
+            be JSON serialisable (pass primary keys rather than objects).
+            :param run_at: Don't run the job before this datetime
+            :param unique_key: Don't queue the job if a pending job with the
+                same key exists
+            :param job_priority: Overrides the default priority of the job
+            :return: The queued cron.models.Job, or the result of the job
+                when background jobs are disabled
+            """
+            from cron import models
+
+            arguments = _encode(kwargs)
+            if not settings.QUEUE_BACKGROUND_JOBS:
+                return f(**json.loads(arguments))
+
+            if job_priority is None:
+                job_priority = priority
+            if job_priority is None:
+                job_priority = PRIORITY_NORMAL
+
+            if unique_key and models.Job.objects.filter(
+                unique_key=unique_key,
+                status=models.JOB_PENDING,
+            ).exists():
+                return None
+
+            try:
+                with transaction.atomic():
+                    return models.Job.objects.create(
+                        task=task_name,
+                        queue=queue,
+                        arguments=arguments,
+                        priority=job_priority,
+                        max_attempts=max_attempts,
+                        run_at=run_at or timezone.now(),
+                        unique_key=unique_key,
+                        pending_key=unique_key or None,
+                    )
+            except IntegrityError:
+                # Queued by another process since the check above
+                return None
+
+        wrapper.enqueue = enqueue
+        wrapper.task_name = task_name
+        wrapper.queue = queue
+        wrapper.retry_delay = retry_delay
+        wrapper.concurrency = concurrency
+        _registry[task_name] = wrapper
+        return wrapper
+    return decorator
+
+
+def get_worker_name():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def _get_concurrency(task_name):
+    try:
+        return get_task(task_name).concurrency
+    except LookupError:
+        # Claimed anyway, run_job marks it as failed
+        return None
+
+
+def _within_concurrency(candidates):
+    """ Drops the candidate jobs whose task is already running as many times
+    as its concurrency allows. Must be called in the transaction claiming
+    the jobs, the JobLock rows of their tasks stay locked until it ends.
+    """
+    from cron import models
+
+    limits = {}
+    for candidate in candidates:
+        if candidate.task not in limits:
+            limits[candidate.task] = _get_concurrency(candidate.task)
+    limited = sorted(name for name, limit in limits.items() if limit)
+    if not limited:
+        return candidates
+
+    # Locked in the same order by every worker, so they can't deadlock
+    for task_name in limited:
+        models.JobLock.objects.get_or_create(task=task_name)
+    locks = models.JobLock.objects.filter(task__in=limited).order_by('task')
+    if connection.features.has_select_for_update:
+        list(locks.select_for_update())
+
+    running = dict(
+        models.Job.objects.filter(
+            task__in=limited,
+            status=models.JOB_RUNNING,
+        ).values('task').annotate(running=Count('pk')).values_list(
+            'task', 'running',
+        ).order_by()
+    )
+    within = []
+    for candidate in candidates:
+        limit = limits[candidate.task]
+        if limit:
+            if running.get(candidate.task, 0) >= limit:
+                continue
+            running[candidate.task] = running.get(candidate.task, 0) + 1
+        within.append(candidate)
+    return within
+
+
+def claim_jobs(queues=None, limit=1, worker=None):
+    """ Claims due jobs for a worker, highest priority first
+    :param queues: A list of queue names, None for all of them
+    :param limit: Maximum number of jobs to claim
+    :param worker: Name of the worker claiming the jobs
+    :return: A list of cron.models.Job marked as running
+    """
+    from cron import models
+
+    now = timezone.now()
+    with transaction.atomic():
+        due = models.Job.objects.filter(
+            status=models.JOB_PENDING,
+            run_at__lte=now,
+        ).order_by('-priority', 'run_at', 'pk')
+        if queues:
+            due = due.filter(queue__in=queues)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        elif connection.features.has_select_for_update:
+            due = due.select_for_update()
+
+        claimed = _within_concurrency(list(due[:limit]))
+        models.Job.objects.filter(
+            pk__in=[claimed_job.pk for claimed_job in claimed],
+        ).update(
+            status=models.JOB_RUNNING,
+            claimed=now,
+            worker=worker or get_worker_name(),
+            attempts=F('attempts') + 1,
+            pending_key=None,
+        )
+
+    for claimed_job in claimed:
+        claimed_job.status = models.JOB_RUNNING
+        claimed_job.claimed = now
+        claimed_job.attempts += 1
+    return claimed
+
+
+def requeue_abandoned_jobs():
+    """ Puts back jobs whose worker died while running them
+    :return: The number of jobs put back in the queue
+    """
+    from cron import models
+
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    return models.Job.objects.filter(
+        status=models.JOB_RUNNING,
+        claimed__lt=cutoff,
+    ).update(status=models.JOB_PENDING, run_at=timezone.now())
+
+
+def get_retry_delay(task, attempts):
+    return min(task.retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def run_job(claimed_job):
+    """ Runs a claimed job, deleting it when it succeeds and scheduling a
+    retry when it fails
+    :return: True if the job succeeded, False if it failed and None if it
+        was postponed
+    """
+    from cron import models
+
+    try:
+        task = get_task(claimed_job.task)
+    except LookupError as e:
+        logger.error(e)
+        claimed_job.status = models.JOB_FAILED
+        claimed_job.last_error = str(e)
+        claimed_job.save()
+        return False
+
+    try:
+        task(**claimed_job.kwargs)
+    except JobDelayed as e:
+        claimed_job.status = models.JOB_PENDING
+        claimed_job.attempts -= 1
+        claimed_job.run_at = timezone.now() + timedelta(
+            seconds=get_retry_delay(task, 1),
+        )
+        claimed_job.last_error = str(e)
+        claimed_job.save()
+        return None
+    except Exception:
+        logger.exception('Job %s failed', claimed_job)
+        claimed_job.last_error = traceback.format_exc()
+        if claimed_job.attempts >= claimed_job.max_attempts:
+            claimed_job.status = models.JOB_FAILED
+        else:
+            claimed_job.status = models.JOB_PENDING
+            claimed_job.run_at = timezone.now() + timedelta(
+                seconds=get_retry_delay(task, claimed_job.attempts),
+            )
+        claimed_job.save()
+        return False
+    else:
+        claimed_job.delete()
+        return True
+
+
+def run_jobs(queues=None, batch_size=10, limit=None, worker=None):
+    """ Runs due jobs until the queue is drained
+    :param queues: A list of queue names, None for all of them
+    :param batch_size: Number of jobs claimed at once
+    :param limit: Stop after running this many jobs
+    :return: A tuple of the number of jobs that succeeded and failed
+    """
+    succeeded = failed = 0
+    while limit is None or succeeded + failed < limit:
+        size = batch_size
+        if limit is not None:
+            size = min(size, limit - succeeded - failed)
+        claimed = claim_jobs(queues=queues, limit=size, worker=worker)
+        if not claimed:
+            break
+        for claimed_job in claimed:
+            result = run_job(claimed_job)
+            if result:
+                succeeded += 1
+            elif result is False:
+                failed += 1
+    return succeeded, failed
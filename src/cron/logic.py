@@ -4,9 +4,13 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 
+from collections import defaultdict
+
+from django.template import Context, Template
 from django.utils import timezone
 
-from utils import notify, render_template
+from utils import notify, notify_helpers, render_template, setting_handler
+from utils.notify_plugins import notify_email
 from submission import models as submission_models
 from review import models as review_models
 from proofing import models as proofing_models
@@ -21,6 +25,123 @@ def task_runner(task):
         notify.notification(**{'action': ['email'], 'task': task, 'log_dict': log_dict})
 
 
+def get_due_reminder_items(reminders):
+    """ Finds the items each reminder is due for, with one query per type of
+    reminder and target date rather than one per reminder
+    :param reminders: An iterable of cron.models.Reminder
+    :return: A list of (reminder, item) tuples
+    """
+    groups = defaultdict(list)
+    for reminder in reminders:
+        groups[(reminder.type, reminder.run_type, reminder.days)].append(
+            reminder,
+        )
+
+    due = []
+    for group in groups.values():
+        target_date = group[0].target_date()
+        model, query = group[0].get_item_model_and_query()
+        if not target_date or not model:
+            continue
+
+        reminders_by_journal = defaultdict(list)
+        for reminder in group:
+            reminders_by_journal[reminder.journal_id].append(reminder)
+
+        items = model.objects.filter(
+            query,
+            date_due=target_date,
+            article__journal__in=reminders_by_journal.keys(),
+        ).select_related(
+            'article__correspondence_author',
+        )
+        if model is review_models.ReviewAssignment:
+            items = items.select_related('reviewer')
+
+        for item in items:
+            for reminder in reminders_by_journal[item.article.journal_id]:
+                due.append((reminder, item))
+    return due
+
+
+def send_reminders(reminders, test=False):
+    """ Sends the given reminders for every item they are due for today.
+    Each reminder template is compiled once and the emails, which go through
+    the notification plugins, are sent in batches over a single connection.
+    :param reminders: An iterable of cron.models.Reminder
+    :param test: Only print the reminders that would be sent
+    :return: The number of reminders sent
+    """
+    from cron import models
+
+    due = get_due_reminder_items(reminders)
+    already_sent = set(models.SentReminder.objects.filter(
+        type__in={reminder.type for reminder, item in due},
+        object_id__in={item.pk for reminder, item in due},
+        sent=timezone.now().date(),
+    ).values_list('type', 'object_id'))
+
+    templates = {}
+    requests = {}
+    reminders_due = []
+    for reminder, item in due:
+        if test:
+            print("[TEST] reminder for {} due on {}".format(item, item.date_due))
+            continue
+        if (reminder.type, item.pk) in already_sent:
+            print('Reminder {0} for object {1} has already been sent'.format(reminder, item))
+            continue
+
+        journal = reminder.journal
+        context = {'journal': journal, 'article': item.article}
+        if isinstance(item, review_models.ReviewAssignment):
+            to = item.reviewer.email
+            context['review_assignment'] = item
+        else:
+            author = item.article.correspondence_author
+            to = author.email if author else None
+            context['revision'] = item
+        if not to:
+            continue
+
+        template_key = (journal.pk, reminder.template_name)
+        if template_key not in templates:
+            templates[template_key] = Template(setting_handler.get_setting(
+                'email', reminder.template_name, journal,
+            ).value)
+        if journal.pk not in requests:
+            requests[journal.pk] = models.Request()
+            requests[journal.pk].journal = journal
+            requests[journal.pk].site_type = journal
+
+        reminders_due.append((
+            requests[journal.pk],
+            reminder.subject,
+            to,
+            templates[template_key].render(Context(context)),
+            # Ensures we don't send this more than once by accident.
+            models.SentReminder(type=reminder.type, object_id=item.pk),
+        ))
+        already_sent.add((reminder.type, item.pk))
+        print('Reminder {0} sent for {1}'.format(reminder, item))
+
+    # Each batch is recorded as soon as it is handed over, so that a batch
+    # failing to send doesn't cause the previous ones to be sent again.
+    batch_size = notify_email.BATCH_SIZE
+    for i in range(0, len(reminders_due), batch_size):
+        batch = reminders_due[i:i + batch_size]
+        outbox = []
+        for request, subject, to, body, sent_reminder in batch:
+            notify_helpers.send_email_with_body_from_user(
+                request, subject, to, body, outbox=outbox,
+            )
+        notify_email.send_emails(outbox)
+        models.SentReminder.objects.bulk_create(
+            [sent_reminder for *_, sent_reminder in batch],
+        )
+    return len(reminders_due)
+
+
 def process_editor_digest(journal, user_role):
     unassigned_articles = submission_models.Article.objects.filter(stage=submission_models.STAGE_UNASSIGNED,
                                                                    journal=journal)
@@ -81,6 +202,89 @@ def process_reviewer_digest(journal, user_role):
     return render_template.get_requestless_content(context, journal, 'reviewer_digest')
 
 
+def _get_digest_template(journal, template_name):
+    return Template(setting_handler.get_setting(
+        'email', template_name, journal,
+    ).value)
+
+
+def get_journal_digests(journal):
+    """ Renders the digest of every user of a journal who enabled them.
+    Each kind of digest item is queried once for all those users and each
+    template is compiled once.
+    :param journal: A journal.models.Journal
+    :return: A dict mapping core.models.Account to the text of their digest
+    """
+    from core import models as core_models
+
+    user_roles = core_models.AccountRole.objects.filter(
+        journal=journal,
+        user__enable_digest=True,
+        role__name__in=['Editor', 'Author', 'Reviewer'],
+    ).select_related('user', 'role').order_by('user', 'pk')
+
+    users = {}
+    roles = defaultdict(list)
+    for user_role in user_roles:
+        users[user_role.user_id] = user_role.user
+        roles[user_role.user_id].append(user_role.role.name)
+
+    today = timezone.now().date()
+    revisions = defaultdict(list)
+    authors = [pk for pk, names in roles.items() if 'Author' in names]
+    for revision in review_models.RevisionRequest.objects.filter(
+        article__correspondence_author__in=authors,
+        date_completed__isnull=True,
+    ).select_related('article'):
+        revisions[revision.article.correspondence_author_id].append(revision)
+
+    reviews = defaultdict(list)
+    reviewers = [pk for pk, names in roles.items() if 'Reviewer' in names]
+    for review in review_models.ReviewAssignment.objects.filter(
+        reviewer__in=reviewers,
+        date_complete__isnull=True,
+    ).select_related('article'):
+        reviews[review.reviewer_id].append(review)
+
+    editor_text = revision_template = reviewer_template = None
+    digests = {}
+    for user_pk, role_names in roles.items():
+        text = ''
+        for role_name in role_names:
+            if role_name == 'Editor':
+                if editor_text is None:
+                    editor_text = process_editor_digest(journal, None)
+                items = editor_text
+            elif role_name == 'Author':
+                revision_template = revision_template or _get_digest_template(
+                    journal, 'revision_digest',
+                )
+                items = revision_template.render(Context({
+                    'pending_requests': [
+                        r for r in revisions[user_pk] if r.date_due >= today
+                    ],
+                    'overdue_requests': [
+                        r for r in revisions[user_pk] if r.date_due <= today
+                    ],
+                }))
+            else:
+                reviewer_template = reviewer_template or _get_digest_template(
+                    journal, 'reviewer_digest',
+                )
+                items = reviewer_template.render(Context({
+                    'pending_requests': [
+                        r for r in reviews[user_pk] if r.date_due >= today
+                    ],
+                    'overdue_requests': [
+                        r for r in reviews[user_pk] if r.date_due <= today
+                    ],
+                }))
+            if items:
+                text = text + '\n\n' + items
+        digests[users[user_pk]] = text
+    return digests
+
+
 def process_digest_items(journal, user_role):
     text = None
     if user_role.role.name == 'Editor':
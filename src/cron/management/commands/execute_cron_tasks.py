@@ -22,4 +22,6 @@ class Command(BaseCommand):
         call_command('send_digest_emails')
         call_command('send_reminders')
         call_command('poll_crossref')
+        call_command('process_article_accesses')
         models.CronTask.run_tasks()
+        call_command('run_jobs', once=True)
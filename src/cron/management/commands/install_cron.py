@@ -52,8 +52,32 @@ class Command(BaseCommand):
                 'time': 30,
                 'task': 'generate_sitemaps',
             },
+            {
+                'name': '{}_janeway_popular_keywords_job'.format(cwd),
+                'time': 60,
+                'task': 'refresh_popular_keywords',
+            },
         ]
 
+        if settings.BUFFER_ARTICLE_ACCESSES:
+            jobs.append(
+                {
+                    'name': '{}_janeway_article_access_job'.format(cwd),
+                    'time': 5,
+                    'task': 'process_article_accesses',
+                }
+            )
+
+        if settings.QUEUE_BACKGROUND_JOBS:
+            # A fallback for installs without a dedicated run_jobs worker
+            jobs.append(
+                {
+                    'name': '{}_janeway_background_jobs'.format(cwd),
+                    'time': 1,
+                    'task': 'run_jobs --once',
+                }
+            )
+
         if settings.ENABLE_ENHANCED_MAILGUN_FEATURES:
             jobs.append(
                 {
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from cron import jobs
+from utils import mail
+
+
+class Command(BaseCommand):
+    """
+    Runs queued background jobs.
+    """
+
+    help = "Runs queued background jobs. By default the command keeps " \
+           "polling for new jobs, use --once to exit when the queue is empty."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help="Only run jobs from this queue, can be given several times",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help="Number of jobs run in parallel by this worker",
+        )
+        parser.add_argument(
+            '--batch_size', type=int, default=10,
+            help="Number of jobs claimed at once",
+        )
+        parser.add_argument(
+            '--once', action='store_true', default=False,
+            help="Exit once the queue has been drained",
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=2,
+            help="Seconds to wait between polls of an empty queue",
+        )
+
+    def handle(self, *args, **options):
+        """ Runs jobs in as many threads as requested
+
+        :param args: None
+        :param options: Dictionary containing the queues, concurrency,
+            batch size, once and sleep options
+        :return: None
+        """
+        concurrency = max(options['concurrency'], 1)
+        worker = jobs.get_worker_name()
+
+        # Threads outlive each poll, so they keep their mail connections
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                requeued = jobs.requeue_abandoned_jobs()
+                if requeued:
+                    self.stdout.write(
+                        "Requeued {} abandoned jobs".format(requeued)
+                    )
+
+                results = list(executor.map(
+                    lambda i: self.run_worker(
+                        options['queues'], options['batch_size'], worker, i,
+                    ),
+                    range(concurrency),
+                ))
+                succeeded = sum(result[0] for result in results)
+                failed = sum(result[1] for result in results)
+                if succeeded or failed:
+                    self.stdout.write(
+                        "Ran {} jobs, {} failed. Mail: {messages} sent, "
+                        "{latency:.3f}s per batch, {throughput:.1f} per "
+                        "second".format(
+                            succeeded + failed, failed, **mail.get_stats()
+                        )
+                    )
+
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+
+    @staticmethod
+    def run_worker(queues, batch_size, worker, thread):
+        try:
+            return jobs.run_jobs(
+                queues=queues,
+                batch_size=batch_size,
+                worker='{}:{}'.format(worker, thread),
+            )
+        finally:
+            # Each thread has its own database connection
+            connection.close()
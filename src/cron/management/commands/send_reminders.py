@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from cron import models
-from journal import models as journal_models
+from cron import logic, models
 
 
 class Command(BaseCommand):
@@ -16,16 +15,13 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         action = options.get('action')
-        journals = journal_models.Journal.objects.all()
+        reminders = models.Reminder.objects.select_related(
+            'journal',
+        ).order_by('journal', 'pk')
 
-        for journal in journals:
-            print("Processing reminders for journal {0}: {1}".format(journal.pk, journal.name))
+        for reminder in reminders:
+            print("Reminder {0}, target date: {1}".format(reminder, reminder.target_date()))
 
-            reminders = models.Reminder.objects.filter(journal=journal)
-
-            for reminder in reminders:
-                print("Reminder {0}, target date: {1}".format(reminder, reminder.target_date()))
-                if action == 'test':
-                    reminder.send_reminder(test=True)
-                else:
-                    reminder.send_reminder()
+        # Reminders of all journals are processed together
+        sent = logic.send_reminders(reminders, test=action == 'test')
+        print("{0} reminders sent".format(sent))
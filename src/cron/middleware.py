@@ -7,6 +7,9 @@ __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 from cron import models
 from django.conf import settings
 
+# Number of due tasks run by each request
+TASKS_PER_REQUEST = 5
+
 
 class CronMiddleware(object):
 
@@ -19,8 +22,8 @@ class CronMiddleware(object):
         """
         if not settings.DEBUG:
             try:
-                models.CronTask.run_tasks()
+                models.CronTask.run_tasks(limit=TASKS_PER_REQUEST)
             except BaseException:
                 pass
         else:
-            models.CronTask.run_tasks()
+            models.CronTask.run_tasks(limit=TASKS_PER_REQUEST)
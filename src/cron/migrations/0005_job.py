@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cron', '0004_auto_20210831_1159'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=255)),
+                ('queue', models.CharField(default='default', max_length=100)),
+                ('arguments', models.TextField(default='{}', help_text='JSON keyword arguments')),
+                ('priority', models.SmallIntegerField(default=0, help_text='Jobs with a higher priority run first')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('added', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed', models.DateTimeField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('unique_key', models.CharField(blank=True, db_index=True, help_text='A pending job with the same key is not queued twice', max_length=255, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together=set([('status', 'queue', 'run_at')]),
+        ),
+    ]
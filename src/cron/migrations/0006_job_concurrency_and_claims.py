@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 22:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cron', '0005_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='claimed',
+            field=models.DateTimeField(blank=True, help_text='When a process started running the task', null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='pending_key',
+            field=models.CharField(blank=True, editable=False, help_text='The unique key of a job until it is first claimed, which keeps concurrent processes from queuing it twice', max_length=255, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='JobLock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+    ]
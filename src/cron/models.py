@@ -4,14 +4,17 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 
+import json
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from django.db.models import Q
 from datetime import timedelta
 
 from cron import logic
+from cron.jobs import PRIORITY_NORMAL
 from journal import models as journal_models
-from utils import render_template, notify_helpers
 
 
 class CronTask(models.Model):
@@ -27,17 +30,49 @@ class CronTask(models.Model):
     email_html = models.TextField(blank=True, null=True)
     email_cc = models.CharField(max_length=255, blank=True, null=True)
     email_bcc = models.CharField(max_length=255, blank=True, null=True)
+    claimed = models.DateTimeField(
+        blank=True, null=True,
+        help_text="When a process started running the task",
+    )
 
     @staticmethod
-    def run_tasks():
-        tasks = CronTask.objects.filter(run_at__lt=timezone.now())
+    def unclaimed():
+        """ Returns the tasks no process is running. Tasks claimed longer
+        than JOB_TIMEOUT ago were abandoned by a process that died.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+        return CronTask.objects.filter(
+            Q(claimed__isnull=True) | Q(claimed__lt=cutoff),
+        )
 
-        if tasks.exists():
-            # run five cron items
-            for task in tasks[0:5]:
+    @staticmethod
+    def run_tasks(limit=None):
+        """ Runs the tasks that are due, oldest first. Tasks are deleted once
+        they have run, a task that fails is left to be run again.
+        :param limit: Maximum number of tasks to run, None for all of them.
+            Requests only run a few so that a backlog doesn't hold them up,
+            execute_cron_tasks drains the rest.
+        """
+        tasks = CronTask.unclaimed().filter(
+            run_at__lt=timezone.now(),
+        ).order_by('run_at', 'pk')
+        if limit is not None:
+            tasks = tasks[:limit]
+
+        for task in tasks.iterator():
+            # Claiming the task keeps a process running the tasks at the
+            # same time as this one from running it too.
+            claimed = CronTask.unclaimed().filter(pk=task.pk).update(
+                claimed=timezone.now(),
+            )
+            if not claimed:
+                continue
+            try:
                 logic.task_runner(task)
-
-                task.delete()
+            except BaseException:
+                CronTask.objects.filter(pk=task.pk).update(claimed=None)
+                raise
+            task.delete()
 
     @staticmethod
     def add_email_task(to, subject, html, request, article=None, run_at=timezone.now(), cc=None, bcc=None):
@@ -57,6 +92,74 @@ class CronTask(models.Model):
         task.save()
 
 
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_FAILED = 'failed'
+
+JOB_STATUS_CHOICES = (
+    (JOB_PENDING, 'Pending'),
+    (JOB_RUNNING, 'Running'),
+    (JOB_FAILED, 'Failed'),
+)
+
+
+class Job(models.Model):
+    """ A background job, see cron.jobs. Jobs are deleted once they succeed
+    and kept as failed once they run out of attempts.
+    """
+    task = models.CharField(max_length=255)
+    queue = models.CharField(max_length=100, default='default')
+    arguments = models.TextField(default='{}', help_text="JSON keyword arguments")
+    priority = models.SmallIntegerField(
+        default=PRIORITY_NORMAL,
+        help_text="Jobs with a higher priority run first",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=JOB_STATUS_CHOICES,
+        default=JOB_PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    added = models.DateTimeField(default=timezone.now)
+    claimed = models.DateTimeField(blank=True, null=True)
+    worker = models.CharField(max_length=255, blank=True)
+    unique_key = models.CharField(
+        max_length=255, blank=True, null=True, db_index=True,
+        help_text="A pending job with the same key is not queued twice",
+    )
+    pending_key = models.CharField(
+        max_length=255, blank=True, null=True, unique=True, editable=False,
+        help_text="The unique key of a job until it is first claimed, which "
+                  "keeps concurrent processes from queuing it twice",
+    )
+    last_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        index_together = (
+            ('status', 'queue', 'run_at'),
+        )
+
+    def __str__(self):
+        return '{0} ({1}, {2})'.format(self.task, self.status, self.pk)
+
+    @property
+    def kwargs(self):
+        return json.loads(self.arguments)
+
+
+class JobLock(models.Model):
+    """ Locked by the workers claiming the jobs of a task whose concurrency
+    is limited, so that they count its running jobs one at a time. See
+    cron.jobs.claim_jobs.
+    """
+    task = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.task
+
+
 REMINDER_CHOICES = (
     ('review', 'Review (Invited)'),
     ('accepted-review', 'Review (Accepted)'),
@@ -108,23 +211,31 @@ class Reminder(models.Model):
         else:
             return None
 
-    def items_for_reminder(self):
-        model, objects, query = None, None, None
+    def get_item_model_and_query(self):
+        """ Returns the model of the items this reminder is about and the
+        query selecting those still awaiting action
+        """
         from review import models as review_models
 
         if self.type == 'review':
-            model = review_models.ReviewAssignment
-            query = (Q(date_declined__isnull=True) &
-                     Q(date_complete__isnull=True) &
-                     Q(date_accepted__isnull=True))
+            return review_models.ReviewAssignment, (
+                Q(date_declined__isnull=True) &
+                Q(date_complete__isnull=True) &
+                Q(date_accepted__isnull=True)
+            )
         elif self.type == 'accepted-review':
-            model = review_models.ReviewAssignment
-            query = (Q(date_declined__isnull=True) &
-                     Q(date_complete__isnull=True) &
-                     Q(date_accepted__isnull=False))
+            return review_models.ReviewAssignment, (
+                Q(date_declined__isnull=True) &
+                Q(date_complete__isnull=True) &
+                Q(date_accepted__isnull=False)
+            )
         elif self.type == 'revisions':
-            model = review_models.RevisionRequest
-            query = Q(date_completed__isnull=True)
+            return review_models.RevisionRequest, Q(date_completed__isnull=True)
+        return None, None
+
+    def items_for_reminder(self):
+        model, query = self.get_item_model_and_query()
+        objects = None
 
         target_date = self.target_date()
         if target_date:
@@ -133,50 +244,8 @@ class Reminder(models.Model):
         return objects
 
     def send_reminder(self, test=False):
-        from review import models as review_models
-        objects = self.items_for_reminder()
-        request = Request()
-        request.journal = self.journal
-        request.site_type = self.journal
-        to = None
-
-        for item in objects:
-            sent_check = SentReminder.objects.filter(
-                type=self.type,
-                object_id=item.pk,
-                sent=timezone.now().date(),
-            )
-
-            # Create context early so qw can add the correct variable
-            context = {'journal': self.journal, 'article': item.article}
-            # Check if the item is a ReviewAssignment or RevisionRequest
-            if isinstance(item, review_models.ReviewAssignment):
-                to = item.reviewer.email
-                context['review_assignment'] = item
-            elif isinstance(item, review_models.RevisionRequest):
-                to = item.article.correspondence_author.email
-                context['revision'] = item
-
-            if not test and not sent_check and to:
-                message = render_template.get_requestless_content(
-                    context,
-                    self.journal,
-                    self.template_name,
-                )
-
-                notify_helpers.send_email_with_body_from_user(
-                    request,
-                    self.subject,
-                    to,
-                    message,
-                )
-                # Create a SentReminder object to ensure we don't do this more than once by accident.
-                SentReminder.objects.create(type=self.type, object_id=item.pk)
-                print('Reminder sent for {0}'.format(object))
-            elif test:
-                print("[TEST] reminder for {} due on {}".format(item, item.date_due))
-            else:
-                print('Reminder {0} for object {1} has already been sent'.format(self, item))
+        """ Sends this reminder, see cron.logic.send_reminders"""
+        return logic.send_reminders([self], test=test)
 
 
 class Request(object):
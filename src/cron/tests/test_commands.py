@@ -1,8 +1,14 @@
+from smtplib import SMTPException
+from unittest import mock
+
+from django.core import mail
 from django.test import TestCase
 from django.core.management import call_command
 from utils.testing import helpers
 from cron.management.commands import send_reminders
 from cron import forms, models
+from utils import notify
+from utils.notify_plugins import notify_email
 from django.utils import timezone
 
 class SendRemindersCommandTests(TestCase):
@@ -15,6 +21,7 @@ class SendRemindersCommandTests(TestCase):
         cls.press = helpers.create_press()
         cls.journal_one, cls.journal_two = helpers.create_journals()
         cls.review_assignment = helpers.create_review_assignment(journal=cls.journal_one)
+        cls.other_assignment = helpers.create_review_assignment(journal=cls.journal_two)
         cls.review_reminder = helpers.create_reminder(
             journal=cls.journal_one,
             reminder_type='review'
@@ -29,3 +36,70 @@ class SendRemindersCommandTests(TestCase):
             sent=timezone.now().date(),
         )
         self.assertTrue(sent_check)
+
+    def test_handle_sends_each_reminder_once(self):
+        call_command('send_reminders')
+        call_command('send_reminders')
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(models.SentReminder.objects.count(), 1)
+
+    def test_handle_only_sends_reminders_of_each_journal(self):
+        helpers.create_reminder(
+            journal=self.journal_two,
+            reminder_type='review',
+        )
+
+        call_command('send_reminders')
+
+        self.assertEqual(len(mail.outbox), 2)
+        sent_to = sorted(
+            (msg.subject.split(']')[0], msg.to[0]) for msg in mail.outbox
+        )
+        expected = sorted(
+            ('[' + assignment.article.journal.code, assignment.reviewer.email)
+            for assignment in (self.review_assignment, self.other_assignment)
+        )
+        self.assertEqual(sent_to, expected)
+
+    def test_handle_records_each_batch_once_sent(self):
+        helpers.create_reminder(
+            journal=self.journal_two,
+            reminder_type='review',
+        )
+        send_emails = notify_email.send_emails
+        calls = []
+
+        def fail_second_batch(messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise SMTPException
+            send_emails(messages)
+
+        patch_batch_size = mock.patch.object(notify_email, 'BATCH_SIZE', 1)
+        patch_send = mock.patch.object(
+            notify_email, 'send_emails', fail_second_batch,
+        )
+        with patch_batch_size, patch_send:
+            with self.assertRaises(SMTPException):
+                call_command('send_reminders')
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(models.SentReminder.objects.count(), 1)
+
+        call_command('send_reminders')
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(models.SentReminder.objects.count(), 2)
+
+    def test_handle_sends_reminders_through_notification_plugins(self):
+        with mock.patch.object(
+            notify, 'notification', wraps=notify.notification,
+        ) as notification:
+            call_command('send_reminders')
+
+        notification.assert_called_once()
+        kwargs = notification.call_args[1]
+        self.assertEqual(kwargs['action'], ['email'])
+        self.assertEqual(kwargs['to'], self.review_assignment.reviewer.email)
+        self.assertEqual(len(mail.outbox), 1)
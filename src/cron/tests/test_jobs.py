@@ -0,0 +1,165 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from mock import patch
+
+from cron import jobs, models
+from utils.notify_plugins import notify_email
+
+calls = []
+
+
+@jobs.job(name='cron.tests.record_call')
+def record_call(value):
+    calls.append(value)
+    return value
+
+
+@jobs.job(name='cron.tests.one_at_a_time', concurrency=1)
+def one_at_a_time(value):
+    calls.append(value)
+
+
+@jobs.job(name='cron.tests.always_fails', max_attempts=2, retry_delay=10)
+def always_fails():
+    raise ValueError('Failed on purpose')
+
+
+@override_settings(QUEUE_BACKGROUND_JOBS=True)
+class TestJobs(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(QUEUE_BACKGROUND_JOBS=False)
+    def test_enqueue_runs_job_when_queue_disabled(self):
+        result = record_call.enqueue(value=1)
+
+        self.assertEqual(result, 1)
+        self.assertEqual(calls, [1])
+        self.assertFalse(models.Job.objects.exists())
+
+    def test_run_jobs(self):
+        queued = record_call.enqueue(value=1)
+        self.assertEqual(queued.status, models.JOB_PENDING)
+        self.assertEqual(calls, [])
+
+        succeeded, failed = jobs.run_jobs()
+
+        self.assertEqual((succeeded, failed), (1, 0))
+        self.assertEqual(calls, [1])
+        self.assertFalse(models.Job.objects.exists())
+
+    def test_jobs_run_in_order_of_priority(self):
+        record_call.enqueue(value='low', job_priority=jobs.PRIORITY_LOW)
+        record_call.enqueue(value='high', job_priority=jobs.PRIORITY_HIGH)
+        record_call.enqueue(value='normal')
+
+        jobs.run_jobs(batch_size=1)
+
+        self.assertEqual(calls, ['high', 'normal', 'low'])
+
+    def test_future_jobs_are_not_run(self):
+        record_call.enqueue(
+            value=1, run_at=timezone.now() + timedelta(hours=1),
+        )
+
+        jobs.run_jobs()
+
+        self.assertEqual(calls, [])
+
+    def test_unique_key(self):
+        record_call.enqueue(value=1, unique_key='same')
+        record_call.enqueue(value=2, unique_key='same')
+
+        self.assertEqual(models.Job.objects.count(), 1)
+
+    def test_unique_key_queued_concurrently(self):
+        record_call.enqueue(value=1, unique_key='same')
+        # Another process passed the check for a pending job at the same time
+        with patch.object(models.Job.objects, 'filter') as job_filter:
+            job_filter.return_value.exists.return_value = False
+            queued = record_call.enqueue(value=2, unique_key='same')
+
+        self.assertIsNone(queued)
+        self.assertEqual(models.Job.objects.count(), 1)
+
+    def test_unique_key_can_be_queued_once_claimed(self):
+        record_call.enqueue(value=1, unique_key='same')
+        jobs.claim_jobs()
+
+        self.assertIsNotNone(record_call.enqueue(value=2, unique_key='same'))
+
+    def test_concurrency_is_limited_across_workers(self):
+        one_at_a_time.enqueue(value=1)
+        one_at_a_time.enqueue(value=2)
+        record_call.enqueue(value=3)
+
+        first = jobs.claim_jobs(limit=10, worker='first')
+        second = jobs.claim_jobs(limit=10, worker='second')
+
+        self.assertEqual(
+            sorted(claimed.task for claimed in first),
+            ['cron.tests.one_at_a_time', 'cron.tests.record_call'],
+        )
+        self.assertEqual(second, [])
+
+        jobs.run_job(next(
+            claimed for claimed in first
+            if claimed.task == one_at_a_time.task_name
+        ))
+        third = jobs.claim_jobs(limit=10, worker='third')
+        self.assertEqual(
+            [claimed.task for claimed in third], [one_at_a_time.task_name],
+        )
+
+    def test_failed_job_is_retried_then_failed(self):
+        always_fails.enqueue()
+
+        jobs.run_jobs()
+        job = models.Job.objects.get()
+        self.assertEqual(job.status, models.JOB_PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('Failed on purpose', job.last_error)
+
+        models.Job.objects.update(run_at=timezone.now())
+        jobs.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.JOB_FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_abandoned_jobs_are_requeued(self):
+        record_call.enqueue(value=1)
+        claimed = jobs.claim_jobs()
+        models.Job.objects.filter(pk=claimed[0].pk).update(
+            claimed=timezone.now() - timedelta(seconds=120),
+        )
+
+        self.assertEqual(jobs.requeue_abandoned_jobs(), 1)
+        jobs.run_jobs()
+        self.assertEqual(calls, [1])
+
+    def test_email_is_sent_from_queue(self):
+        msg = EmailMultiAlternatives(
+            'Subject', 'Body', 'from@janeway.systems', ['to@janeway.systems'],
+        )
+        msg.attach_alternative('<p>Body</p>', 'text/html')
+        msg.attach('file.txt', b'attached', 'text/plain')
+
+        notify_email.send_message.enqueue(
+            **notify_email.serialize_message(msg)
+        )
+        self.assertEqual(len(mail.outbox), 0)
+
+        jobs.run_jobs(queues=['email'])
+
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual(sent.to, ['to@janeway.systems'])
+        self.assertEqual(sent.alternatives, [('<p>Body</p>', 'text/html')])
+        self.assertEqual(sent.attachments[0][0], 'file.txt')
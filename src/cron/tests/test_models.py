@@ -1,5 +1,10 @@
+from datetime import timedelta
+
 from django.test import TestCase
 from django.core.management import call_command
+from django.utils import timezone
+from mock import patch
+
 from utils.testing import helpers
 from cron import forms, models
 
@@ -21,3 +26,60 @@ class ModelTests(TestCase):
 
     def test_items_for_reminder(self):
         self.assertEqual(1, len(self.review_reminder.items_for_reminder()))
+
+
+class CronTaskTests(TestCase):
+
+    def create_tasks(self, count):
+        for _ in range(count):
+            models.CronTask.objects.create(
+                task_type='email_message',
+                run_at=timezone.now() - timedelta(minutes=1),
+            )
+
+    @patch('cron.logic.task_runner')
+    def test_run_tasks_with_limit(self, task_runner):
+        self.create_tasks(7)
+
+        models.CronTask.run_tasks(limit=5)
+
+        self.assertEqual(task_runner.call_count, 5)
+        self.assertEqual(models.CronTask.objects.count(), 2)
+
+    @patch('cron.logic.task_runner')
+    def test_tasks_claimed_elsewhere_are_not_run(self, task_runner):
+        self.create_tasks(2)
+
+        def run_task(task):
+            # Another process claims the remaining task in the meantime
+            models.CronTask.objects.exclude(pk=task.pk).update(
+                claimed=timezone.now(),
+            )
+        task_runner.side_effect = run_task
+        models.CronTask.run_tasks()
+
+        self.assertEqual(task_runner.call_count, 1)
+        self.assertEqual(models.CronTask.objects.count(), 1)
+
+    @patch('cron.logic.task_runner')
+    def test_failed_tasks_are_kept(self, task_runner):
+        self.create_tasks(1)
+        task_runner.side_effect = ValueError('Failed on purpose')
+
+        with self.assertRaises(ValueError):
+            models.CronTask.run_tasks()
+
+        task = models.CronTask.objects.get()
+        self.assertIsNone(task.claimed)
+
+    @patch('cron.logic.task_runner')
+    def test_abandoned_tasks_are_run(self, task_runner):
+        self.create_tasks(1)
+        models.CronTask.objects.update(
+            claimed=timezone.now() - timedelta(days=1),
+        )
+
+        models.CronTask.run_tasks()
+
+        self.assertEqual(task_runner.call_count, 1)
+        self.assertFalse(models.CronTask.objects.exists())
@@ -3,8 +3,8 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
-from core import models as core_models, workflow
-from utils import transactional_emails, workflow_tasks
+from core import galley_cache, models as core_models, workflow
+from utils import logic as utils_logic, transactional_emails, workflow_tasks
 from events import logic as event_logic
 from journal import logic as journal_logic
 
@@ -113,6 +113,9 @@ event_logic.Events.register_for_event(event_logic.Events.ON_CORRECTIONS_CANCELLE
 # Publication
 event_logic.Events.register_for_event(event_logic.Events.ON_AUTHOR_PUBLICATION,
                                       transactional_emails.send_author_publication_notification)
+event_logic.Events.register_for_event(event_logic.Events.ON_ARTICLE_PUBLISHED,
+                                      galley_cache.warm_article_galleys,
+                                      utils_logic.queue_sitemap_regeneration)
 
 # Send notifications to registered users.
 event_logic.Events.register_for_event(event_logic.Events.ON_ARTICLE_SUBMITTED,
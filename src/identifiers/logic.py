@@ -20,6 +20,7 @@ from django.contrib import messages
 from django.utils import timezone
 
 import sys
+from cron import jobs
 from utils import models as util_models
 from utils.function_cache import cache
 from utils.logger import get_logger
@@ -36,6 +37,33 @@ def register_crossref_doi(identifier):
     return register_batch_of_crossref_dois([identifier.article])
 
 
+@jobs.job(queue='crossref', concurrency=1, retry_delay=60 * 5)
+def register_crossref_doi_in_background(identifier_id):
+    try:
+        identifier = models.Identifier.objects.get(pk=identifier_id)
+    except models.Identifier.DoesNotExist:
+        logger.warning('Identifier %s was deleted before its deposit', identifier_id)
+        return None
+    status, error = identifier.register()
+    if error:
+        logger.error(status)
+    return status, error
+
+
+def queue_crossref_doi_registration(identifier):
+    """ Registers a DOI as a background job, so the request doesn't wait on
+    Crossref. Registers it straight away if background jobs are disabled.
+    :return: A tuple of a status message and whether registration failed
+    """
+    result = register_crossref_doi_in_background.enqueue(
+        identifier_id=identifier.pk,
+        unique_key='crossref_deposit:{}'.format(identifier.pk),
+    )
+    if settings.QUEUE_BACKGROUND_JOBS:
+        return 'DOI registration queued for {}'.format(identifier), False
+    return result
+
+
 def register_batch_of_crossref_dois(articles):
     journals = set([article.journal for article in articles])
     if len(journals) > 1:
@@ -4,11 +4,15 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 from bs4 import BeautifulSoup
+from collections import OrderedDict
+from itertools import chain
 import csv
 from dateutil import parser as dateparser
+import hashlib
 import os
 from os import listdir, makedirs
 from os.path import isfile, join
+import re
 import requests
 from shutil import copyfile
 from urllib.parse import urlencode
@@ -16,18 +20,23 @@ from uuid import uuid4
 
 from django.contrib import messages
 from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import transaction
+from django.db.models import Count, Max, Q
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse
 from django.template.loader import get_template
 from django.core.validators import validate_email, ValidationError
+from django.utils import timezone
 from django.utils.timezone import make_aware
 
-from core import models as core_models, files
+from core import models as core_models, files, galley_cache
 from journal import models as journal_models, issue_forms
 from journal.forms import SearchForm
 from submission import models as submission_models
 from identifiers import models as identifier_models
 from utils import render_template, notify_helpers
+from utils.function_cache import memoize
 from utils.logger import get_logger
 from utils.logic import get_current_request
 from utils.notify_plugins import notify_email
@@ -35,6 +44,11 @@ from events import logic as event_logic
 
 logger = get_logger(__name__)
 
+# Seconds the results of a search are reused for, as they page and re-sort
+SEARCH_RESULTS_TIMEOUT = 60 * 5
+SEARCH_RESULTS_PER_PAGE = 25
+POPULAR_KEYWORDS_LIMIT = 20
+
 
 def install_cover(journal, request):
     """ Installs the default cover for the journal (stored in Files/journal/<id>/cover.png)
@@ -160,6 +174,22 @@ def get_galley_content(article, galleys, recover=False):
         return ''
 
 
+def get_galley_content_and_tables(article, galleys, recover=False):
+    """
+    Gets the best galley and returns its content and the tables in it
+    :param article: Article object
+    :param galleys: list of Galley objects
+    :return: A tuple of the inline content of the galley (HTML or a blank
+        string) and a list of tables, see get_all_tables_from_html
+    """
+    galley = get_best_galley(article, galleys)
+    if galley and galley.file.mime_type in files.XML_MIMETYPES:
+        # The tables are extracted once, when the galley is rendered
+        return galley_cache.get_rendered_galley(galley, recover=recover)
+    content = galley.file_content(recover=recover) if galley else ''
+    return content, get_all_tables_from_html(content)
+
+
 def get_doi_data(article):
     request = get_current_request()
     try:
@@ -449,6 +479,222 @@ def set_search_GET_variables(search_term=False, keyword=False, sort='title'):
     return redirect(redir_str)
 
 
+def normalise_search_term(search_term):
+    """ Returns the form of a search term used to run and cache searches,
+    which are case insensitive
+    """
+    return " ".join(search_term.split()).lower()
+
+
+@memoize(SEARCH_RESULTS_TIMEOUT, tags=[journal_models.SEARCH_RESULTS_TAG])
+def full_text_search_ids(site, search_term, search_filters, sort):
+    """ Returns the ordered ids of the articles matching a full text search
+    :param site: The journal or press searched
+    :param search_term: A term normalised with normalise_search_term
+    :param search_filters: A dict of the fields to search, see SearchForm
+    :param sort: A sort key of ArticleSearchManager
+    :return: A list of Article primary keys
+    """
+    articles = submission_models.Article.objects.search(
+        search_term, search_filters, sort=sort, site=site,
+    )
+    return _unique_ids(articles.values_list("pk", flat=True))
+
+
+@memoize(SEARCH_RESULTS_TIMEOUT, tags=[journal_models.SEARCH_RESULTS_TAG])
+def search_ids(journal, search_term, keyword, sort):
+    """ Returns the ordered ids of the articles of a journal whose title,
+    keywords or authors match a search term, or that have a keyword.
+    :param journal: The journal searched
+    :param search_term: A term normalised with normalise_search_term
+    :param keyword: A keyword, used if there is no search term
+    :param sort: A field to sort articles by
+    :return: A list of Article primary keys
+    """
+    articles = submission_models.Article.objects.filter(
+        journal=journal,
+        stage=submission_models.STAGE_PUBLISHED,
+        date_published__lte=timezone.now()
+    )
+    if search_term:
+        escaped = re.escape(search_term)
+        # checks titles, keywords and subtitles first,
+        # then matches author based on below regex split search term.
+        split_term = [re.escape(word) for word in search_term.split(" ")]
+        split_term.append(escaped)
+        search_regex = "^({})$".format(
+            "|".join({name for name in split_term})
+        )
+        articles = articles.filter(
+            (
+                    Q(title__icontains=search_term) |
+                    Q(keywords__word__iregex=search_regex) |
+                    Q(subtitle__icontains=search_term)
+            )
+            |
+            (
+                    Q(frozenauthor__first_name__iregex=search_regex) |
+                    Q(frozenauthor__last_name__iregex=search_regex)
+            ),
+        ).distinct()
+    elif keyword:
+        articles = articles.filter(keywords__word=keyword)
+    else:
+        return []
+
+    return _unique_ids(articles.order_by(sort).values_list("pk", flat=True))
+
+
+def _unique_ids(ids):
+    # Joins can return an article more than once
+    return list(OrderedDict.fromkeys(ids))
+
+
+def paginate_article_ids(article_ids, page_number, per_page=SEARCH_RESULTS_PER_PAGE):
+    """ Returns a page of articles out of a list of their ids
+
+    Only the articles of the page are fetched, and the list gives the
+    number of pages without counting the results again.
+    :param article_ids: An ordered list of Article primary keys
+    :param page_number: The requested page, invalid pages fall back to the
+        first or last page
+    :param per_page: The number of articles per page
+    :return: A django.core.paginator.Page of articles
+    """
+    paginator = Paginator(article_ids, per_page)
+    try:
+        page = paginator.page(page_number)
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+
+    articles = submission_models.Article.objects.filter(
+        pk__in=page.object_list,
+    ).prefetch_related(
+        'frozenauthor_set',
+    ).in_bulk()
+    page.object_list = [
+        articles[pk] for pk in page.object_list if pk in articles
+    ]
+    return page
+
+
+def get_pagination_params(request):
+    """ Returns the query string of a request without its page, to build
+    links to the other pages of the same results
+    """
+    params = request.GET.copy()
+    params.pop("page", None)
+    return params.urlencode()
+
+
+def refresh_popular_keywords(journal, limit=POPULAR_KEYWORDS_LIMIT):
+    """ Stores the keywords with the most published articles in a journal
+    :param journal: A journal.models.Journal
+    :param limit: The number of keywords stored
+    :return: A list of the stored journal.models.PopularKeyword
+    """
+    keywords = submission_models.Keyword.objects.filter(
+        article__journal=journal,
+        article__stage=submission_models.STAGE_PUBLISHED,
+        article__date_published__lte=timezone.now(),
+    ).annotate(
+        articles_count=Count('article'),
+    ).order_by("-articles_count", "word")[:limit]
+
+    popular_keywords = [
+        journal_models.PopularKeyword(
+            journal=journal,
+            keyword=keyword,
+            article_count=keyword.articles_count,
+            rank=rank,
+        )
+        for rank, keyword in enumerate(keywords, start=1)
+    ]
+    with transaction.atomic():
+        journal_models.PopularKeyword.objects.filter(journal=journal).delete()
+        journal_models.PopularKeyword.objects.bulk_create(popular_keywords)
+    return popular_keywords
+
+
+def get_popular_keywords(journal):
+    """ Returns the most used keywords of a journal, as last refreshed by
+    refresh_popular_keywords. They are computed on the spot the first time.
+    :param journal: A journal.models.Journal
+    :return: A list of submission.models.Keyword
+    """
+    popular_keywords = list(
+        journal_models.PopularKeyword.objects.filter(
+            journal=journal,
+        ).select_related('keyword')
+    )
+    if not popular_keywords:
+        popular_keywords = refresh_popular_keywords(journal)
+    return [popular.keyword for popular in popular_keywords]
+
+
+def get_issue_galleys(issue):
+    """ Returns the galleys of the published articles of an issue, in the
+    order of the articles
+    :param issue: A journal.models.Issue
+    :return: A list of core.models.Galley with their article and file
+    """
+    article_order = {
+        article_id: position for position, article_id in enumerate(
+            issue.get_sorted_articles().values_list('pk', flat=True)
+        )
+    }
+    galleys = core_models.Galley.objects.filter(
+        article__in=article_order.keys(),
+    ).select_related(
+        'article',
+        'file',
+    ).order_by('sequence', 'pk')
+    return sorted(
+        galleys,
+        key=lambda galley: article_order[galley.article_id],
+    )
+
+
+def get_issue_archive_path(issue, entries):
+    """ Returns the path of the stored archive of some issue files, which is
+    keyed on the names, sizes and modification times of the files
+    :param issue: A journal.models.Issue
+    :param entries: A list of (path, name in the archive) tuples
+    """
+    key = hashlib.sha1()
+    for path, name in entries:
+        stat = os.stat(path)
+        key.update('{}:{}:{}\n'.format(
+            name, stat.st_size, stat.st_mtime_ns,
+        ).encode('utf-8'))
+    return os.path.join(
+        issue.get_archive_dir(), '{}.zip'.format(key.hexdigest()),
+    )
+
+
+def serve_issue_archive(issue, galleys):
+    """ Streams a zip archive of the galleys of an issue
+
+    When settings.CACHE_ISSUE_ARCHIVES is enabled, the archive is stored
+    as it is streamed and served from disk until the galleys change.
+    :param issue: A journal.models.Issue
+    :param galleys: A list of core.models.Galley, see get_issue_galleys
+    :return: StreamingHttpResponse
+    """
+    entries = files.get_article_zip_entries(
+        [galley.file for galley in galleys if galley.file],
+        article_folders=True,
+    )
+    file_name = '{}-issue-{}.zip'.format(issue.journal.code, issue.pk)
+    store_path = None
+    if settings.CACHE_ISSUE_ARCHIVES:
+        store_path = get_issue_archive_path(issue, entries)
+        issue.remove_archives(keep=store_path)
+    return files.serve_zip_stream(entries, file_name, store_path=store_path)
+
+
 def fire_submission_notifications(**kwargs):
     request = kwargs.get('request')
 
@@ -647,3 +893,44 @@ def merge_sections(destination, to_merge):
             article.section = destination
             article.save()
         section.delete()
+
+
+def get_journal_last_modified(request, *args, **kwargs):
+    """ Returns the date the published articles and issues of the journal
+    last changed, including articles and issues published since on a set
+    date. Used as the Last-Modified date of the public journal pages.
+    """
+    now = timezone.now()
+    articles = submission_models.Article.objects.filter(
+        journal=request.journal,
+        stage__in=submission_models.PUBLISHED_STAGES,
+        date_published__lte=now,
+    ).aggregate(
+        modified=Max('effective_last_modified'),
+        published=Max('date_published'),
+    )
+    issues = journal_models.Issue.objects.filter(
+        journal=request.journal,
+        date__lte=now,
+    ).aggregate(
+        modified=Max('last_modified'),
+        published=Max('date'),
+    )
+    dates = [
+        date for date in chain(articles.values(), issues.values()) if date
+    ]
+    return max(dates) if dates else None
+
+
+def get_article_last_modified(request, article, *args, **kwargs):
+    """ Returns the date the article or any of the objects shown along
+    with it last changed
+    """
+    dates = [
+        date for date in (
+            article.last_modified,
+            article.effective_last_modified,
+            article.date_published,
+        ) if date and date <= timezone.now()
+    ]
+    return max(dates) if dates else None
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from journal import logic, models
+
+
+class Command(BaseCommand):
+    """ Refreshes the popular keywords of journals"""
+
+    help = "Refreshes the most used keywords of each journal, listed on " \
+           "the search page. Installed as a cron job by install_cron."
+
+    def add_arguments(self, parser):
+        """Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('journal_codes', nargs='*', default=None)
+
+    def handle(self, *args, **options):
+        """ Aggregates the keywords of each journal's published articles.
+
+        :param args: None
+        :param options: Dictionary containing 'journal_codes'
+        :return: None
+        """
+        journals = models.Journal.objects.all()
+        if options.get('journal_codes'):
+            journals = journals.filter(code__in=options['journal_codes'])
+
+        for journal in journals:
+            logic.refresh_popular_keywords(journal)
+        self.stdout.write("Refreshed popular keywords")
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submission', '0070_article_effective_last_modified'),
+        ('journal', '0051_journal_is_archived'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularKeyword',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_count', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField(default=0)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.Journal')),
+                ('keyword', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='submission.Keyword')),
+            ],
+            options={
+                'ordering': ('journal', 'rank'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='popularkeyword',
+            unique_together=set([('journal', 'keyword')]),
+        ),
+    ]
@@ -15,7 +15,7 @@ from django.conf import settings
 from django.core import validators
 from django.db import models, transaction
 from django.db.models import OuterRef, Subquery, Value
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_delete, post_save, m2m_changed
 from django.utils.safestring import mark_safe
 from django.dispatch import receiver
 from django.urls import reverse
@@ -29,14 +29,18 @@ from core import (
 )
 from core.file_system import JanewayFileSystemStorage
 from core.model_utils import AbstractSiteModel, SVGImageField, AbstractLastModifiedModel
+from journal import page_cache
 from press import models as press_models
 from submission import models as submission_models
 from utils import setting_handler, logic, install
-from utils.function_cache import cache
+from utils.function_cache import invalidate_on_change, invalidate_tags, memoize
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Tag of the cached search results, see journal.logic.search_ids
+SEARCH_RESULTS_TAG = 'journal.search_results'
+
 # Issue types
 # Use "Issue" for regular issues (rolling or periodic)
 # Use "Collection" for special collections
@@ -255,17 +259,14 @@ class Journal(AbstractSiteModel):
         setting_handler.save_setting('general', 'publisher_name', self, value)
 
     @property
-    @cache(120)
     def issn(self):
         return setting_handler.get_setting('general', 'journal_issn', self, default=True).value
 
     @property
-    @cache(120)
     def print_issn(self):
         return setting_handler.get_setting('general', 'print_issn', self, default=True).value
 
     @property
-    @cache(120)
     def use_crossref(self):
         return setting_handler.get_setting('Identifiers', 'use_crossref', self, default=True).processed_value
 
@@ -388,7 +389,7 @@ class Journal(AbstractSiteModel):
 
         return users
 
-    @cache(300)
+    @memoize(300, tags=['core.editorialgroup'])
     def editorial_groups(self):
         return core_models.EditorialGroup.objects.filter(journal=self)
 
@@ -489,6 +490,29 @@ class PinnedArticle(models.Model):
         return '{0}, {1}: {2}'.format(self.sequence, self.journal.code, self.article.title)
 
 
+class PopularKeyword(models.Model):
+    """ A keyword among the most used by the published articles of a
+    journal. Refreshed periodically by refresh_popular_keywords rather than
+    aggregated on every search.
+    """
+    journal = models.ForeignKey(Journal, on_delete=models.CASCADE)
+    keyword = models.ForeignKey(
+        'submission.Keyword',
+        on_delete=models.CASCADE,
+    )
+    article_count = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ('journal', 'rank')
+        unique_together = ('journal', 'keyword')
+
+    def __str__(self):
+        return '{0}, {1}: {2}'.format(
+            self.rank, self.journal.code, self.keyword.word,
+        )
+
+
 ISSUE_CODE_RE = re.compile("^[a-zA-Z0-9-_]+$")
 
 
@@ -795,6 +819,30 @@ class Issue(AbstractLastModifiedModel):
     def article_pks(self):
         return [article.pk for article in self.articles.all()]
 
+    def get_archive_dir(self):
+        """ Returns the directory of the stored zip archives of the issue
+        galleys, see journal.logic.serve_issue_archive
+        """
+        return os.path.join(
+            settings.BASE_DIR, 'files', 'issue_archives', str(self.pk),
+        )
+
+    def remove_archives(self, keep=None):
+        """ Removes the stored zip archives of the issue galleys
+        :param keep: The path of an archive to keep
+        """
+        try:
+            names = os.listdir(self.get_archive_dir())
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.get_archive_dir(), name)
+            if path != keep and not name.startswith('.tmp_'):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
     def get_article_order(self, article):
         try:
             try:
@@ -1124,3 +1172,72 @@ def issue_articles_change(sender, **kwargs):
 
 
 m2m_changed.connect(issue_articles_change, sender=Issue.articles.through)
+
+
+@receiver(post_save, sender='core.Galley')
+@receiver(post_delete, sender='core.Galley')
+def remove_issue_archives(sender, instance, raw=False, **kwargs):
+    """ Removes the stored archives of the issues of a changed galley"""
+    if raw or not settings.CACHE_ISSUE_ARCHIVES or not instance.article_id:
+        return
+    for issue in Issue.objects.filter(articles__pk=instance.article_id):
+        issue.remove_archives()
+
+
+invalidate_on_change('core.EditorialGroup')
+# OAI records show details of their journal and press, see api.oai.records
+invalidate_on_change('journal.Journal', 'press.Press')
+
+
+@receiver(post_save, sender='submission.Article')
+def invalidate_search_results(sender, instance, raw=False, **kwargs):
+    # Drafts are not searchable, results otherwise expire after a few minutes
+    if not raw and instance.date_published:
+        invalidate_tags(SEARCH_RESULTS_TAG)
+
+
+# Lookups from the objects shown on public journal pages to their journal
+PAGE_CACHE_DEPENDENCIES = {
+    'journal.Journal': 'pk',
+    'journal.Issue': 'journal_id',
+    'journal.IssueType': 'journal_id',
+    'journal.PinnedArticle': 'journal_id',
+    'submission.Article': 'journal_id',
+    'submission.Section': 'journal_id',
+    'submission.FrozenAuthor': 'article.journal_id',
+    'core.Galley': 'article.journal_id',
+    'core.SettingValue': 'journal_id',
+}
+
+
+def invalidate_public_pages(sender, instance, raw=False, **kwargs):
+    """ Invalidates the cached public pages of the journal of an object.
+    Objects without a journal, such as default setting values, invalidate
+    the pages of every journal.
+    """
+    if raw:
+        return
+    journal_id = instance
+    for attr in PAGE_CACHE_DEPENDENCIES[sender._meta.label].split('.'):
+        journal_id = getattr(journal_id, attr, None)
+    page_cache.invalidate_journal_pages(journal_id)
+
+
+def invalidate_cms_pages(sender, instance, raw=False, **kwargs):
+    """ Invalidates the cached pages of the site a CMS page or navigation
+    item belongs to
+    """
+    if raw:
+        return
+    if instance.content_type and instance.content_type.model == 'journal':
+        page_cache.invalidate_journal_pages(instance.object_id)
+    else:
+        page_cache.invalidate_journal_pages()
+
+
+for label in PAGE_CACHE_DEPENDENCIES:
+    post_save.connect(invalidate_public_pages, sender=label)
+    post_delete.connect(invalidate_public_pages, sender=label)
+for label in ('cms.Page', 'cms.NavigationItem'):
+    post_save.connect(invalidate_cms_pages, sender=label)
+    post_delete.connect(invalidate_cms_pages, sender=label)
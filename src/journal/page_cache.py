@@ -0,0 +1,202 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+A shared cache of the public pages of journals, as seen by anonymous readers.
+
+Pages are keyed on the site, path, language, theme and timezone they were
+rendered for, and on the version of the pages of their journal. Saving an
+article, issue, CMS page or setting of a journal bumps that version (see the
+receivers in journal.models), so its pages are rendered again.
+
+Responses carry an ETag, the hash of the page, and a Last-Modified date
+derived from the timestamps of the content shown and the last change to
+the journal, so readers revalidating a page get a 304 straight from the
+cache. CSRF tokens and the counter tracking id of the session (used as the
+analytics client id) are taken out of the stored pages and filled in with
+those of each reader when served.
+"""
+
+from functools import wraps
+from hashlib import md5, sha1
+import re
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache as django_cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone, translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from utils.function_cache import (
+    get_tag_changes,
+    get_tag_versions,
+    invalidate_tags,
+)
+
+KEY_PREFIX = 'page_cache'
+PRESS_PAGES_TAG = 'journal.pages'
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+COUNTER_TRACKING_PLACEHOLDER = b'__page_cache_counter_tracking__'
+CSRF_INPUT_RE = re.compile(
+    rb'name=["\']csrfmiddlewaretoken["\'] value=["\']([A-Za-z0-9]+)["\']',
+)
+
+
+def journal_pages_tag(journal_id):
+    return '{}:{}'.format(PRESS_PAGES_TAG, journal_id)
+
+
+def invalidate_journal_pages(journal_id=None):
+    """ Invalidates the cached pages of a journal
+    :param journal_id: The pk of the journal, or None for a change that
+        affects every journal, such as a press wide setting
+    """
+    invalidate_tags(
+        journal_pages_tag(journal_id) if journal_id else PRESS_PAGES_TAG,
+    )
+
+
+def _get_counter_tracking(request):
+    """ Returns the counter tracking id of the reader's session, setting it
+    now rather than in CounterCookieMiddleware so that it is rendered in the
+    page
+    """
+    session = getattr(request, 'session', None)
+    if session is None:
+        return None
+    if not session.get('counter_tracking'):
+        session['counter_tracking'] = str(uuid4())
+    return session['counter_tracking']
+
+
+def _is_cacheable_request(request):
+    if not settings.PUBLIC_PAGE_CACHE_TIMEOUT:
+        return False
+    if request.method not in {'GET', 'HEAD'} or not request.journal:
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Flashed messages are only shown once, to the reader they are meant for
+    return not len(messages.get_messages(request))
+
+
+def _get_cache_key(request, tags, session_keys):
+    session = getattr(request, 'session', {})
+    key = '|'.join(str(part) for part in (
+        request.scheme,
+        request.get_host(),
+        request.get_full_path(),
+        request.journal.pk,
+        translation.get_language(),
+        request.journal.get_setting('general', 'journal_theme'),
+        timezone.get_current_timezone_name(),
+        [session.get(session_key) for session_key in session_keys],
+        get_tag_versions(tags),
+    ))
+    return '{}:{}'.format(KEY_PREFIX, sha1(key.encode('utf-8')).hexdigest())
+
+
+def _store(response, cache_key, request, last_modified):
+    """ Stores a rendered page in the cache
+    :return: The cache entry, or None when the page can't be shared
+    """
+    if (
+        response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or 'private' in response.get('Cache-Control', '')
+    ):
+        return None
+
+    content = response.content
+    if request.META.get('CSRF_COOKIE_USED'):
+        match = CSRF_INPUT_RE.search(content)
+        if not match:
+            # The token is in the page somewhere we can't find it
+            return None
+        content = content.replace(match.group(1), CSRF_PLACEHOLDER)
+    counter_tracking = _get_counter_tracking(request)
+    if counter_tracking:
+        content = content.replace(
+            counter_tracking.encode('utf-8'), COUNTER_TRACKING_PLACEHOLDER,
+        )
+
+    entry = {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(md5(content).hexdigest()),
+        'last_modified': last_modified,
+    }
+    django_cache.set(cache_key, entry, settings.PUBLIC_PAGE_CACHE_TIMEOUT)
+    return entry
+
+
+def _serve(request, entry):
+    content = entry['content']
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(
+            CSRF_PLACEHOLDER, get_token(request).encode('utf-8'),
+        )
+    if COUNTER_TRACKING_PLACEHOLDER in content:
+        content = content.replace(
+            COUNTER_TRACKING_PLACEHOLDER,
+            (_get_counter_tracking(request) or '').encode('utf-8'),
+        )
+    return HttpResponse(content, content_type=entry['content_type'])
+
+
+def _finalise(request, response, entry):
+    """ Adds the validators of a page, answering conditional requests"""
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'].timestamp())
+    return get_conditional_response(
+        request,
+        etag=entry['etag'],
+        last_modified=int(entry['last_modified'].timestamp()),
+        response=response,
+    )
+
+
+def cache_public_page(last_modified=None, session_keys=()):
+    """ Caches the pages a view renders for anonymous readers
+
+    :param last_modified: A function taking the arguments of the view and
+        returning the date the content it shows last changed, usually from
+        the last_modified dates of the objects on the page.
+    :param session_keys: Keys of the session the page depends on
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            tags = [PRESS_PAGES_TAG, journal_pages_tag(request.journal.pk)]
+            cache_key = _get_cache_key(request, tags, session_keys)
+            entry = django_cache.get(cache_key)
+            if entry is not None:
+                return _finalise(request, _serve(request, entry), entry)
+
+            dates = get_tag_changes(tags)
+            if last_modified:
+                dates.append(last_modified(request, *args, **kwargs))
+            _get_counter_tracking(request)
+            response = view(request, *args, **kwargs)
+            entry = _store(
+                response,
+                cache_key,
+                request,
+                max((date for date in dates if date), default=timezone.now()),
+            )
+            if entry is None:
+                return response
+            return _finalise(request, response, entry)
+
+        return wrapper
+    return decorator
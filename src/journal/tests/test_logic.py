@@ -0,0 +1,90 @@
+from dateutil import parser as dateparser
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from journal import logic, models
+from submission import models as submission_models
+from utils.testing import helpers
+
+
+class TestSearchResults(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = self.create_article("Calibrating the warp-drive")
+
+    def create_article(self, title, **kwargs):
+        return submission_models.Article.objects.create(
+            journal=self.journal_one,
+            title=title,
+            date_published=dateparser.parse("2020-01-01"),
+            stage=submission_models.STAGE_PUBLISHED,
+            **kwargs
+        )
+
+    def test_normalise_search_term(self):
+        self.assertEqual(
+            logic.normalise_search_term("  Warp   Drive "),
+            "warp drive",
+        )
+
+    def test_search_ids_are_cached(self):
+        search = ("calibrating", None, "title")
+        logic.search_ids(self.journal_one, *search)
+
+        # Only the version of the search results is read
+        with self.assertNumQueries(1):
+            article_ids = logic.search_ids(self.journal_one, *search)
+
+        self.assertEqual(article_ids, [self.article.pk])
+
+    def test_publishing_invalidates_search_ids(self):
+        search = ("calibrating", None, "title")
+        logic.search_ids(self.journal_one, *search)
+
+        other_article = self.create_article("Calibrating the deflector")
+        article_ids = logic.search_ids(self.journal_one, *search)
+
+        self.assertEqual(article_ids, [other_article.pk, self.article.pk])
+
+    def test_paginate_article_ids(self):
+        articles = [self.article] + [
+            self.create_article("Article {}".format(i)) for i in range(4)
+        ]
+        article_ids = [article.pk for article in reversed(articles)]
+
+        page = logic.paginate_article_ids(article_ids, 2, per_page=2)
+
+        self.assertEqual(page.paginator.num_pages, 3)
+        self.assertEqual(list(page), list(reversed(articles))[2:4])
+
+    def test_paginate_article_ids_invalid_page(self):
+        page = logic.paginate_article_ids([self.article.pk], "banana")
+
+        self.assertEqual(list(page), [self.article])
+
+    def test_popular_keywords(self):
+        keyword = submission_models.Keyword.objects.create(word="warp")
+        self.article.keywords.add(keyword)
+
+        popular_keywords = logic.get_popular_keywords(self.journal_one)
+
+        self.assertEqual(popular_keywords, [keyword])
+        self.assertEqual(
+            models.PopularKeyword.objects.get(journal=self.journal_one).rank,
+            1,
+        )
+
+    def test_popular_keywords_are_not_aggregated_again(self):
+        keyword = submission_models.Keyword.objects.create(word="warp")
+        self.article.keywords.add(keyword)
+        logic.refresh_popular_keywords(self.journal_one)
+        other_keyword = submission_models.Keyword.objects.create(word="drive")
+        self.article.keywords.add(other_keyword)
+
+        popular_keywords = logic.get_popular_keywords(self.journal_one)
+
+        self.assertEqual(popular_keywords, [keyword])
@@ -0,0 +1,124 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import F
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, TestCase, override_settings
+
+from journal import models, page_cache
+from utils.models import CacheVersion
+from utils.testing import helpers
+
+
+class TestPageCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.renders = 0
+
+        @page_cache.cache_public_page()
+        def view(request):
+            self.renders += 1
+            return HttpResponse(
+                '<input type="hidden" name="csrfmiddlewaretoken" '
+                'value="{}" /> {}'.format(get_token(request), self.renders),
+            )
+        self.view = view
+
+    def get(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        request.journal = self.journal_one
+        request.user = AnonymousUser()
+        return request
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_page_is_cached(self):
+        first = self.view(self.get())
+        second = self.view(self.get())
+
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertTrue(second.content.endswith(b' 1'))
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_csrf_token_is_filled_in_for_each_reader(self):
+        first = self.view(self.get())
+        request = self.get()
+        second = self.view(request)
+
+        self.assertEqual(self.renders, 1)
+        self.assertNotIn(page_cache.CSRF_PLACEHOLDER, second.content)
+        self.assertNotEqual(
+            page_cache.CSRF_INPUT_RE.search(first.content).group(1),
+            page_cache.CSRF_INPUT_RE.search(second.content).group(1),
+        )
+        self.assertTrue(request.META.get('CSRF_COOKIE_USED'))
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_revalidation_is_not_modified(self):
+        response = self.view(self.get())
+        conditional_response = self.view(
+            self.get(HTTP_IF_NONE_MATCH=response['ETag']),
+        )
+
+        self.assertEqual(conditional_response.status_code, 304)
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_saving_an_issue_invalidates_the_journal_pages(self):
+        self.view(self.get())
+        issue_type, _ = models.IssueType.objects.get_or_create(
+            journal=self.journal_one, code='issue',
+        )
+        models.Issue.objects.create(
+            journal=self.journal_one, issue_type=issue_type,
+        )
+        self.view(self.get())
+
+        self.assertEqual(self.renders, 2)
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_other_journals_pages_are_kept(self):
+        self.view(self.get())
+        self.journal_two.save()
+        self.view(self.get())
+
+        self.assertEqual(self.renders, 1)
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_logged_in_readers_are_not_served_from_cache(self):
+        self.view(self.get())
+        request = self.get()
+        request.user = helpers.create_user("reader@voyager.com")
+        self.view(request)
+
+        self.assertEqual(self.renders, 2)
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_counter_tracking_is_filled_in_for_each_reader(self):
+        @page_cache.cache_public_page()
+        def view(request):
+            self.renders += 1
+            return HttpResponse(
+                "client_id: '{}'".format(request.session['counter_tracking']),
+            )
+
+        first_request, second_request = self.get(), self.get()
+        first_request.session = {}
+        second_request.session = {'counter_tracking': 'second-reader'}
+        view(first_request)
+        response = view(second_request)
+
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(response.content, b"client_id: 'second-reader'")
+
+    @override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+    def test_changes_made_by_other_processes_are_seen(self):
+        self.view(self.get())
+        CacheVersion.objects.filter(
+            name__endswith=page_cache.journal_pages_tag(self.journal_one.pk),
+        ).update(version=F('version') + 1)
+        self.view(self.get())
+
+        self.assertEqual(self.renders, 2)
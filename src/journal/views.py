@@ -4,7 +4,6 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 import json
-import re
 
 from django.conf import settings
 from django.contrib import messages
@@ -15,7 +14,7 @@ from django.contrib.staticfiles.templatetags.staticfiles import static
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.urls import reverse
 from django.db import IntegrityError
-from django.db.models import Q, Count
+from django.db.models import Q
 from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
@@ -28,13 +27,13 @@ from cms import models as cms_models
 from core import (
     files,
     models as core_models,
-    plugin_loader,
+    plugin_hooks,
     logic as core_logic,
 )
-from identifiers import models as id_models
-from journal import logic, models, issue_forms, forms, decorators
+from identifiers import logic as id_logic, models as id_models
+from journal import logic, models, issue_forms, forms, decorators, page_cache
 from journal.logic import get_galley_content
-from metrics.logic import store_article_access
+from metrics.logic import store_article_access, store_article_accesses
 from review import forms as review_forms
 from security.decorators import article_stage_accepted_or_later_required, \
     article_stage_accepted_or_later_or_staff_required, article_exists, file_user_required, has_request, has_journal, \
@@ -50,6 +49,7 @@ logger = get_logger(__name__)
 
 @has_journal
 @decorators.frontend_enabled
+@page_cache.cache_public_page(last_modified=logic.get_journal_last_modified)
 def home(request):
     """ Renders a journal homepage.
 
@@ -74,12 +74,10 @@ def home(request):
 
     # call all registered plugin block hooks to get relevant contexts
 
-    for hook in settings.PLUGIN_HOOKS.get('yield_homepage_element_context', []):
-        if hook.get('name') in homepage_element_names:
+    for hook in plugin_hooks.get_hooks('yield_homepage_element_context'):
+        if hook.name in homepage_element_names:
             try:
-                hook_module = plugin_loader.import_module(hook.get('module'))
-                function = getattr(hook_module, hook.get('function'))
-                element_context = function(request, homepage_elements)
+                element_context = hook(request, homepage_elements)
 
                 for k, v in element_context.items():
                     context[k] = v
@@ -170,6 +168,12 @@ def funder_articles(request, funder_id):
 
 @has_journal
 @decorators.frontend_enabled
+@page_cache.cache_public_page(
+    last_modified=logic.get_journal_last_modified,
+    session_keys=(
+        'article_filters', 'article_show', 'article_sort', 'active_filters',
+    ),
+)
 def articles(request):
     """ Renders the list of articles in the journal.
 
@@ -226,6 +230,7 @@ def articles(request):
 
 @has_journal
 @decorators.frontend_enabled
+@page_cache.cache_public_page(last_modified=logic.get_journal_last_modified)
 def issues(request):
     """ Renders the list of issues in the journal.
 
@@ -283,6 +288,7 @@ def volume(request, volume_number, issue_number):
 
 @has_journal
 @decorators.frontend_enabled
+@page_cache.cache_public_page(last_modified=logic.get_journal_last_modified)
 def issue(request, issue_id, show_sidebar=True):
     """ Renders a specific issue/collection in the journal.
 
@@ -338,6 +344,7 @@ def issue(request, issue_id, show_sidebar=True):
 
 @has_journal
 @decorators.frontend_enabled
+@page_cache.cache_public_page(last_modified=logic.get_journal_last_modified)
 def collections(request, issue_type_code="collection"):
     """
     Displays a list of collection Issues.
@@ -417,22 +424,30 @@ def article(request, identifier_type, identifier):
     """
     article_object = submission_models.Article.get_article(request.journal, identifier_type, identifier)
 
+    # Views are counted on every request, including those served from cache
+    if article_object.is_published:
+        store_article_access(request, article_object, 'view')
+
+    return article_page(request, article_object, identifier_type, identifier)
+
+
+@page_cache.cache_public_page(last_modified=logic.get_article_last_modified)
+def article_page(request, article_object, identifier_type, identifier):
+    """ Renders the page of an article, see article"""
     content, tables_in_galley = None, None
     galleys = article_object.galley_set.filter(public=True)
 
     # check if there is a galley file attached that needs rendering
     if article_object.is_published:
-        content = get_galley_content(article_object, galleys, recover=True)
-        tables_in_galley = logic.get_all_tables_from_html(content)
+        content, tables_in_galley = logic.get_galley_content_and_tables(
+            article_object, galleys, recover=True,
+        )
     else:
         article_object.abstract = (
             "<p><strong>This is an accepted article with a DOI pre-assigned"
             " that is not yet published.</strong></p>"
         ) + (article_object.abstract or "")
 
-    if article_object.is_published:
-        store_article_access(request, article_object, 'view')
-
     template = 'journal/article.html'
     context = {
         'article': article_object,
@@ -503,6 +518,7 @@ def print_article(request, identifier_type, identifier):
 @has_journal
 @decorators.frontend_enabled
 @keyword_page_enabled
+@page_cache.cache_public_page(last_modified=logic.get_journal_last_modified)
 def keywords(request):
     """
     Renders a list of keywords
@@ -1079,7 +1095,9 @@ def publish_article(request, article_id):
             # Attempt to register xref DOI
             for identifier in article.identifier_set.all():
                 if identifier.id_type == 'doi':
-                    status, error = identifier.register()
+                    status, error = id_logic.queue_crossref_doi_registration(
+                        identifier,
+                    )
                     messages.add_message(
                         request,
                         messages.INFO if not error else messages.ERROR,
@@ -1860,10 +1878,12 @@ def author_list(request):
     return render(request, template, context)
 
 
-def sitemap(request, issue_id=None):
+def sitemap(request, issue_id=None, shard=None):
     """
     Renders an XML sitemap based on articles and pages available to the journal.
     :param request: HttpRequest object
+    :param issue_id: The pk of an Issue, for issue sitemaps
+    :param shard: The shard number, for issues split over several sitemaps
     :return: HttpResponse object
     """
     try:
@@ -1874,9 +1894,13 @@ def sitemap(request, issue_id=None):
                 pk=issue_id,
                 journal=request.journal,
             )
+            if shard:
+                file_name = '{}_sitemap_{}.xml'.format(issue.pk, shard)
+            else:
+                file_name = '{}_sitemap.xml'.format(issue.pk)
             path_parts = [
                 request.journal.code,
-                '{}_sitemap.xml'.format(issue.pk),
+                file_name,
             ]
         else:
             path_parts = [
@@ -1885,7 +1909,7 @@ def sitemap(request, issue_id=None):
             ]
 
         if path_parts:
-            return files.serve_sitemap_file(path_parts)
+            return files.serve_sitemap_file(path_parts, request=request)
     except FileNotFoundError:
         logger.warning('Sitemap for {} not found.'.format(request.journal.name))
 
@@ -1915,10 +1939,14 @@ def full_text_search(request):
     )
     if search_term:
         form.is_valid()
-        articles = submission_models.Article.objects.search(
-            search_term, form.get_search_filters(),
-            sort=form.cleaned_data.get("sort"),
-            site=request.site_object,
+        article_ids = logic.full_text_search_ids(
+            request.site_object,
+            logic.normalise_search_term(search_term),
+            form.get_search_filters(),
+            form.cleaned_data.get("sort"),
+        )
+        articles = logic.paginate_article_ids(
+            article_ids, request.GET.get('page', 1),
         )
 
     template = 'journal/full-text-search.html'
@@ -1927,6 +1955,7 @@ def full_text_search(request):
         'article_search': search_term,
         'keyword': keyword,
         'form': form,
+        'pagination_params': logic.get_pagination_params(request),
     }
 
     return render(request, template, context)
@@ -1948,47 +1977,19 @@ def old_search(request):
 
     if redir:
         return redir
-    from itertools import chain
-    if search_term:
-        escaped = re.escape(search_term)
-        # checks titles, keywords and subtitles first,
-        # then matches author based on below regex split search term.
-        split_term = [re.escape(word) for word in search_term.split(" ")]
-        split_term.append(escaped)
-        search_regex = "^({})$".format(
-            "|".join({name for name in split_term})
-        )
-        articles = submission_models.Article.objects.filter(
-            (
-                    Q(title__icontains=search_term) |
-                    Q(keywords__word__iregex=search_regex) |
-                    Q(subtitle__icontains=search_term)
-            )
-            |
-            (
-                    Q(frozenauthor__first_name__iregex=search_regex) |
-                    Q(frozenauthor__last_name__iregex=search_regex)
-            ),
-            journal=request.journal,
-            stage=submission_models.STAGE_PUBLISHED,
-            date_published__lte=timezone.now()
-        ).distinct().order_by(sort)
-
     # just single keyword atm. but keyword is included in article_search.
-    elif keyword:
-        articles = submission_models.Article.objects.filter(
-            keywords__word=keyword,
-            journal=request.journal,
-            stage=submission_models.STAGE_PUBLISHED,
-            date_published__lte=timezone.now()
-        ).order_by(sort)
+    if search_term or keyword:
+        article_ids = logic.search_ids(
+            request.journal,
+            logic.normalise_search_term(search_term) if search_term else None,
+            keyword,
+            sort,
+        )
+        articles = logic.paginate_article_ids(
+            article_ids, request.GET.get('page', 1),
+        )
 
-    keyword_limit = 20
-    popular_keywords = submission_models.Keyword.objects.filter(
-        article__journal=request.journal,
-        article__stage=submission_models.STAGE_PUBLISHED,
-        article__date_published__lte=timezone.now(),
-    ).annotate(articles_count=Count('article')).order_by("-articles_count")[:keyword_limit]
+    popular_keywords = logic.get_popular_keywords(request.journal)
 
     template = 'journal/search.html'
     context = {
@@ -1997,7 +1998,8 @@ def old_search(request):
         'keyword': keyword,
         'form': form,
         'sort': sort,
-        'all_keywords': popular_keywords
+        'all_keywords': popular_keywords,
+        'pagination_params': logic.get_pagination_params(request),
     }
 
     return render(request, template, context)
@@ -2302,25 +2304,12 @@ def download_issue(request, issue_id):
         pk=issue_id,
         journal=request.journal,
     )
-    articles = issue_object.get_sorted_articles()
-
-    galley_files = []
-
-    for article in articles:
-        for galley in article.galley_set.all():
-            store_article_access(
-                request,
-                article,
-                'download',
-                galley_type=galley.type,
-            )
-            galley_files.append(galley.file)
-
-    zip_file, file_name = files.zip_article_files(
-        galley_files,
-        article_folders=True,
+    galleys = logic.get_issue_galleys(issue_object)
+    store_article_accesses(
+        request,
+        [(galley.article, 'download', galley.type) for galley in galleys],
     )
-    return files.serve_temp_file(zip_file, file_name)
+    return logic.serve_issue_archive(issue_object, galleys)
 
 
 def download_issue_galley(request, issue_id, galley_id):
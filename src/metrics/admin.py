@@ -44,6 +44,19 @@ class HistoricArticleAccessAdmin(admin.ModelAdmin):
     raw_id_fields = ('article',)
 
 
+class PendingArticleAccessAdmin(admin.ModelAdmin):
+    list_display = ('article', 'type', 'galley_type', 'accessed')
+    list_filter = ('type', 'galley_type')
+    raw_id_fields = ('article',)
+
+
+class DailyArticleAccessAdmin(admin.ModelAdmin):
+    list_display = ('article', 'date', 'type', 'galley_type', 'country', 'accesses')
+    list_filter = ('type', 'galley_type')
+    raw_id_fields = ('article',)
+    date_hierarchy = 'date'
+
+
 class AltMetricAdmin(admin.ModelAdmin):
     list_display = ('article', 'source', 'pid')
     list_filter = ('article', 'source')
@@ -80,6 +93,8 @@ admin_list = [
     (models.AltMetric, AltMetricAdmin),
     (models.ArticleAccess, ArticleAccessAdmin),
     (models.HistoricArticleAccess, HistoricArticleAccessAdmin),
+    (models.DailyArticleAccess, DailyArticleAccessAdmin),
+    (models.PendingArticleAccess, PendingArticleAccessAdmin),
     (models.ArticleLink, ArticleLinkAdmin),
     (models.BookLink, BookLinkAdmin),
 ]
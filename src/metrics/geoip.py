@@ -0,0 +1,94 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+Country lookups for article and preprint accesses.
+
+The GeoLite2 database is opened once per process (memory mapped) and both
+the IP lookups and the Country objects are cached in process memory.
+"""
+
+import os
+import threading
+from functools import lru_cache
+
+import geoip2.database
+from geoip2.errors import AddressNotFoundError
+import maxminddb
+
+from django.conf import settings
+
+from core import models as core_models
+
+GEOIP_DB_PATH = os.path.join(
+    settings.BASE_DIR,
+    'metrics',
+    'geolocation',
+    'GeoLite2-Country.mmdb',
+)
+
+_reader = None
+_countries = None
+_lock = threading.Lock()
+
+
+def get_reader():
+    """ Returns the process wide GeoIP reader, opening it on first use"""
+    global _reader
+    if _reader is None:
+        with _lock:
+            if _reader is None:
+                _reader = geoip2.database.Reader(
+                    GEOIP_DB_PATH,
+                    mode=maxminddb.MODE_MMAP,
+                )
+    return _reader
+
+
+@lru_cache(maxsize=10000)
+def get_iso_country_code(ip):
+    """ Returns the ISO code of the country of an IP address
+    :param ip: An IP address string
+    :return: An ISO 3166-1 alpha-2 code or 'OTHER' when unknown
+    """
+    try:
+        response = get_reader().country(ip)
+        return response.country.iso_code if response.country.iso_code else 'OTHER'
+    except AddressNotFoundError:
+        if ip == '127.0.0.1':
+            return "GB"
+        return 'OTHER'
+    except (ValueError, TypeError):
+        # Missing or malformed addresses
+        return 'OTHER'
+
+
+def get_country(code):
+    """ Returns the Country matching an ISO code, or None
+    :param code: An ISO 3166-1 alpha-2 code
+    :return: core.models.Country or None
+    """
+    global _countries
+    if _countries is None:
+        _countries = {
+            country.code: country
+            for country in core_models.Country.objects.all()
+        }
+    return _countries.get(code)
+
+
+def get_countries(ips):
+    """ Looks up the Country of many IP addresses at once
+    :param ips: An iterable of IP address strings
+    :return: A dict of IP address to Country (or None)
+    """
+    return {ip: get_country(get_iso_country_code(ip)) for ip in set(ips)}
+
+
+def clear_caches():
+    """ Drops the cached lookups (e.g. after updating the countries)"""
+    global _countries
+    get_iso_country_code.cache_clear()
+    _countries = None
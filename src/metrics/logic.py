@@ -4,28 +4,34 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 import calendar
-import os
+from collections import Counter
 from datetime import timedelta
+from itertools import chain
 from user_agents import parse as parse_ua_string
-import geoip2.database
-from geoip2.errors import AddressNotFoundError
 import hashlib
 
-from django.db import transaction, OperationalError
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractYear, TruncDate, TruncMonth
 from django.utils import timezone
 from django.conf import settings
 
-from metrics import models
+from metrics import geoip, models
 from utils import shared
 from utils.decorators import retry
-from utils.function_cache import cache
-from core import models as core_models
+from utils.function_cache import memoize
 from events import logic as event_logic
 
+# Repeated accesses by the same reader within this many seconds are ignored
+ACCESS_WINDOW = 3600
 
-@cache(300)
+
+def _month_key(date):
+    return '{0}-{1}'.format(date.strftime('%b'), date.year)
+
+
+@memoize(300)
 def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=False):
-    from submission import models as submission_models
     from journal import models as journal_models
 
     view_access_count = 0
@@ -38,7 +44,36 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
     year_of_publication = {}
 
     for date in report_months:
-        press_months['{0}-{1}'.format(date.strftime('%b'), date.year)] = ''
+        press_months[_month_key(date)] = ''
+
+    # year of publication is for COUNTER journal report 5
+    # it needs to have "each YOP in the current decade and in the immediately previous decade as separate columns"
+    # easiest way to do this is simply to count backwards 19 years as the theoretical maximum
+    year = timezone.now().year
+    report_years = range(year, year - 19, -1)
+    for year_counter in report_years:
+        year_of_publication[year_counter] = ''
+
+    # Monthly totals of every journal in a single query
+    monthly_totals = {}
+    rows = models.DailyArticleAccess.objects.filter(
+        date__range=[start_date.date(), end_date.date()],
+    ).annotate(
+        month=TruncMonth('date'),
+    ).values(
+        'article__journal', 'month', 'type',
+    ).annotate(
+        total=Sum('accesses'),
+    ).order_by()
+    for row in rows:
+        journal_months = monthly_totals.setdefault(row['article__journal'], {})
+        month_totals = journal_months.setdefault(_month_key(row['month']), {})
+        month_totals[row['type']] = row['total']
+
+    # if we're doing a year-of-publication for JR5 purposes, then run this section
+    yop_totals = {}
+    if do_yop:
+        yop_totals = get_year_of_publication_totals(report_years)
 
     for journal_object in journal_models.Journal.objects.all():
 
@@ -51,18 +86,13 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
 
         journal['reporting_periods'] = []
 
-        # year of publication is for COUNTER journal report 5
-        # it needs to have "each YOP in the current decade and in the immediately previous decade as separate columns"
-        # easiest way to do this is simply to count backwards 19 years as the theoretical maximum
         journal['year_of_publication'] = {}
 
-        year = timezone.now().year
-
-        for year_counter in range(year, year - 19, -1):
-            year_of_publication[year] = ''
+        for year_counter in report_years:
+            journal['year_of_publication'][year_counter] = ''
 
         for date in report_months:
-            month = '{0}-{1}'.format(date.strftime('%b'), date.year)
+            month = _month_key(date)
 
             # setting these to zero for now for compat with pycounter
             # the spec says they should be set to "" so we may need to change that back
@@ -76,33 +106,20 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
                 journal['{0}-views'.format(month)] = ''
                 journal['{0}-downloads'.format(month)] = ''
 
-        articles = submission_models.Article.objects.filter(journal=journal_object)
-
-        # if we're doing a year-of-publication for JR5 purposes, then run this section, which is pretty DB intensive
-        if do_yop:
-            for article in articles:
-                views = get_article_views(article)
-                downloads = get_article_downloads(article)
+        for year_counter, total in yop_totals.get(journal_object.pk, {}).items():
+            if year_of_publication[year_counter] == '':
+                year_of_publication[year_counter] = 0
 
-                if article.date_published.year in year_of_publication:
-                    if year_of_publication[article.date_published.year] == '':
-                        year_of_publication[article.date_published.year] = 0
+            journal['year_of_publication'][year_counter] = total
+            year_of_publication[year_counter] += total
 
-                    if journal['year_of_publication'][article.date_published.year] == '':
-                        journal['year_of_publication'][article.date_published.year] = 0
+        for month, month_totals in monthly_totals.get(journal_object.pk, {}).items():
+            if month not in journal:
+                # Outside of the requested reporting months
+                continue
 
-                year_of_publication[article.date_published.year] += views + downloads
-                journal['year_of_publication'][article.date_published.year] += views + downloads
-
-        for article in articles:
-            views = models.ArticleAccess.objects.filter(type='view', article=article,
-                                                        accessed__range=[start_date, end_date])
-
-            downloads = models.ArticleAccess.objects.filter(type='download', article=article,
-                                                            accessed__range=[start_date, end_date])
-
-            view_count = views.count()
-            download_count = downloads.count()
+            view_count = month_totals.get('view', 0)
+            download_count = month_totals.get('download', 0)
 
             # total views and downloads
             journal['total'] += view_count + download_count
@@ -117,48 +134,32 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
             view_access_count += view_count
             download_access_count += download_count
 
-            for view_object in views:
-                # get the date for this access
-                access_date = '{0}-{1}'.format(view_object.accessed.strftime('%b'), view_object.accessed.year)
-
-                # we have to handle this like this since data for months already collected must be blank, not zero
-                if journal[access_date] == '':
-                    journal[access_date] = 0
-
-                if press_months[access_date] == '':
-                    press_months[access_date] = 0
-
-                if journal['{0}-views'.format(access_date)] == '':
-                    journal['{0}-views'.format(access_date)] = 0
-
-                journal[access_date] += 1
-                journal['{0}-views'.format(access_date)] += 1
-                press_months[access_date] += 1
-
-            for download_object in downloads:
-                # get the date for this access
-                access_date = '{0}-{1}'.format(download_object.accessed.strftime('%b'), download_object.accessed.year)
+            # we have to handle this like this since data for months already collected must be blank, not zero
+            if journal[month] == '':
+                journal[month] = 0
 
-                # we have to handle this like this since data for months already collected must be blank, not zero
-                if journal[access_date] == '':
-                    journal[access_date] = 0
+            if press_months[month] == '':
+                press_months[month] = 0
 
-                if press_months[access_date] == '':
-                    press_months[access_date] = 0
+            if view_count:
+                if journal['{0}-views'.format(month)] == '':
+                    journal['{0}-views'.format(month)] = 0
+                journal['{0}-views'.format(month)] += view_count
 
-                if journal['{0}-downloads'.format(access_date)] == '':
-                    journal['{0}-downloads'.format(access_date)] = 0
+            if download_count:
+                if journal['{0}-downloads'.format(month)] == '':
+                    journal['{0}-downloads'.format(month)] = 0
+                journal['{0}-downloads'.format(month)] += download_count
 
-                journal[access_date] += 1
-                journal['{0}-downloads'.format(access_date)] += 1
-                press_months[access_date] += 1
+            journal[month] += view_count + download_count
+            press_months[month] += view_count + download_count
 
         for date in report_months:
             # add to "reporting_periods":
             # a start date
             # an end date
             # a total number of views
-            month = '{0}-{1}'.format(date.strftime('%b'), date.year)
+            month = _month_key(date)
             journal['reporting_periods'].append(('{0}-01'.format(date.strftime('%Y-%m')),
                                                  '{0}-{1}'.format(date.strftime('%Y-%m'),
                                                                   calendar.monthrange(date.year, date.month)[1]),
@@ -171,20 +172,145 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
     return view_access_count + download_access_count, view_access_count, download_access_count, press_months, journals
 
 
+def get_year_of_publication_totals(years):
+    """ Totals the views and downloads of the articles published in each year
+    :param years: An iterable of years to report on
+    :return: A dict of journal pk to a dict of year to total accesses
+    """
+    years = list(years)
+    totals = {}
+
+    rows = models.DailyArticleAccess.objects.filter(
+        article__date_published__year__in=years,
+    ).annotate(
+        year=ExtractYear('article__date_published'),
+    ).values(
+        'article__journal', 'year',
+    ).annotate(
+        total=Sum('accesses'),
+    ).order_by()
+    historic_rows = models.HistoricArticleAccess.objects.filter(
+        article__date_published__year__in=years,
+    ).annotate(
+        year=ExtractYear('article__date_published'),
+    ).values(
+        'article__journal', 'year',
+    ).annotate(
+        total=Sum(F('views') + F('downloads')),
+    ).order_by()
+
+    for row in chain(rows, historic_rows):
+        journal_totals = totals.setdefault(row['article__journal'], {})
+        journal_totals[row['year']] = journal_totals.get(row['year'], 0) + (row['total'] or 0)
+
+    return totals
+
+
+def _get_access_count(article, access_type):
+    total = models.DailyArticleAccess.objects.filter(
+        type=access_type,
+        article=article,
+    ).aggregate(
+        total=Sum('accesses'),
+    )['total']
+    return total or 0
+
+
 def get_article_views(article):
     historic_record, created = models.HistoricArticleAccess.objects.get_or_create(article=article)
-    view_access_count = models.ArticleAccess.objects.filter(type='view', article=article).count()
+    view_access_count = _get_access_count(article, 'view')
 
     return historic_record.views + view_access_count
 
 
 def get_article_downloads(article):
     historic_record, created = models.HistoricArticleAccess.objects.get_or_create(article=article)
-    download_access_count = models.ArticleAccess.objects.filter(type='download', article=article).count()
+    download_access_count = _get_access_count(article, 'download')
 
     return historic_record.downloads + download_access_count
 
 
+def add_to_daily_accesses(accesses):
+    """ Adds ArticleAccess records to the DailyArticleAccess rollup
+    :param accesses: An iterable of ArticleAccess objects
+    """
+    totals = Counter(
+        (
+            access.article_id,
+            access.accessed.astimezone(timezone.utc).date(),
+            access.type,
+            access.galley_type,
+            access.country_id,
+        ) for access in accesses
+    )
+    for (article_id, date, access_type, galley_type, country_id), total in totals.items():
+        _add_to_daily_access(
+            total,
+            article_id=article_id,
+            date=date,
+            type=access_type,
+            galley_type=galley_type,
+            country_id=country_id,
+        )
+
+
+def _add_to_daily_access(total, **key):
+    """ Adds to the accesses of the rollup row with the given key, creating
+    it if there is none. The row is unique, so a request creating it at the
+    same time as this one makes the insert fail and the update is retried.
+    """
+    rows = models.DailyArticleAccess.objects.filter(**key)
+    if rows.update(accesses=F('accesses') + total):
+        return
+    try:
+        with transaction.atomic():
+            models.DailyArticleAccess.objects.create(accesses=total, **key)
+    except IntegrityError:
+        rows.update(accesses=F('accesses') + total)
+
+
+def rebuild_daily_accesses(start_date=None, end_date=None):
+    """ Rebuilds the DailyArticleAccess rollup from the ArticleAccess records
+    :param start_date: A date, rebuilds from the first access when None
+    :param end_date: A date, rebuilds up to the last access when None
+    :return: The number of rollup rows created
+    """
+    rollups = models.DailyArticleAccess.objects.all()
+    accesses = models.ArticleAccess.objects.all()
+    if start_date:
+        rollups = rollups.filter(date__gte=start_date)
+        accesses = accesses.filter(accessed__date__gte=start_date)
+    if end_date:
+        rollups = rollups.filter(date__lte=end_date)
+        accesses = accesses.filter(accessed__date__lte=end_date)
+
+    # Days are bucketed in UTC, matching add_to_daily_accesses
+    with transaction.atomic(), timezone.override(timezone.utc):
+        rollups.delete()
+        rows = accesses.annotate(
+            date=TruncDate('accessed'),
+        ).values(
+            'article', 'date', 'type', 'galley_type', 'country',
+        ).annotate(
+            total=Count('pk'),
+        ).order_by()
+        created = models.DailyArticleAccess.objects.bulk_create(
+            [
+                models.DailyArticleAccess(
+                    article_id=row['article'],
+                    date=row['date'],
+                    type=row['type'],
+                    galley_type=row['galley_type'],
+                    country_id=row['country'],
+                    accesses=row['total'],
+                ) for row in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+
+    return len(created)
+
+
 def get_altmetrics(article):
     alt_metrics = models.AltMetric.objects.filter(article=article)
     alm_dict = {}
@@ -213,35 +339,152 @@ class ArticleMetrics:
         self.alm = get_altmetrics(article)
 
 
-@retry(exc=OperationalError)
 def store_article_access(request, article, access_type, galley_type='view'):
+    """ Records an access to an article
+
+    When settings.BUFFER_ARTICLE_ACCESSES is enabled the access is only
+    queued, to be recorded by process_pending_accesses, and None is returned.
+    :return: the new ArticleAccess or None
+    """
+    if settings.BUFFER_ARTICLE_ACCESSES:
+        buffer_article_access(request, article, access_type, galley_type)
+        return None
+
+    return record_article_access(request, article, access_type, galley_type)
+
+
+def store_article_accesses(request, accesses):
+    """ Records many accesses of the same reader at once, e.g. downloads of
+    a whole issue, with a constant number of queries.
+
+    When settings.BUFFER_ARTICLE_ACCESSES is enabled the accesses are only
+    queued, see store_article_access.
+    :param accesses: A list of (article, access_type, galley_type) tuples
+    :return: A list of the new ArticleAccess records
+    """
+    if not accesses:
+        return []
+    if settings.BUFFER_ARTICLE_ACCESSES:
+        ip = shared.get_ip_address(request)
+        models.PendingArticleAccess.objects.bulk_create([
+            models.PendingArticleAccess(
+                article=article,
+                type=access_type,
+                galley_type=galley_type,
+                ip=ip,
+                user_agent=request.META.get('HTTP_USER_AGENT', None),
+                counter_tracking=request.session.get('counter_tracking'),
+            )
+            for article, access_type, galley_type in accesses
+        ])
+        return []
+
+    return record_article_accesses(request, accesses)
+
+
+@retry(exc=OperationalError)
+def record_article_accesses(request, accesses):
+    """ Records accesses of a single reader, see record_article_access
+    :param accesses: A list of (article, access_type, galley_type) tuples
+    :return: A list of the new ArticleAccess records
+    """
     current_time = timezone.now()
 
+    ip = shared.get_ip_address(request)
+    identifier = get_access_identifier(
+        ip,
+        request.META.get('HTTP_USER_AGENT', None),
+        request.session.get('counter_tracking'),
+    )
+    if not identifier:
+        return []
+
+    country = iso_to_country_object(get_iso_country_code(ip))
+    with transaction.atomic():
+        # Accesses recorded recently or earlier in this list are not counted
+        seen = set(
+            models.ArticleAccess.objects.filter(
+                article__in={article for article, _, _ in accesses},
+                identifier=identifier,
+                accessed__gte=current_time - timedelta(seconds=ACCESS_WINDOW),
+            ).values_list('article', 'type', 'galley_type')
+        )
+        new_accesses = []
+        for article, access_type, galley_type in accesses:
+            key = (article.pk, access_type, galley_type)
+            if key in seen:
+                continue
+            seen.add(key)
+            new_accesses.append(
+                models.ArticleAccess(
+                    article=article,
+                    type=access_type,
+                    identifier=identifier,
+                    galley_type=galley_type,
+                    country=country,
+                    accessed=current_time,
+                )
+            )
+        create_accesses(new_accesses)
+        add_to_daily_accesses(new_accesses)
+
+    for access in new_accesses:
+        raise_access_event(access, request)
+    return new_accesses
+
+
+def buffer_article_access(request, article, access_type, galley_type='view'):
+    return models.PendingArticleAccess.objects.create(
+        article=article,
+        type=access_type,
+        galley_type=galley_type,
+        ip=shared.get_ip_address(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', None),
+        counter_tracking=request.session.get('counter_tracking'),
+    )
+
+
+def get_access_identifier(ip, user_agent, counter_tracking_id):
+    """ Returns the identifier of a reader for COUNTER deduplication
+    :return: the identifier or None if the user agent is missing or a bot
+    """
     try:
-        user_agent = parse_ua_string(request.META.get('HTTP_USER_AGENT', None))
+        user_agent = parse_ua_string(user_agent)
     except TypeError:
-        user_agent = None
+        return None
 
-    ip = shared.get_ip_address(request)
-    iso_country_code = get_iso_country_code(ip)
-    country = iso_to_country_object(iso_country_code)
-    counter_tracking_id = request.session.get('counter_tracking')
+    if user_agent.is_bot:
+        return None
 
-    if user_agent and not user_agent.is_bot:
+    if counter_tracking_id:
+        return counter_tracking_id
+
+    string = "{ip}-{agent}-{secret_key}".format(
+        ip=ip,
+        agent=user_agent,
+        secret_key=settings.SECRET_KEY,
+    ).encode('utf-8')
+    return hashlib.sha512(string).hexdigest()
 
-        if counter_tracking_id:
-            identifier = counter_tracking_id
-        else:
-            string = "{ip}-{agent}-{secret_key}".format(
-                ip=ip,
-                agent=user_agent,
-                secret_key=settings.SECRET_KEY,
-            ).encode('utf-8')
-            identifier = hashlib.sha512(string).hexdigest()
+
+@retry(exc=OperationalError)
+def record_article_access(request, article, access_type, galley_type='view'):
+    current_time = timezone.now()
+
+    ip = shared.get_ip_address(request)
+    identifier = get_access_identifier(
+        ip,
+        request.META.get('HTTP_USER_AGENT', None),
+        request.session.get('counter_tracking'),
+    )
+
+    if identifier:
+        iso_country_code = get_iso_country_code(ip)
+        country = iso_to_country_object(iso_country_code)
 
         # check if the current IP has accessed this article recently.
         with transaction.atomic():
-            time_to_check = current_time - timedelta(seconds=3600)
+            time_to_check = current_time - timedelta(seconds=ACCESS_WINDOW)
             exists = models.ArticleAccess.objects.filter(
                 article=article,
                 identifier=identifier,
@@ -259,22 +502,141 @@ def store_article_access(request, article, access_type, galley_type='view'):
                     country=country,
                     accessed=current_time,
                 )
-                # Raise the Article Access event.
-                event_kwargs = {
-                    'article_access': access,
-                    'article': article,
-                    'request': request,
-                }
-                event_logic.Events.raise_event(
-                    event_logic.Events.ON_ARTICLE_ACCESS,
-                    task_object=article,
-                    **event_kwargs,
-                )
+                add_to_daily_accesses([access])
+                raise_access_event(access, request)
                 return access
     return None
 
 
-@cache(300)
+def create_accesses(accesses):
+    """ Inserts ArticleAccess records in bulk
+    Only PostgreSQL returns the pks of rows inserted in bulk, other databases
+    insert one at a time so that ON_ARTICLE_ACCESS receivers get saved
+    records.
+    :param accesses: A list of unsaved ArticleAccess records
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        models.ArticleAccess.objects.bulk_create(accesses)
+    else:
+        for access in accesses:
+            access.save()
+
+
+def raise_access_event(access, request=None):
+    # Raise the Article Access event.
+    event_kwargs = {
+        'article_access': access,
+        'article': access.article,
+        'request': request,
+    }
+    event_logic.Events.raise_event(
+        event_logic.Events.ON_ARTICLE_ACCESS,
+        task_object=access.article,
+        **event_kwargs,
+    )
+
+
+def process_pending_accesses(batch_size=1000):
+    """ Records the accesses queued by buffer_article_access in batches
+
+    Accesses are deduplicated in memory against each other and against the
+    accesses already recorded in the last hour, then bulk inserted.
+    ON_ARTICLE_ACCESS is raised (without a request) once a batch is stored.
+    :param batch_size: the number of pending accesses to process at a time
+    :return: the number of ArticleAccess records created
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Prefetched rather than joined, so that the articles aren't
+            # locked along with the pending accesses
+            pending = models.PendingArticleAccess.objects.prefetch_related(
+                'article',
+            ).order_by('pk')
+            if connection.features.has_select_for_update_skip_locked:
+                # Allows more than one worker to drain the queue
+                pending = pending.select_for_update(skip_locked=True)
+            batch = list(pending[:batch_size])
+            if not batch:
+                break
+
+            accesses = _accesses_from_pending(batch)
+            create_accesses(accesses)
+            add_to_daily_accesses(accesses)
+            models.PendingArticleAccess.objects.filter(
+                pk__in=[pending_access.pk for pending_access in batch],
+            ).delete()
+
+        for access in accesses:
+            raise_access_event(access)
+        total += len(accesses)
+
+    return total
+
+
+def _accesses_from_pending(batch):
+    """ Builds the unsaved ArticleAccess records for a batch of pending ones
+    :param batch: a list of PendingArticleAccess ordered by time of access
+    :return: a list of ArticleAccess
+    """
+    identified = []
+    for pending_access in batch:
+        identifier = get_access_identifier(
+            pending_access.ip,
+            pending_access.user_agent,
+            pending_access.counter_tracking,
+        )
+        if identifier:
+            identified.append((identifier, pending_access))
+    if not identified:
+        return []
+
+    # Last time each reader accessed each article, seeded from the database
+    last_accessed = {}
+    recent_accesses = models.ArticleAccess.objects.filter(
+        accessed__gte=min(
+            pending_access.accessed for _, pending_access in identified
+        ) - timedelta(seconds=ACCESS_WINDOW),
+        identifier__in={identifier for identifier, _ in identified},
+    ).values_list('article', 'identifier', 'type', 'galley_type', 'accessed')
+    for article_id, identifier, access_type, galley_type, accessed in recent_accesses:
+        key = (article_id, identifier, access_type, galley_type)
+        last_accessed[key] = max(accessed, last_accessed.get(key, accessed))
+
+    countries = geoip.get_countries(
+        pending_access.ip for _, pending_access in identified
+    )
+    accesses = []
+    for identifier, pending_access in identified:
+        key = (
+            pending_access.article_id,
+            identifier,
+            pending_access.type,
+            pending_access.galley_type,
+        )
+        previous = last_accessed.get(key)
+        if previous and pending_access.accessed - previous < timedelta(seconds=ACCESS_WINDOW):
+            continue
+
+        last_accessed[key] = pending_access.accessed
+        accesses.append(
+            models.ArticleAccess(
+                article=pending_access.article,
+                type=pending_access.type,
+                identifier=identifier,
+                galley_type=pending_access.galley_type,
+                country=(
+                    iso_to_country_object('GB') if settings.DEBUG
+                    else countries[pending_access.ip]
+                ),
+                accessed=pending_access.accessed,
+            )
+        )
+
+    return accesses
+
+
+@memoize(300)
 def get_view_and_download_totals(articles):
     total_views = 0
     total_downs = 0
@@ -289,25 +651,8 @@ def get_view_and_download_totals(articles):
 def iso_to_country_object(code):
     if settings.DEBUG:
         code = 'GB'
-    try:
-        return core_models.Country.objects.get(code=code)
-    except core_models.Country.DoesNotExist:
-        return None
+    return geoip.get_country(code)
 
 
 def get_iso_country_code(ip):
-    db_path = os.path.join(
-        settings.BASE_DIR,
-        'metrics',
-        'geolocation',
-        'GeoLite2-Country.mmdb',
-    )
-    reader = geoip2.database.Reader(db_path)
-
-    try:
-        response = reader.country(ip)
-        return response.country.iso_code if response.country.iso_code else 'OTHER'
-    except AddressNotFoundError:
-        if ip == '127.0.0.1':
-            return "GB"
-        return 'OTHER'
+    return geoip.get_iso_country_code(ip)
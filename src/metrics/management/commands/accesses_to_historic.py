@@ -31,9 +31,12 @@ class Command(BaseCommand):
         :param options: None
         :return: None
         """
-        date_to_tidy = timezone.now() - timedelta(weeks=104)
+        # Tidy whole (UTC) days so the daily access rollup can be tidied too
+        date_to_tidy = (timezone.now() - timedelta(weeks=104)).astimezone(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0,
+        )
 
-        article_accesses = models.ArticleAccess.objects.filter(accessed__lte=date_to_tidy)
+        article_accesses = models.ArticleAccess.objects.filter(accessed__lt=date_to_tidy)
 
         if options.get('dump_data') and article_accesses:
             path = os.path.join(settings.BASE_DIR, 'files', 'data_backup', date_to_tidy.strftime('%Y-%m-%d %H:%M'))
@@ -52,3 +55,5 @@ class Command(BaseCommand):
                 access.article.historicarticleaccess.add_one_download()
 
             access.delete()
+
+        models.DailyArticleAccess.objects.filter(date__lt=date_to_tidy.date()).delete()
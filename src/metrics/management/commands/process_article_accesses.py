@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from metrics import logic
+
+
+class Command(BaseCommand):
+    """
+    A management command that records the article accesses queued when BUFFER_ARTICLE_ACCESSES is enabled.
+    """
+
+    help = "Processes PendingArticleAccess objects into ArticleAccess objects."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--batch_size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Processes PendingArticleAccess objects into ArticleAccess objects.
+
+        :param args: None
+        :param options: Dictionary containing 'batch_size'
+        :return: None
+        """
+        created = logic.process_pending_accesses(batch_size=options.get('batch_size'))
+        if options.get('verbosity', 1) > 1:
+            self.stdout.write('Recorded {0} article accesses.'.format(created))
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from metrics import logic
+
+
+def parse_date(date_string):
+    return datetime.strptime(date_string, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    """
+    A management command that rebuilds the daily access rollup used for COUNTER reporting from ArticleAccess records.
+    """
+
+    help = "Rebuilds DailyArticleAccess records from ArticleAccess records."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--start', type=parse_date, default=None, help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=parse_date, default=None, help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        """Rebuilds DailyArticleAccess records from ArticleAccess records.
+
+        :param args: None
+        :param options: Dictionary containing 'start' and 'end' dates
+        :return: None
+        """
+        created = logic.rebuild_daily_accesses(options.get('start'), options.get('end'))
+        self.stdout.write('Created {0} daily access records.'.format(created))
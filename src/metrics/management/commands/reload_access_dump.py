@@ -2,8 +2,11 @@ import os
 
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.utils import timezone
 from django.core import serializers
 
+from metrics import logic
+
 
 class Command(BaseCommand):
     """
@@ -37,10 +40,15 @@ class Command(BaseCommand):
         with open(file_path, encoding="utf-8") as f:
             data = f.read()
 
+        dates = set()
         for obj in serializers.deserialize("json", data):
             obj.save()
+            dates.add(obj.object.accessed.astimezone(timezone.utc).date())
 
             if obj.object.type == 'view':
                 obj.object.article.historicarticleaccess.remove_one_view()
             elif obj.object.type == 'download':
                 obj.object.article.historicarticleaccess.remove_one_download()
+
+        if dates:
+            logic.rebuild_daily_accesses(min(dates), max(dates))
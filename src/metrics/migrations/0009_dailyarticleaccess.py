@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def populate_daily_accesses(apps, schema_editor):
+    ArticleAccess = apps.get_model('metrics', 'ArticleAccess')
+    DailyArticleAccess = apps.get_model('metrics', 'DailyArticleAccess')
+
+    with timezone.override(timezone.utc):
+        rows = ArticleAccess.objects.annotate(
+            date=TruncDate('accessed'),
+        ).values(
+            'article', 'date', 'type', 'galley_type', 'country',
+        ).annotate(
+            total=Count('pk'),
+        ).order_by()
+
+        DailyArticleAccess.objects.bulk_create(
+            (
+                DailyArticleAccess(
+                    article_id=row['article'],
+                    date=row['date'],
+                    type=row['type'],
+                    galley_type=row['galley_type'],
+                    country_id=row['country'],
+                    accesses=row['total'],
+                ) for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_merge_20190405_1549'),
+        ('submission', '0001_initial'),
+        ('metrics', '0008_auto_20191119_2340'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyArticleAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('type', models.CharField(choices=[('download', 'Download'), ('view', 'View')], max_length=20)),
+                ('galley_type', models.CharField(max_length=200)),
+                ('accesses', models.PositiveIntegerField(default=0)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='submission.Article')),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.Country')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='dailyarticleaccess',
+            index_together=set([('article', 'date', 'type')]),
+        ),
+        migrations.RunPython(
+            populate_daily_accesses,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
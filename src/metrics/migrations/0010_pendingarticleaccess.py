@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submission', '0001_initial'),
+        ('metrics', '0009_dailyarticleaccess'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingArticleAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('download', 'Download'), ('view', 'View')], max_length=20)),
+                ('galley_type', models.CharField(max_length=200)),
+                ('accessed', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.TextField(blank=True, null=True)),
+                ('counter_tracking', models.CharField(blank=True, max_length=200, null=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='submission.Article')),
+            ],
+        ),
+    ]
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+NO_COUNTRY_INDEX = 'metrics_dailyarticleaccess_no_country_uniq'
+MYSQL_COUNTRY_KEY = 'country_key'
+KEY = ('article', 'date', 'type', 'galley_type', 'country')
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    DailyArticleAccess = apps.get_model('metrics', 'DailyArticleAccess')
+
+    duplicates = DailyArticleAccess.objects.values(*KEY).annotate(
+        rows=Count('pk'),
+        total=Sum('accesses'),
+    ).filter(rows__gt=1).order_by()
+    for duplicate in duplicates.iterator():
+        rows = DailyArticleAccess.objects.filter(
+            article_id=duplicate['article'],
+            date=duplicate['date'],
+            type=duplicate['type'],
+            galley_type=duplicate['galley_type'],
+            country_id=duplicate['country'],
+        ).order_by('pk')
+        kept = rows.first()
+        rows.exclude(pk=kept.pk).delete()
+        kept.accesses = duplicate['total']
+        kept.save()
+
+
+def create_no_country_index(apps, schema_editor):
+    # NULLs are distinct in unique constraints, so rows without a country
+    # need an index of their own.
+    vendor = schema_editor.connection.vendor
+    if vendor in {'postgresql', 'sqlite'}:
+        schema_editor.execute(
+            'CREATE UNIQUE INDEX {} ON metrics_dailyarticleaccess '
+            '(article_id, date, type, galley_type) '
+            'WHERE country_id IS NULL'.format(NO_COUNTRY_INDEX)
+        )
+    elif vendor == 'mysql':
+        # MySQL doesn't support partial indexes, so the index covers a
+        # generated column where rows without a country have a country of 0
+        schema_editor.execute(
+            'ALTER TABLE metrics_dailyarticleaccess '
+            'ADD COLUMN {column} integer AS (IFNULL(country_id, 0)) STORED, '
+            'ADD UNIQUE INDEX {index} '
+            '(article_id, date, type, galley_type, {column})'.format(
+                column=MYSQL_COUNTRY_KEY, index=NO_COUNTRY_INDEX,
+            )
+        )
+
+
+def drop_no_country_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor in {'postgresql', 'sqlite'}:
+        schema_editor.execute('DROP INDEX {}'.format(NO_COUNTRY_INDEX))
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE metrics_dailyarticleaccess '
+            'DROP INDEX {}, DROP COLUMN {}'.format(
+                NO_COUNTRY_INDEX, MYSQL_COUNTRY_KEY,
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0010_pendingarticleaccess'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_rows,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyarticleaccess',
+            unique_together=set([('article', 'date', 'type', 'galley_type', 'country')]),
+        ),
+        migrations.RunPython(
+            create_no_country_index,
+            reverse_code=drop_no_country_index,
+        ),
+    ]
@@ -26,6 +26,56 @@ class ArticleAccess(models.Model):
         return '[{0}] - {1} at {2}'.format(self.identifier, self.article.title, self.accessed)
 
 
+class PendingArticleAccess(models.Model):
+    """ An access recorded during a request that has yet to be processed into
+    an ArticleAccess by metrics.logic.process_pending_accesses.
+
+    Used when settings.BUFFER_ARTICLE_ACCESSES is enabled so that article
+    requests only have to insert this row.
+    """
+    article = models.ForeignKey('submission.Article')
+    type = models.CharField(max_length=20, choices=access_choices())
+    galley_type = models.CharField(max_length=200)
+    accessed = models.DateTimeField(default=timezone.now)
+    ip = models.GenericIPAddressField(blank=True, null=True)
+    user_agent = models.TextField(blank=True, null=True)
+    counter_tracking = models.CharField(max_length=200, blank=True, null=True)
+
+    def __str__(self):
+        return '[{0}] - {1} of {2} at {3}'.format(
+            self.pk, self.type, self.article_id, self.accessed,
+        )
+
+
+class DailyArticleAccess(models.Model):
+    """ A rollup of ArticleAccess records by article, day, type, galley type
+    and country, used for COUNTER reporting and article metrics.
+
+    It is maintained by metrics.logic.store_article_access and can be
+    rebuilt with the rebuild_daily_accesses management command. There is one
+    row per article, day, type, galley type and country.
+    """
+    article = models.ForeignKey('submission.Article')
+    date = models.DateField(db_index=True)
+    type = models.CharField(max_length=20, choices=access_choices())
+    galley_type = models.CharField(max_length=200)
+    country = models.ForeignKey('core.Country', blank=True, null=True)
+    accesses = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        index_together = (
+            ('article', 'date', 'type'),
+        )
+        unique_together = (
+            ('article', 'date', 'type', 'galley_type', 'country'),
+        )
+
+    def __str__(self):
+        return '{0} {1}s of {2} on {3}'.format(
+            self.accesses, self.type, self.article_id, self.date,
+        )
+
+
 class HistoricArticleAccess(models.Model):
     article = models.OneToOneField('submission.Article')
     views = models.PositiveIntegerField(default=0)
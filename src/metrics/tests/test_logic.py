@@ -0,0 +1,205 @@
+from datetime import timedelta
+
+from dateutil.rrule import rrule, MONTHLY
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from core import models as core_models
+from metrics import geoip, logic, models
+from utils.testing import helpers
+
+
+class TestDailyArticleAccess(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.press = helpers.create_press()
+        cls.journal_one, cls.journal_two = helpers.create_journals()
+        cls.article = helpers.create_article(cls.journal_one)
+
+    def create_access(self, access_type, accessed, identifier='reader'):
+        return models.ArticleAccess.objects.create(
+            article=self.article,
+            type=access_type,
+            identifier=identifier,
+            galley_type='pdf',
+            accessed=accessed,
+        )
+
+    def test_add_to_daily_accesses(self):
+        accessed = timezone.now()
+        accesses = [
+            self.create_access('view', accessed, 'one'),
+            self.create_access('view', accessed, 'two'),
+            self.create_access('download', accessed, 'one'),
+        ]
+
+        logic.add_to_daily_accesses(accesses)
+        logic.add_to_daily_accesses(accesses[:1])
+
+        self.assertEqual(logic.get_article_views(self.article), 3)
+        self.assertEqual(logic.get_article_downloads(self.article), 1)
+        # One row per article, day, type, galley type and country
+        self.assertEqual(models.DailyArticleAccess.objects.count(), 2)
+
+    def test_rebuild_daily_accesses(self):
+        accessed = timezone.now()
+        self.create_access('view', accessed, 'one')
+        self.create_access('view', accessed - timedelta(days=1), 'two')
+
+        created = logic.rebuild_daily_accesses()
+
+        self.assertEqual(created, 2)
+        self.assertEqual(logic.get_article_views(self.article), 2)
+
+    def test_get_press_totals(self):
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=90)
+        report_months = list(rrule(MONTHLY, dtstart=start_date, until=end_date))
+        logic.add_to_daily_accesses([
+            self.create_access('view', end_date, 'one'),
+            self.create_access('download', end_date, 'one'),
+        ])
+
+        total, views, downloads, press_months, journals = logic.get_press_totals(
+            start_date, end_date, report_months,
+        )
+
+        self.assertEqual((total, views, downloads), (2, 1, 1))
+        journal = next(j for j in journals if j['journal'] == self.journal_one)
+        self.assertEqual(journal['total_views'], 1)
+        self.assertEqual(journal['total_downloads'], 1)
+
+
+class TestPendingArticleAccess(TestCase):
+    USER_AGENT = (
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/96.0.4664.45 Safari/537.36'
+    )
+    BOT_USER_AGENT = 'Googlebot/2.1 (+http://www.google.com/bot.html)'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.press = helpers.create_press()
+        cls.journal_one, cls.journal_two = helpers.create_journals()
+        cls.article = helpers.create_article(cls.journal_one)
+
+    def create_pending(self, accessed, user_agent=USER_AGENT, tracking='reader'):
+        return models.PendingArticleAccess.objects.create(
+            article=self.article,
+            type='view',
+            galley_type='html',
+            accessed=accessed,
+            ip='127.0.0.1',
+            user_agent=user_agent,
+            counter_tracking=tracking,
+        )
+
+    def test_process_pending_accesses_deduplicates(self):
+        now = timezone.now()
+        self.create_pending(now - timedelta(minutes=90))
+        self.create_pending(now - timedelta(minutes=80))
+        self.create_pending(now - timedelta(minutes=10))
+        self.create_pending(now, tracking='another reader')
+        self.create_pending(now, user_agent=self.BOT_USER_AGENT)
+
+        created = logic.process_pending_accesses(batch_size=2)
+
+        self.assertEqual(created, 3)
+        self.assertEqual(models.ArticleAccess.objects.count(), 3)
+        self.assertEqual(logic.get_article_views(self.article), 3)
+        self.assertFalse(models.PendingArticleAccess.objects.exists())
+
+    def test_process_pending_accesses_checks_recorded_accesses(self):
+        now = timezone.now()
+        models.ArticleAccess.objects.create(
+            article=self.article,
+            type='view',
+            identifier='reader',
+            galley_type='html',
+            accessed=now - timedelta(minutes=30),
+        )
+        self.create_pending(now)
+
+        created = logic.process_pending_accesses()
+
+        self.assertEqual(created, 0)
+
+
+class TestStoreArticleAccesses(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.press = helpers.create_press()
+        cls.journal_one, cls.journal_two = helpers.create_journals()
+        cls.article = helpers.create_article(cls.journal_one)
+        cls.other_article = helpers.create_article(cls.journal_one)
+
+    def setUp(self):
+        self.request = RequestFactory().get(
+            '/',
+            HTTP_USER_AGENT=TestPendingArticleAccess.USER_AGENT,
+            REMOTE_ADDR='127.0.0.1',
+        )
+        self.request.session = {'counter_tracking': 'reader'}
+
+    def test_store_article_accesses(self):
+        accesses = logic.store_article_accesses(self.request, [
+            (self.article, 'download', 'pdf'),
+            (self.article, 'download', 'xml'),
+            (self.article, 'download', 'pdf'),
+            (self.other_article, 'download', 'pdf'),
+        ])
+
+        self.assertEqual(len(accesses), 3)
+        self.assertTrue(all(access.pk for access in accesses))
+        self.assertEqual(logic.get_article_downloads(self.article), 2)
+        self.assertEqual(logic.get_article_downloads(self.other_article), 1)
+
+    def test_store_article_accesses_checks_recorded_accesses(self):
+        logic.store_article_accesses(
+            self.request, [(self.article, 'download', 'pdf')],
+        )
+
+        accesses = logic.store_article_accesses(self.request, [
+            (self.article, 'download', 'pdf'),
+            (self.other_article, 'download', 'pdf'),
+        ])
+
+        self.assertEqual(
+            [access.article for access in accesses], [self.other_article],
+        )
+
+    @override_settings(BUFFER_ARTICLE_ACCESSES=True)
+    def test_store_article_accesses_buffered(self):
+        accesses = logic.store_article_accesses(self.request, [
+            (self.article, 'download', 'pdf'),
+            (self.other_article, 'download', 'pdf'),
+        ])
+
+        self.assertEqual(accesses, [])
+        self.assertEqual(models.PendingArticleAccess.objects.count(), 2)
+
+
+class TestGeoIP(TestCase):
+
+    def setUp(self):
+        geoip.clear_caches()
+        self.addCleanup(geoip.clear_caches)
+
+    def test_get_country_loads_countries_once(self):
+        core_models.Country.objects.create(code='GB', name='United Kingdom')
+        core_models.Country.objects.create(code='FR', name='France')
+
+        geoip.get_country('GB')
+        with self.assertNumQueries(0):
+            country = geoip.get_country('FR')
+            missing = geoip.get_country('XX')
+
+        self.assertEqual(country.name, 'France')
+        self.assertIsNone(missing)
+
+    def test_get_iso_country_code_handles_missing_ip(self):
+        self.assertEqual(geoip.get_iso_country_code(None), 'OTHER')
+        self.assertEqual(geoip.get_iso_country_code('127.0.0.1'), 'GB')
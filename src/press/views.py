@@ -16,7 +16,7 @@ from django.utils.decorators import method_decorator
 from core import (
     files,
     models as core_models,
-    plugin_loader,
+    plugin_hooks,
     logic as core_logic,
 )
 from journal import (
@@ -60,11 +60,9 @@ def index(request):
     }
 
     # call all registered plugin block hooks to get relevant contexts
-    for hook in settings.PLUGIN_HOOKS.get('yield_homepage_element_context', []):
-        if hook.get('name') in homepage_element_names:
-            hook_module = plugin_loader.import_module(hook.get('module'))
-            function = getattr(hook_module, hook.get('function'))
-            element_context = function(request, homepage_elements)
+    for hook in plugin_hooks.get_hooks('yield_homepage_element_context'):
+        if hook.name in homepage_element_names:
+            element_context = hook(request, homepage_elements)
 
             for k, v in element_context.items():
                 context[k] = v
@@ -87,7 +85,7 @@ def sitemap(request):
             # if there is a repository we return the repository sitemap.
             return repository_views.repository_sitemap(request)
 
-        return files.serve_sitemap_file(['sitemap.xml'])
+        return files.serve_sitemap_file(['sitemap.xml'], request=request)
     except FileNotFoundError:
         logger.warning('Sitemap for {} not found.'.format(request.press.name))
         raise Http404()
@@ -100,13 +98,17 @@ def robots(request):
     try:
         if settings.URL_CONFIG == 'domain' and request.journal or request.repository:
             if request.journal and request.journal.domain:
-                return files.serve_robots_file(journal=request.journal)
+                return files.serve_robots_file(
+                    journal=request.journal, request=request,
+                )
             elif request.repository and request.repository.domain:
-                return files.serve_robots_file(repository=request.repository)
+                return files.serve_robots_file(
+                    repository=request.repository, request=request,
+                )
             else:
                 # raising a 404 here if you browse to this url in path mode.
                 raise Http404()
-        return files.serve_robots_file()
+        return files.serve_robots_file(request=request)
     except FileNotFoundError:
         logger.warning('Robots file not found.')
         raise Http404()
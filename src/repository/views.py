@@ -91,7 +91,7 @@ def repository_sitemap(request, subject_id=None):
             ]
 
         if path_parts:
-            return files.serve_sitemap_file(path_parts)
+            return files.serve_sitemap_file(path_parts, request=request)
     except FileNotFoundError:
         logger.warning('Sitemap for {} not found.'.format(request.repository.name))
 
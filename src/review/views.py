@@ -2033,11 +2033,13 @@ def reviewer_article_file(request, assignment_id, file_id):
 def review_download_all_files(request, assignment_id):
     review_assignment = models.ReviewAssignment.objects.get(pk=assignment_id)
 
-    zip_file, file_name = files.zip_article_files(
+    entries = files.get_article_zip_entries(
         review_assignment.review_round.review_files.all(),
     )
 
-    return files.serve_temp_file(zip_file, file_name)
+    return files.serve_zip_stream(
+        entries, 'review-files-{}.zip'.format(review_assignment.pk),
+    )
 
 
 @editor_is_not_author
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_effective_last_modified(apps, schema_editor):
+    # A starting point only, rebuild_effective_last_modified accounts for
+    # the related objects of existing articles
+    Article = apps.get_model("submission", "Article")
+    Article.objects.update(effective_last_modified=F('last_modified'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submission', '0069_delete_blank_keywords'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='effective_last_modified',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(
+            populate_effective_last_modified,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
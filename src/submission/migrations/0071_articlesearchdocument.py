@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submission', '0070_article_effective_last_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSearchDocument',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='submission.Article')),
+                ('document', django.contrib.postgres.search.SearchVectorField(blank=True, null=True)),
+                ('full_text', django.contrib.postgres.search.SearchVectorField(blank=True, null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'required_db_vendor': 'postgresql',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='articlesearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['document'], name='search_document_gin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articlesearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['full_text'], name='search_full_text_gin_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from submission import search
+
+
+def build_search_documents(apps, schema_editor):
+    # Documents of existing articles, which are not saved again until edited
+    Article = apps.get_model('submission', 'Article')
+    search.rebuild_search_documents(Article.objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0073_auto_20220630_1608'),
+        ('submission', '0071_articlesearchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            build_search_documents,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
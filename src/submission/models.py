@@ -10,13 +10,13 @@ import os
 from dateutil import parser as dateparser
 
 from django.urls import reverse
-from django.db import connection, models
+from django.db import models
+from django.db.models.functions import Coalesce
 from django.db.models.query import RawQuerySet
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.postgres.search import (
     SearchQuery,
-    SearchRank,
-    SearchVector,
     SearchVectorField,
 )
 from django.utils import timezone
@@ -26,7 +26,6 @@ from django.db.models.signals import pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.core import exceptions
 from django.utils.html import mark_safe
-import swapper
 
 from core.file_system import JanewayFileSystemStorage
 from core.model_utils import(
@@ -39,6 +38,7 @@ from identifiers import logic as id_logic
 from metrics.logic import ArticleMetrics
 from repository import models as repository_models
 from review import models as review_models
+from submission import search
 from utils.function_cache import cache
 from utils.logger import get_logger
 
@@ -439,92 +439,73 @@ class ArticleSearchManager(BaseSearchManagerMixin):
         if annotations:
             queryset = queryset.annotate(**annotations)
         if lookups:
-            queryset = queryset.filter(**lookups)
-
+            queryset = queryset.filter(lookups)
+        if search_filters.get('ORCID'):
+            # Articles may have several authors with the same ORCID
+            queryset = queryset.distinct()
 
         if not sort or sort not in self.SORT_KEYS:
             sort = "-relevance"
-
-        # Postgresql requires adding the DISTINCT ON column to ORDER BY
-        queryset = queryset.order_by("id").distinct("id")
-
-        # Now we can order the result set based by another column
-        if "relevance" in sort:
-            # We can't use the ORM because it is not possible to select
-            # a column from a subquery filter
-            inner_sql = self.stringify_queryset(queryset)
-            return Article.objects.raw(
-                f"SELECT * from ({inner_sql}) AS search "
-                "ORDER BY relevance DESC"
-            )
-        else:
-            return self.get_queryset().filter(
-                id__in=queryset
-            ).order_by(sort)
-
+        return queryset.order_by(sort, "id")
 
     def build_postgres_lookups(self, search_term, search_filters):
         """ Build the necessary lookup expressions based on the provided filters
 
-        Each Filter is provided an arbitrary weight:
+        Searches run against the precomputed ArticleSearchDocument of each
+        article (see submission.search), where every filter has a weight:
             +---------------+---------+---------+
             | column        | Weight  | Factor  |
             +===============+=========+=========+
             | Title         | A       | 1       |
             | Keyword       | B       | .4      |
-            | Author names  | B       | .4      |
-            | Abstract      | C       | .2      |
-            | Galley text   | D       | .1      |
+            | Author names  | C       | .4      |
+            | Abstract      | D       | .2      |
             +---------------+---------+---------+
+        Galley text is kept in a vector of its own, ranked with a factor of .1
         Each result is annotated with a 'relevance' value that will be factored
         using the above weights. The results are then sorted based on relevance
         which will have an impact only when multiple search filters are
         combined.
         """
-        lookups = {}
+        lookups = models.Q()
         annotations = {"relevance": models.Value(1.0, models.FloatField())}
-        vectors = []
-        if search_filters.get('title'):
-            vectors.append(SearchVector('title', weight="A"))
-        if search_filters.get('keywords'):
-            vectors.append(SearchVector('keywords__word', weight="B"))
-        if search_filters.get('authors'):
-            vectors.append(SearchVector('frozenauthor__last_name', weight="B"))
-            vectors.append(SearchVector('frozenauthor__first_name', weight="B"))
-        if search_filters.get("abstract"):
-            vectors.append(SearchVector('abstract', weight="C"))
-        if search_filters.get("full_text"):
-            FileTextModel = swapper.load_model("core", "FileText")
-            field_type = FileTextModel._meta.get_field("contents")
-            if isinstance(field_type, SearchVectorField):
-                vectors.append(model_utils.SearchVector(
-                    'galley__file__text__contents', weight="D"))
+        query = SearchQuery(search_term)
+        weights = [
+            weight for search_filter, weight in search.DOCUMENT_WEIGHTS
+            if search_filters.get(search_filter)
+        ]
+        ranks = []
+        if weights:
+            document = models.F("search_document__document")
+            if len(weights) < len(search.DOCUMENT_WEIGHTS):
+                # Only match the lexemes of the selected filters
+                document = model_utils.FilterSearchVector(document, weights)
+                annotations["search_document_match"] = document
+                lookups |= models.Q(search_document_match=query)
             else:
-                vectors.append(SearchVector(
-                    'galley__file__text__contents', weight="D"))
-        if vectors:
-            # Combine all vectors
-            vector = vectors[0]
-            for v in vectors[1:]:
-                vector += v
-            query = SearchQuery(search_term)
-            relevance = SearchRank(vector, query)
-            annotations["relevance"] = relevance
-            # Since we weight file contents as 'D', the returned relevance
-            # values can range between .01 and .1
-            lookups["relevance__gte"] = 0.01
+                lookups |= models.Q(search_document__document=query)
+            ranks.append(model_utils.WeightedSearchRank(
+                document, query, search.DOCUMENT_RANK_WEIGHTS,
+            ))
+        if search_filters.get("full_text"):
+            lookups |= models.Q(search_document__full_text=query)
+            ranks.append(Coalesce(
+                model_utils.WeightedSearchRank(
+                    models.F("search_document__full_text"), query,
+                    search.FULL_TEXT_RANK_WEIGHTS,
+                ),
+                models.Value(0.0),
+            ))
+        if ranks:
+            annotations["relevance"] = sum(ranks[1:], ranks[0])
 
         if search_filters.get('ORCID'):
-            lookups['frozenauthor__author__orcid'] = search_term
-            lookups['frozenauthor__frozen_orcid'] = search_term
+            lookups &= models.Q(
+                frozenauthor__author__orcid=search_term,
+                frozenauthor__frozen_orcid=search_term,
+            )
         return lookups, annotations
 
-    @staticmethod
-    def stringify_queryset(queryset):
-        sql, params = queryset.query.sql_with_params()
-        with connection.cursor() as cursor:
-            return cursor.mogrify(sql, params).decode()
-
 
 class Article(AbstractLastModifiedModel):
     journal = models.ForeignKey('journal.Journal', blank=True, null=True)
@@ -709,6 +690,14 @@ class Article(AbstractLastModifiedModel):
     # funding
     funders = models.ManyToManyField('Funder', blank=True)
 
+    # The most recent change to the article or the objects it depends upon,
+    # see track_effective_last_modified below
+    effective_last_modified = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+    )
+
     objects = ArticleSearchManager()
 
     class Meta:
@@ -922,26 +911,17 @@ class Article(AbstractLastModifiedModel):
 
     def index_full_text(self):
         """ Indexes the render galley for full text search
+
+        Falls back to the first galley with a supported file type. The text
+        is only extracted again if the galley file has changed.
         :return: A boolean indicating if a file has been processed
         """
-        indexed = False
-
-        # Delete currently indexed article files
-        FileTextModel = swapper.load_model("core", "FileText")
-        current = FileTextModel.objects.filter(file__article_id=self.pk)
-        if current.exists():
-            current.delete()
-
-        # Generate new from best possible galley
-        render_galley = self.get_render_galley
-        if render_galley:
-            indexed = render_galley.file.index_full_text()
-        elif self.galley_set.exists():
-            for galley in self.galley_set.all():
-                indexed = galley.file.index_full_text()
-                if indexed:
-                    break
-        return indexed
+        from core import text_extraction
+
+        stats = text_extraction.index_articles(
+            Article.objects.filter(pk=self.pk), processes=1,
+        )
+        return bool(stats['indexed'] or stats['unchanged'])
 
 
     @property
@@ -1310,7 +1290,7 @@ class Article(AbstractLastModifiedModel):
 
         if self.journal.use_crossref:
             id = id_logic.generate_crossref_doi_with_pattern(self)
-            id.register()
+            id_logic.queue_crossref_doi_registration(id)
 
     def decline_article(self):
         self.date_declined = timezone.now()
@@ -1604,6 +1584,33 @@ class Article(AbstractLastModifiedModel):
         )
 
 
+class ArticleSearchDocument(models.Model):
+    """ The precomputed full text search vectors of an article (postgres)
+
+    Documents are maintained by submission.search, which also documents
+    how the vectors are weighted.
+    """
+    article = models.OneToOneField(
+        'submission.Article',
+        primary_key=True,
+        related_name='search_document',
+        on_delete=models.CASCADE,
+    )
+    document = SearchVectorField(blank=True, null=True)
+    full_text = SearchVectorField(blank=True, null=True)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        required_db_vendor = "postgresql"
+        indexes = [
+            GinIndex(fields=['document'], name='search_document_gin_idx'),
+            GinIndex(fields=['full_text'], name='search_full_text_gin_idx'),
+        ]
+
+    def __str__(self):
+        return 'Search document of article {}'.format(self.article_id)
+
+
 class FrozenAuthor(AbstractLastModifiedModel):
     article = models.ForeignKey('submission.Article', blank=True, null=True)
     author = models.ForeignKey('core.Account', blank=True, null=True)
@@ -2077,3 +2084,40 @@ def order_keywords(sender, instance, action, reverse, model, pk_set, **kwargs):
 
 
 m2m_changed.connect(order_keywords, sender=Article.keywords.through)
+
+
+model_utils.track_effective_last_modified(
+    Article,
+    dependencies={
+        'submission.FrozenAuthor': 'frozenauthor',
+        'submission.KeywordArticle': 'keywordarticle',
+        'submission.PublisherNote': 'publisher_notes',
+        'submission.Section': 'section',
+        'submission.Licence': 'license',
+        'core.Galley': 'galley',
+        'core.File': 'galley__file',
+        'journal.Issue': 'issues',
+    },
+    m2m_dependencies={
+        'submission.KeywordArticle': 'keywords',
+        'submission.Article_publisher_notes': 'publisher_notes',
+        'journal.Issue_articles': 'issues',
+    },
+)
+
+
+search.track_search_documents(
+    Article,
+    indexed_fields=['title', 'abstract'],
+    dependencies={
+        'submission.FrozenAuthor': 'frozenauthor',
+        'submission.KeywordArticle': 'keywordarticle',
+        'submission.Keyword': 'keywords',
+        'core.Galley': 'galley',
+        'core.File': 'galley__file',
+        settings.CORE_FILETEXT_MODEL: 'galley__file__text',
+    },
+    m2m_dependencies={
+        'submission.KeywordArticle': 'keywords',
+    },
+)
@@ -0,0 +1,289 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+Search documents of articles, used for full text search on PostgreSQL.
+
+Each article has a submission.ArticleSearchDocument holding two stored
+tsvectors, both with a GIN index:
+    document:  title (A), keywords (B), author names (C) and abstract (D)
+    full_text: the text of the article's galleys
+
+The metadata weights let a single vector answer searches on any combination
+of fields, by filtering the matched lexemes on their weight. Documents are
+kept up to date by signals whenever the indexed fields of an article change
+or the objects its text comes from are saved or deleted, and can be rebuilt
+with rebuild_search_documents.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import signals
+import swapper
+
+from cron import jobs
+
+# Weight of each search filter in ArticleSearchDocument.document
+DOCUMENT_WEIGHTS = (
+    ('title', 'A'),
+    ('keywords', 'B'),
+    ('authors', 'C'),
+    ('abstract', 'D'),
+)
+# Factors of the D, C, B and A weights when ranking results, which match
+# the relative relevance of abstracts, authors, keywords and titles.
+DOCUMENT_RANK_WEIGHTS = '{0.2, 0.4, 0.4, 1.0}'
+FULL_TEXT_RANK_WEIGHTS = '{0.1, 0.1, 0.1, 0.1}'
+REBUILD_BATCH_SIZE = 500
+
+
+def is_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def _translated_fields(model, field_name):
+    """ Returns the fields of every language of a translated field"""
+    fields = []
+    for language, _name in settings.LANGUAGES:
+        try:
+            fields.append(model._meta.get_field(
+                '{}_{}'.format(field_name, language.replace('-', '_')),
+            ))
+        except FieldDoesNotExist:
+            continue
+    return fields or [model._meta.get_field(field_name)]
+
+
+def _translated_columns(model, field_name):
+    """ Returns the columns of every language of a translated field"""
+    return [field.column for field in _translated_fields(model, field_name)]
+
+
+def _text_vector(sql, weight):
+    return "setweight(to_tsvector(coalesce({}, '')), '{}')".format(sql, weight)
+
+
+def get_update_sql():
+    """ Returns the SQL upserting the search documents of a list of articles,
+    taking the list of article ids as its only parameter
+    """
+    from core import models as core_models
+    from submission import models
+
+    article = models.Article._meta
+    keyword_article = models.KeywordArticle._meta
+    keyword = models.Keyword._meta
+    author = models.FrozenAuthor._meta
+    galley = core_models.Galley._meta
+    file_ = core_models.File._meta
+    FileText = swapper.load_model('core', 'FileText')
+
+    def columns(field_name):
+        return ", ".join(
+            'a.{}'.format(column)
+            for column in _translated_columns(models.Article, field_name)
+        )
+
+    keywords = (
+        "(SELECT string_agg(k.{word}, ' ') FROM {keyword_article} ka "
+        "JOIN {keyword} k ON k.{keyword_pk} = ka.{keyword_fk} "
+        "WHERE ka.{ka_article_fk} = a.{article_pk})"
+    ).format(
+        word=keyword.get_field('word').column,
+        keyword_article=keyword_article.db_table,
+        keyword=keyword.db_table,
+        keyword_pk=keyword.pk.column,
+        keyword_fk=keyword_article.get_field('keyword').column,
+        ka_article_fk=keyword_article.get_field('article').column,
+        article_pk=article.pk.column,
+    )
+    authors = (
+        "(SELECT string_agg(concat_ws(' ', fa.{first_name}, fa.{last_name}), "
+        "' ') FROM {author} fa WHERE fa.{author_article_fk} = a.{article_pk})"
+    ).format(
+        first_name=author.get_field('first_name').column,
+        last_name=author.get_field('last_name').column,
+        author=author.db_table,
+        author_article_fk=author.get_field('article').column,
+        article_pk=article.pk.column,
+    )
+
+    if isinstance(FileText._meta.get_field('contents'), SearchVectorField):
+        # Contents are stored as tsvectors already
+        contents = "string_agg(ft.{contents}::text, ' ')::tsvector"
+    else:
+        contents = "to_tsvector(string_agg(ft.{contents}, ' '))"
+    full_text = (
+        "setweight(coalesce((SELECT " + contents + " FROM {galley} g "
+        "JOIN {file} f ON f.{file_pk} = g.{galley_file_fk} "
+        "JOIN {file_text} ft ON ft.{file_text_pk} = f.{file_text_fk} "
+        "WHERE g.{galley_article_fk} = a.{article_pk}), ''::tsvector), 'D')"
+    ).format(
+        contents=FileText._meta.get_field('contents').column,
+        galley=galley.db_table,
+        file=file_.db_table,
+        file_pk=file_.pk.column,
+        galley_file_fk=galley.get_field('file').column,
+        file_text=FileText._meta.db_table,
+        file_text_pk=FileText._meta.pk.column,
+        file_text_fk=file_.get_field('text').column,
+        galley_article_fk=galley.get_field('article').column,
+        article_pk=article.pk.column,
+    )
+
+    document = " || ".join([
+        _text_vector("concat_ws(' ', {})".format(columns('title')), 'A'),
+        _text_vector(keywords, 'B'),
+        _text_vector(authors, 'C'),
+        _text_vector("concat_ws(' ', {})".format(columns('abstract')), 'D'),
+    ])
+
+    return (
+        "INSERT INTO {table} (article_id, document, full_text, last_updated) "
+        "SELECT a.{article_pk}, {document}, {full_text}, now() "
+        "FROM {article} a WHERE a.{article_pk} = ANY(%s) "
+        "ON CONFLICT (article_id) DO UPDATE SET "
+        "document = EXCLUDED.document, "
+        "full_text = EXCLUDED.full_text, "
+        "last_updated = EXCLUDED.last_updated"
+    ).format(
+        table=models.ArticleSearchDocument._meta.db_table,
+        article_pk=article.pk.column,
+        document=document,
+        full_text=full_text,
+        article=article.db_table,
+    )
+
+
+def update_search_documents(article_ids):
+    """ Builds the search documents of the given articles in one statement
+    :param article_ids: An iterable of Article primary keys
+    """
+    article_ids = list(article_ids)
+    if not article_ids or not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(get_update_sql(), [article_ids])
+
+
+@jobs.job(queue='indexing', priority=jobs.PRIORITY_LOW)
+def update_search_documents_in_background(article_ids):
+    update_search_documents(article_ids)
+
+
+def queue_update(article_ids):
+    """ Updates the search documents of the given articles, as a background
+    job when background jobs are enabled
+    """
+    article_ids = sorted(set(article_ids))
+    if not article_ids or not is_enabled():
+        return
+    ids_hash = hashlib.md5(
+        ','.join(str(pk) for pk in article_ids).encode('utf-8'),
+    ).hexdigest()
+    update_search_documents_in_background.enqueue(
+        article_ids=article_ids,
+        unique_key='search_documents:{}'.format(ids_hash),
+    )
+
+
+def rebuild_search_documents(queryset=None, batch_size=REBUILD_BATCH_SIZE):
+    """ Rebuilds the search documents of every article, in batches
+    :return: The number of documents rebuilt
+    """
+    from submission import models
+
+    if not is_enabled():
+        return 0
+    if queryset is None:
+        queryset = models.Article._base_manager.all()
+    article_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(article_ids), batch_size):
+        update_search_documents(article_ids[i:i + batch_size])
+    return len(article_ids)
+
+
+def track_search_documents(
+        model, indexed_fields, dependencies, m2m_dependencies,
+):
+    """ Keeps the search documents of a model up to date
+    :param model: The Article model
+    :param indexed_fields: The names of the fields of `model` whose content
+        is indexed. Saving an instance only updates its document when one of
+        them has changed since it was loaded.
+    :param dependencies: A dict mapping the labels of the models whose
+        content is indexed to the lookup from `model` to an instance of them
+    :param m2m_dependencies: A dict mapping the labels of the through
+        models of many to many relationships to the lookup from `model` to
+        the other side of the relationship.
+    """
+    def get_article_ids(lookup, instance):
+        return model._base_manager.filter(
+            **{lookup: instance}
+        ).values_list('pk', flat=True)
+
+    attnames = [
+        field.attname
+        for field_name in indexed_fields
+        for field in _translated_fields(model, field_name)
+    ]
+
+    def indexed_values(instance):
+        # Deferred fields are left out rather than loaded
+        return {
+            attname: instance.__dict__[attname]
+            for attname in attnames if attname in instance.__dict__
+        }
+
+    def on_init(sender, instance, **kwargs):
+        instance._search_document_values = indexed_values(instance)
+
+    def on_save(sender, instance, raw=False, created=False, **kwargs):
+        if raw:
+            return
+        values = indexed_values(instance)
+        if created or values != instance._search_document_values:
+            queue_update([instance.pk])
+        instance._search_document_values = values
+
+    def make_dependency_receivers(lookup):
+        def on_dependency_saved(sender, instance, raw=False, **kwargs):
+            if not raw and instance.pk and is_enabled():
+                queue_update(get_article_ids(lookup, instance))
+
+        def before_dependency_deleted(sender, instance, **kwargs):
+            # The relation is gone once deleted, so look the articles up now
+            if is_enabled():
+                instance._search_document_article_ids = list(
+                    get_article_ids(lookup, instance),
+                )
+
+        def on_dependency_deleted(sender, instance, **kwargs):
+            queue_update(getattr(instance, '_search_document_article_ids', []))
+
+        return on_dependency_saved, before_dependency_deleted, on_dependency_deleted
+
+    def on_m2m_changed(sender, instance, action, pk_set, **kwargs):
+        if action not in {'post_add', 'post_remove', 'post_clear'}:
+            return
+        if isinstance(instance, model):
+            queue_update([instance.pk])
+        elif pk_set:
+            queue_update(pk_set)
+
+    # Receivers are closures, so they must be strongly referenced
+    signals.post_init.connect(on_init, sender=model, weak=False)
+    signals.post_save.connect(on_save, sender=model, weak=False)
+    for label, lookup in dependencies.items():
+        saved, before_delete, deleted = make_dependency_receivers(lookup)
+        signals.post_save.connect(saved, sender=label, weak=False)
+        signals.pre_delete.connect(before_delete, sender=label, weak=False)
+        signals.post_delete.connect(deleted, sender=label, weak=False)
+    for label in m2m_dependencies:
+        signals.m2m_changed.connect(on_m2m_changed, sender=label, weak=False)
@@ -3,7 +3,7 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 from dateutil import parser as dateparser
-from mock import Mock
+from mock import Mock, patch
 import os
 
 from django.core.management import call_command
@@ -24,6 +24,7 @@ from submission import (
     forms,
     logic,
     models,
+    search,
 )
 from utils.install import update_xsl_files, update_settings, update_issue_types
 from utils.testing import helpers
@@ -716,6 +717,81 @@ class ArticleSearchTests(TransactionTestCase):
 
         self.assertEqual(result, [article])
 
+    @override_settings(ENABLE_FULL_TEXT_SEARCH=True)
+    def test_search_document_filters_by_weight(self):
+        from django.db import connection
+        if connection.vendor != "postgresql":
+            # Search documents are only maintained on postgres
+            return
+        article = models.Article.objects.create(
+            journal=self.journal_one,
+            title="Calibrating the warp-drive",
+            date_published=dateparser.parse("2020-01-01"),
+            stage=models.STAGE_PUBLISHED,
+        )
+
+        title_results = models.Article.objects.search(
+            "calibrating", {"title": True})
+        abstract_results = models.Article.objects.search(
+            "calibrating", {"abstract": True})
+
+        self.assertEqual(list(title_results), [article])
+        self.assertEqual(list(abstract_results), [])
+
+    @override_settings(ENABLE_FULL_TEXT_SEARCH=True)
+    def test_search_document_updated_with_keywords(self):
+        from django.db import connection
+        if connection.vendor != "postgresql":
+            # Search documents are only maintained on postgres
+            return
+        article = models.Article.objects.create(
+            journal=self.journal_one,
+            title="Testing the search of keywords",
+            date_published=dateparser.parse("2020-01-01"),
+            stage=models.STAGE_PUBLISHED,
+        )
+        keyword = models.Keyword.objects.create(word="crawlways")
+        article.keywords.add(keyword)
+
+        # No rebuild needed, the document follows the keywords
+        queryset = models.Article.objects.search(
+            "crawlways", {"keywords": True})
+
+        self.assertEqual(list(queryset), [article])
+
+    @patch.object(search, "queue_update")
+    def test_search_document_updated_when_indexed_fields_change(
+            self, queue_update,
+    ):
+        article = models.Article.objects.create(
+            journal=self.journal_one,
+            title="Tuning the deflector array",
+        )
+        queue_update.assert_called_once_with([article.pk])
+        queue_update.reset_mock()
+
+        article.title = "Tuning the deflector dish"
+        article.save()
+
+        queue_update.assert_called_once_with([article.pk])
+
+    @patch.object(search, "queue_update")
+    def test_search_document_kept_when_other_fields_change(
+            self, queue_update,
+    ):
+        article = models.Article.objects.create(
+            journal=self.journal_one,
+            title="Tuning the deflector array",
+        )
+        article = models.Article.objects.get(pk=article.pk)
+        queue_update.reset_mock()
+
+        article.stage = models.STAGE_UNDER_REVIEW
+        article.save()
+
+        queue_update.assert_not_called()
+
+
 class FrozenAuthorModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -0,0 +1,116 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+Version numbers of cached data, kept in the database.
+
+Cached values are stored under the version of the data they derive from,
+and a change to that data bumps the version so that they aren't found
+anymore. Unless a shared CACHES backend is configured, django's cache is
+local to each process, so the versions live in the database instead where
+every web worker, cron job and management command sees a bump as soon as it
+is committed.
+
+Versions are read once per request and memoized on it. Versions registered
+with preload are read along with the first version a request asks for, so
+most requests only spend one query on them. Each version also records when
+it last changed, e.g. for the Last-Modified date of cached pages.
+"""
+
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from utils import request_cache
+
+NAMESPACE = 'cache_versions'
+
+_preloaded = set()
+
+
+def preload(*names):
+    """ Registers versions that most requests read"""
+    _preloaded.update(names)
+
+
+def _new_version():
+    # Seeding from the clock guarantees that a version that was lost, e.g.
+    # in a rolled back transaction, is never reused for stale entries.
+    return int(time.time() * 1000)
+
+
+def _create_version(name):
+    from utils.models import CacheVersion
+
+    try:
+        with transaction.atomic():
+            return CacheVersion.objects.create(
+                name=name, version=_new_version(),
+            ).version
+    except IntegrityError:
+        # Created by another process in the meantime
+        return CacheVersion.objects.get(name=name).version
+
+
+def get_versions(names):
+    """ Returns the current version of each of the given names"""
+    from utils.models import CacheVersion
+
+    memo = request_cache.get_cache(NAMESPACE)
+    in_request = memo is not None
+    if not in_request:
+        memo = {}
+    missing = {name for name in names if name not in memo}
+    if missing:
+        if in_request:
+            missing |= _preloaded - set(memo)
+        memo.update(
+            CacheVersion.objects.filter(
+                name__in=missing,
+            ).values_list('name', 'version')
+        )
+        for name in names:
+            if name not in memo:
+                memo[name] = _create_version(name)
+    return [memo[name] for name in names]
+
+
+def get_version(name):
+    return get_versions([name])[0]
+
+
+def get_last_changed(names):
+    """ Returns when each of the given versions last changed, or None for
+    versions that have never been read or bumped
+    """
+    from utils.models import CacheVersion
+
+    dates = dict(
+        CacheVersion.objects.filter(
+            name__in=names,
+        ).values_list('name', 'last_changed')
+    )
+    return [dates.get(name) for name in names]
+
+
+def bump(*names):
+    """ Bumps the given versions, orphaning the values cached under them"""
+    from utils.models import CacheVersion
+
+    memo = request_cache.get_cache(NAMESPACE)
+    for name in names:
+        updated = CacheVersion.objects.filter(
+            name=name,
+        ).update(version=F('version') + 1, last_changed=timezone.now())
+        if not updated:
+            _create_version(name)
+            # In case another process created it before this change
+            CacheVersion.objects.filter(
+                name=name,
+            ).update(version=F('version') + 1, last_changed=timezone.now())
+        if memo is not None:
+            memo.pop(name, None)
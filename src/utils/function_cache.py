@@ -3,24 +3,235 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
+"""
+Memoization of function results in the shared cache.
 
+Results are keyed on the arguments the function is called with: model
+instances by their primary key and last modified date, querysets by their
+SQL. Results can be
+tagged, and invalidating a tag (e.g. when a model is saved) bumps a version
+number that is part of the key of every result carrying it. Tag versions are
+kept in the database, see utils.cache_versions, so that an invalidation is
+seen by every process.
+"""
+
+from collections import Counter, defaultdict
+from functools import wraps
 from hashlib import sha1
+import threading
+import time
 
 from django.core.cache import cache as django_cache
+from django.db.models import Model, signals
+from django.db.models.query import QuerySet
 
+from utils import cache_versions
 
-def cache(seconds=900):
+KEY_PREFIX = 'function_cache'
+# Stands in for a cached None, which django's cache can't tell from a miss
+NONE_RESULT = 'function_cache:none'
+# How long a process waits for another one computing the same result
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+class Uncacheable(Exception):
+    """ Raised by key functions when a call should not be memoized"""
+
+
+def model_tag(obj):
+    """ Returns the invalidation tag of a model instance or class
+    :param obj: A model instance, or a model class for a tag covering all
+        the instances of that model.
+    """
+    if isinstance(obj, Model):
+        return '{}:{}'.format(obj._meta.label_lower, obj.pk)
+    return obj._meta.label_lower
+
+
+# Fields recording when an instance last changed, most thorough first
+MODIFIED_FIELDS = ('effective_last_modified', 'last_modified')
+
+
+def _instance_key(obj):
+    """ Keys an instance on its pk and, where it has one, its last modified
+    date, so that results derived from it are recomputed once it is edited
+    """
+    key = model_tag(obj)
+    for field in MODIFIED_FIELDS:
+        # Read from __dict__ so that deferred fields aren't loaded
+        modified = obj.__dict__.get(field)
+        if modified is not None:
+            return '{}@{}'.format(key, modified.isoformat())
+    return key
+
+
+def _key_part(value):
+    if isinstance(value, Model):
+        if value.pk is None:
+            raise Uncacheable()
+        return _instance_key(value)
+    elif isinstance(value, QuerySet):
+        try:
+            sql = str(value.query)
+        except Exception:
+            # e.g. EmptyResultSet
+            sql = repr(value.query.where)
+        return '{}:{}'.format(value.model._meta.label_lower, sql)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        return '[{}]'.format(','.join(_key_part(item) for item in value))
+    elif isinstance(value, dict):
+        return '{{{}}}'.format(','.join(
+            '{}:{}'.format(key, _key_part(item))
+            for key, item in sorted(value.items())
+        ))
+    return repr(value)
+
+
+def default_key(*args, **kwargs):
+    """ Builds a key from the arguments of a call, using the primary key and
+    last modified date of model instances and the SQL of querysets rather
+    than their str()
+    """
+    return '{}|{}'.format(_key_part(args), _key_part(kwargs))
+
+
+def _tag_version_name(tag):
+    return '{}:tag:{}'.format(KEY_PREFIX, tag)
+
+
+def get_tag_versions(tags):
+    """ Returns the current version of each tag, seeding missing ones"""
+    return cache_versions.get_versions(
+        [_tag_version_name(tag) for tag in tags],
+    )
+
+
+def get_tag_changes(tags):
+    """ Returns when each tag was last invalidated, or None if it never was
+    read or invalidated
+    """
+    return cache_versions.get_last_changed(
+        [_tag_version_name(tag) for tag in tags],
+    )
+
+
+def invalidate_tags(*tags):
+    """ Invalidates every result carrying any of the given tags"""
+    cache_versions.bump(*[_tag_version_name(tag) for tag in tags])
 
-    def do_cache(f):
-        def y(*args, **kwargs):
-            f_module = f.__module__.encode('utf-8')
-            f_name = f.__name__.encode('utf-8')
-            key = sha1(f_module + f_name + str(args).encode('UTF-8') + str(kwargs).encode('UTF-8')).hexdigest()
-            result = django_cache.get(key)
+
+def invalidate_model(sender, instance, **kwargs):
+    """ Signal receiver invalidating the tags of a saved or deleted object"""
+    invalidate_tags(model_tag(instance), model_tag(sender))
+
+
+def invalidate_on_change(*model_labels):
+    """ Invalidates the tags of the given models whenever one is saved or
+    deleted.
+    :param model_labels: Model classes or "app_label.ModelName" strings
+    """
+    for label in model_labels:
+        signals.post_save.connect(invalidate_model, sender=label)
+        signals.post_delete.connect(invalidate_model, sender=label)
+
+
+def _record(name, event):
+    with _stats_lock:
+        _stats[name][event] += 1
+
+
+def get_stats():
+    """ Returns the hits, misses and waits of each memoized function in
+    this process
+    """
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def memoize(seconds=900, key=None, tags=None, cache_none=False):
+    """ Caches the result of a function in the shared cache
+
+    Only one process recomputes a missing result at a time, others wait for
+    it for up to LOCK_WAIT seconds.
+    :param seconds: Timeout of the cached results, None for no timeout
+    :param key: A function taking the same arguments as the memoized one and
+        returning a string identifying the call. Defaults to default_key.
+    :param tags: A list of tags, or a function taking the same arguments as
+        the memoized one and returning a list of tags. See invalidate_tags.
+    :param cache_none: Cache None results too. By default a None result,
+        e.g. an object that doesn't exist yet, is computed again each call.
+    """
+    key_func = key or default_key
+
+    def decorator(f):
+        name = '{}.{}'.format(f.__module__, f.__qualname__)
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            try:
+                call_key = key_func(*args, **kwargs)
+                call_tags = tags(*args, **kwargs) if callable(tags) else tags
+            except Uncacheable:
+                return f(*args, **kwargs)
+
+            if call_tags:
+                call_key = '{}|{}'.format(
+                    call_key, get_tag_versions(call_tags),
+                )
+            cache_key = '{}:{}'.format(
+                KEY_PREFIX,
+                sha1('{}|{}'.format(name, call_key).encode('utf-8')).hexdigest(),
+            )
+
+            result = django_cache.get(cache_key)
+            locked = False
             if result is None:
-                result = f(*args, **kwargs)
-                django_cache.set(key, result, seconds)
+                lock_key = '{}:lock'.format(cache_key)
+                locked = django_cache.add(lock_key, 1, LOCK_TIMEOUT)
+                if not locked:
+                    # Another process is computing it
+                    _record(name, 'waits')
+                    deadline = time.monotonic() + LOCK_WAIT
+                    while result is None and time.monotonic() < deadline:
+                        time.sleep(LOCK_POLL_INTERVAL)
+                        result = django_cache.get(cache_key)
+                        if result is None and not django_cache.get(lock_key):
+                            # Done, but with a result that isn't cached
+                            break
 
+            if result is None:
+                _record(name, 'misses')
+                try:
+                    result = f(*args, **kwargs)
+                    if result is not None:
+                        django_cache.set(cache_key, result, seconds)
+                    elif cache_none:
+                        django_cache.set(cache_key, NONE_RESULT, seconds)
+                finally:
+                    if locked:
+                        django_cache.delete(lock_key)
+                return result
+
+            _record(name, 'hits')
+            if isinstance(result, str) and result == NONE_RESULT:
+                return None
             return result
-        return y
-    return do_cache
+
+        wrapper.cache_name = name
+        return wrapper
+    return decorator
+
+
+def cache(seconds=900):
+    """ Caches the result of a function, except None results, see memoize"""
+    return memoize(seconds=seconds)
@@ -1,13 +1,23 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import gzip
+import io
+import itertools
 import os
 import hashlib
 import hmac
+import re
 from urllib.parse import SplitResult, quote_plus, urlencode
 
+from django import db
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.template.loader import render_to_string
+from django.utils import timezone
 
+from core import files
 from core.middleware import GlobalRequestMiddleware
+from cron import jobs
 from cron.models import Request
 from utils import models, notify_helpers
 from utils.function_cache import cache
@@ -166,9 +176,22 @@ def get_log_entries(object):
     )
 
 
-def generate_sitemap(file, press=None, journal=None, repository=None, issue=None, subject=None):
+SITEMAP_MAX_URLS = 50000
+# File names of issue sitemaps and shards, with their gzipped copy and
+# signature
+ISSUE_SITEMAP_FILE_RE = re.compile(r'^(\d+_sitemap(?:_\d+)?\.xml)(?:\.gz|\.sig)?$')
+
+
+def generate_sitemap(
+        file, press=None, journal=None, repository=None, issue=None,
+        subject=None, sitemaps=None, articles=None,
+):
     """
     Returns a rendered sitemap
+    :param sitemaps: The file names of the issue sitemaps listed by a journal
+        sitemap, worked out from the journal's issues when not given.
+    :param articles: The articles listed by an issue sitemap (shard), all
+        of the issue's published articles when not given.
     """
     template, context = None, None
     if press:
@@ -183,9 +206,15 @@ def generate_sitemap(file, press=None, journal=None, repository=None, issue=None
             'repos': repos,
         }
     elif journal:
+        if sitemaps is None:
+            sitemaps = [
+                name for issue in journal.published_issues
+                for name in get_issue_sitemap_names(issue)
+            ]
         template = 'common/journal_sitemap.xml'
         context = {
             'journal': journal,
+            'sitemaps': sitemaps,
         }
     elif repository:
         template = 'common/repo_sitemap.xml',
@@ -193,9 +222,12 @@ def generate_sitemap(file, press=None, journal=None, repository=None, issue=None
             'repo': repository,
         }
     elif issue:
+        if articles is None:
+            articles = issue.get_sorted_articles()
         template = 'common/issue_sitemap.xml'
         context = {
             'issue': issue,
+            'articles': articles,
         }
     elif subject:
         template = 'common/subject_sitemap.xml'
@@ -221,7 +253,7 @@ def get_sitemap_path(path_parts, file_name):
         *path_parts,
     )
     if not os.path.exists(path):
-        os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
 
     file_path = os.path.join(
         path,
@@ -230,49 +262,213 @@ def get_sitemap_path(path_parts, file_name):
     return file_path
 
 
-def write_journal_sitemap(journal):
-    journal_file_path = get_sitemap_path(
-        path_parts=[journal.code],
-        file_name='sitemap.xml',
+def _read_file(file_path):
+    try:
+        with open(file_path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def get_sitemap_signature(*parts):
+    """ Returns a fingerprint of the data a sitemap is generated from"""
+    return hashlib.sha1(str(parts).encode('utf-8')).hexdigest()
+
+
+def write_sitemap(path_parts, file_name, signature=None, force=False, **kwargs):
+    """
+    Renders and writes a sitemap, along with a gzipped copy, if it changed.
+
+    When a signature is given the sitemap is only rendered if the signature
+    differs from that of the last run, otherwise it is rendered and only
+    written if the content differs from the file on disk.
+    :param path_parts: The directories under files/sitemaps
+    :param file_name: The file name of the sitemap
+    :param signature: A fingerprint from get_sitemap_signature
+    :param force: Regenerate the sitemap even if it is unchanged
+    :param kwargs: Passed to generate_sitemap
+    :return: True if the sitemap was written
+    """
+    file_path = get_sitemap_path(path_parts, file_name)
+    signature_path = '{}.sig'.format(file_path)
+    if signature:
+        signature = signature.encode('utf-8')
+        if (
+            not force
+            and _read_file(signature_path) == signature
+            and os.path.exists(file_path)
+        ):
+            return False
+
+    file = io.StringIO()
+    generate_sitemap(file, **kwargs)
+    content = file.getvalue().encode('utf-8')
+    if not force and not signature and _read_file(file_path) == content:
+        return False
+
+    files.write_file_atomically(file_path, content)
+    files.write_file_atomically('{}.gz'.format(file_path), gzip.compress(content))
+    if signature:
+        files.write_file_atomically(signature_path, signature)
+    return True
+
+
+def get_issue_sitemap_names(issue, num_articles=None):
+    """ Returns the file names of an issue's sitemap, which is split into
+    shards when the issue has more than SITEMAP_MAX_URLS articles.
+    """
+    if num_articles is None:
+        num_articles = issue.get_sorted_articles().count()
+    if num_articles <= SITEMAP_MAX_URLS:
+        return ['{}_sitemap.xml'.format(issue.pk)]
+    num_shards = -(-num_articles // SITEMAP_MAX_URLS)
+    return [
+        '{}_sitemap_{}.xml'.format(issue.pk, shard)
+        for shard in range(1, num_shards + 1)
+    ]
+
+
+def remove_stale_issue_sitemaps(journal, sitemaps):
+    """ Removes the issue sitemaps of a journal that its sitemap no longer
+    lists, such as shards left over when an issue shrinks
+    :param sitemaps: The file names of the issue sitemaps that are listed
+    :return: The names of the files removed
+    """
+    path = os.path.dirname(get_sitemap_path([journal.code], 'sitemap.xml'))
+    removed = []
+    for file_name in sorted(os.listdir(path)):
+        match = ISSUE_SITEMAP_FILE_RE.match(file_name)
+        if match and match.group(1) not in sitemaps:
+            try:
+                os.remove(os.path.join(path, file_name))
+            except FileNotFoundError:
+                continue
+            removed.append(file_name)
+    return removed
+
+
+def write_journal_sitemap(journal, sitemaps=None, force=False):
+    return write_sitemap(
+        [journal.code],
+        'sitemap.xml',
+        force=force,
+        journal=journal,
+        sitemaps=sitemaps,
     )
-    with open(journal_file_path, 'w') as file:
-        generate_sitemap(file, journal=journal)
-        file.close()
 
 
-def write_issue_sitemap(issue):
-    issue_file_path = get_sitemap_path(
-        path_parts=[issue.journal.code],
-        file_name='{}_sitemap.xml'.format(issue.pk),
+def write_issue_sitemap(issue, force=False):
+    """ Writes the sitemap (or sitemap shards) of an issue
+    :return: A tuple of the names of the issue's sitemaps and whether any of
+        them were written
+    """
+    rows = list(
+        issue.get_sorted_articles().prefetch_related(None).values_list(
+            'pk', 'effective_last_modified',
+        )
+    )
+    names = get_issue_sitemap_names(issue, num_articles=len(rows))
+    site_url = issue.journal.site_url()
+    written = False
+    for shard, name in enumerate(names):
+        shard_rows = rows[
+            shard * SITEMAP_MAX_URLS:(shard + 1) * SITEMAP_MAX_URLS
+        ]
+        articles = None
+        if len(names) > 1:
+            articles = issue.get_sorted_articles().filter(
+                pk__in=[pk for pk, _ in shard_rows],
+            )
+        if write_sitemap(
+            [issue.journal.code],
+            name,
+            signature=get_sitemap_signature(
+                site_url, issue.last_modified, shard_rows,
+            ),
+            force=force,
+            issue=issue,
+            articles=articles,
+        ):
+            written = True
+    return names, written
+
+
+def write_repository_sitemap(repository, force=False):
+    return write_sitemap(
+        [repository.code],
+        'sitemap.xml',
+        force=force,
+        repository=repository,
     )
-    with open(issue_file_path, 'w') as file:
-        generate_sitemap(file, issue=issue)
-        file.close()
 
 
-def write_repository_sitemap(repository):
-    repo_file_path = get_sitemap_path(
-        path_parts=[repository.code],
-        file_name='sitemap.xml',
+def write_subject_sitemap(subject, force=False):
+    rows = list(
+        subject.published_preprints().order_by('pk').values_list(
+            'pk', 'date_published',
+        )
+    )
+    return write_sitemap(
+        [subject.repository.code],
+        '{}_sitemap.xml'.format(subject.pk),
+        signature=get_sitemap_signature(subject.repository.site_url(), rows),
+        force=force,
+        subject=subject,
     )
-    with open(repo_file_path, 'w') as file:
-        generate_sitemap(file, repository=repository)
-        file.close()
 
 
-def write_subject_sitemap(subject):
-    subject_file_path = get_sitemap_path(
-        path_parts=[subject.repository.code],
-        file_name='{}_sitemap.xml'.format(subject.pk)
+def write_journal_sitemaps(journal, force=False):
+    """ Writes the sitemap of a journal and those of its issues
+    :return: A list of messages describing what was written
+    """
+    messages = []
+    sitemaps = []
+    for issue in journal.published_issues:
+        names, written = write_issue_sitemap(issue, force=force)
+        if written:
+            messages.append("Generated sitemap for issue {}".format(issue))
+        sitemaps.extend(names)
+    if write_journal_sitemap(journal, sitemaps=sitemaps, force=force):
+        messages.append("Generated sitemap for {}".format(journal.name))
+    for file_name in remove_stale_issue_sitemaps(journal, sitemaps):
+        messages.append("Removed stale sitemap {}".format(file_name))
+    return messages
+
+
+def _write_journal_sitemaps_by_pk(journal_pk, force=False):
+    """ Entry point for the worker processes of write_all_sitemaps"""
+    journal = journal_models.Journal.objects.get(pk=journal_pk)
+    return write_journal_sitemaps(journal, force=force)
+
+
+@jobs.job(queue='sitemaps', priority=jobs.PRIORITY_LOW, concurrency=1)
+def regenerate_journal_sitemaps(journal_id):
+    return _write_journal_sitemaps_by_pk(journal_id)
+
+
+def queue_sitemap_regeneration(**kwargs):
+    """ Event handler regenerating the sitemaps of a journal shortly after
+    an article is published. Publications in quick succession share a job.
+    Without background jobs, sitemaps are left to the generate_sitemaps cron.
+    """
+    article = kwargs.get('article')
+    if not settings.QUEUE_BACKGROUND_JOBS or not article.journal:
+        return
+    regenerate_journal_sitemaps.enqueue(
+        journal_id=article.journal.pk,
+        unique_key='sitemaps:journal:{}'.format(article.journal.pk),
+        run_at=timezone.now() + timedelta(seconds=60),
     )
-    with open(subject_file_path, 'w') as file:
-        generate_sitemap(file, subject=subject)
-        file.close()
 
 
-def write_all_sitemaps(cli=False):
+def write_all_sitemaps(cli=False, force=False, workers=1):
     """
     Utility function that generates and writes all sitemaps to disk in one go.
+
+    Sitemaps whose content hasn't changed since the last run are left alone.
+    :param cli: Print progress
+    :param force: Regenerate every sitemap
+    :param workers: Number of processes journal sitemaps are generated in
     """
     storage_path = os.path.join(
         settings.BASE_DIR,
@@ -286,36 +482,39 @@ def write_all_sitemaps(cli=False):
     press = press_models.Press.objects.all().first()
     journals = journal_models.Journal.objects.all()
     repos = repo_models.Repository.objects.all()
-    file_path = os.path.join(
-        storage_path,
-        'sitemap.xml'
-    )
-    with open(file_path, 'w') as file:
-        generate_sitemap(file, press=press)
-        file.close()
-
-    # Generate Journal Sitemaps
-    for journal in journals:
-        if cli:
-            print("Generating sitemaps for {}".format(journal.name))
-        write_journal_sitemap(journal)
-
-        # Generate Issue Sitemap
-        for issue in journal.published_issues:
+    if write_sitemap([], 'sitemap.xml', force=force, press=press) and cli:
+        print("Generated press sitemap")
+
+    # Generate Journal and Issue Sitemaps
+    journal_pks = list(journals.values_list('pk', flat=True))
+    if workers > 1 and len(journal_pks) > 1:
+        # Connections can't be shared with the worker processes
+        db.connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                _write_journal_sitemaps_by_pk,
+                journal_pks,
+                itertools.repeat(force),
+            )
+            for messages in results:
+                if cli:
+                    for message in messages:
+                        print(message)
+    else:
+        for journal in journals:
+            messages = write_journal_sitemaps(journal, force=force)
             if cli:
-                print("Generating sitemap for issue {}".format(issue))
-            write_issue_sitemap(issue)
+                for message in messages:
+                    print(message)
 
     # Generate Repo Sitemap
     for repo in repos:
-        if cli:
-            print("Generating sitemaps for {}".format(repo.name))
-        write_repository_sitemap(repo)
+        if write_repository_sitemap(repo, force=force) and cli:
+            print("Generated sitemaps for {}".format(repo.name))
 
         for subject in repo.subject_set.all():
-            if cli:
-                print("Generating sitemap for subject {}".format(subject.name))
-            write_subject_sitemap(subject)
+            if write_subject_sitemap(subject, force=force) and cli:
+                print("Generated sitemap for subject {}".format(subject.name))
 
 
 def get_aware_datetime(unparsed_string, use_noon_if_no_time=True):
@@ -0,0 +1,176 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+"""
+Dispatch of outgoing emails.
+
+Each thread (e.g. each job worker) keeps its connection to the mail backend
+open and reuses it for every batch it sends, checking that an idle
+connection is still alive before using it. The sender configuration of each
+journal is read through setting_handler, which caches it until a setting is
+changed, and counters of the messages sent and the time spent sending them
+are kept per process.
+"""
+
+from collections import Counter, namedtuple
+import smtplib
+import threading
+import time
+
+from django.core.mail import get_connection
+
+from core import models as core_models
+from utils import setting_handler
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds after which a connection is replaced rather than reused
+CONNECTION_MAX_AGE = 60 * 5
+# Seconds a connection can sit idle before it is checked before reuse
+CONNECTION_IDLE_CHECK = 30
+
+SenderConfig = namedtuple('SenderConfig', ['from_address', 'reply_to'])
+
+_local = threading.local()
+_stats = Counter()
+_lock = threading.Lock()
+
+
+def get_sender_config(journal):
+    """ Returns the from and reply-to addresses of a journal's emails
+    :param journal: A journal.models.Journal or None for the press
+    :return: SenderConfig
+    """
+    from_address = None
+    if journal:
+        from_address = setting_handler.get_setting(
+            'general', 'from_address', journal,
+        ).value
+    return SenderConfig(
+        from_address,
+        setting_handler.get_setting(
+            'general', 'replyto_address', journal,
+        ).value,
+    )
+
+
+def get_email_subject(subject, journal):
+    """ Returns the subject setting named by subject for a journal, or
+    subject itself if there is no such setting
+    """
+    try:
+        return setting_handler.get_setting(
+            'email_subject', subject, journal,
+        ).value
+    except (
+        core_models.Setting.DoesNotExist,
+        core_models.SettingValue.DoesNotExist,
+    ):
+        return subject
+
+
+def _get_local_connection():
+    return getattr(_local, 'connection', None)
+
+
+def _is_alive(connection):
+    age = time.monotonic() - _local.opened
+    if age > CONNECTION_MAX_AGE:
+        return False
+    idle = time.monotonic() - _local.last_used
+    smtp = getattr(connection, 'connection', None)
+    if smtp is not None and idle > CONNECTION_IDLE_CHECK:
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+    return True
+
+
+def get_mail_connection():
+    """ Returns the open mail connection of the current thread, replacing
+    it if it is too old or no longer responds
+    """
+    connection = _get_local_connection()
+    if connection is not None and not _is_alive(connection):
+        close_connection()
+        connection = None
+
+    if connection is None:
+        connection = get_connection()
+        connection.open()
+        _local.connection = connection
+        _local.opened = _local.last_used = time.monotonic()
+        _record(connections=1)
+    return connection
+
+
+def close_connection():
+    """ Closes the mail connection of the current thread, if any"""
+    connection = _get_local_connection()
+    _local.connection = None
+    if connection is not None:
+        try:
+            connection.close()
+        except (smtplib.SMTPException, OSError) as e:
+            logger.warning('Error closing mail connection: %s', e)
+
+
+def send_messages(messages):
+    """ Sends email messages over the current thread's mail connection
+    :param messages: A list of django.core.mail.EmailMessage
+    :return: The number of messages sent
+    """
+    if not messages:
+        return 0
+    start = time.monotonic()
+    try:
+        try:
+            sent = get_mail_connection().send_messages(messages)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped the connection since it was last checked
+            close_connection()
+            sent = get_mail_connection().send_messages(messages)
+    except Exception:
+        _record(failures=len(messages))
+        close_connection()
+        raise
+    _local.last_used = time.monotonic()
+    _record(
+        messages=sent or 0,
+        batches=1,
+        seconds=_local.last_used - start,
+    )
+    return sent
+
+
+def _record(**counts):
+    with _lock:
+        _stats.update(counts)
+
+
+def get_stats():
+    """ Returns the mail counters of this process, along with the average
+    latency of a batch and the throughput in messages per second
+    """
+    with _lock:
+        stats = {
+            key: _stats.get(key, 0)
+            for key in ('messages', 'batches', 'failures', 'connections',
+                        'seconds')
+        }
+    stats['latency'] = (
+        stats['seconds'] / stats['batches'] if stats['batches'] else 0
+    )
+    stats['throughput'] = (
+        stats['messages'] / stats['seconds'] if stats['seconds'] else 0
+    )
+    return stats
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 
+from core import text_extraction
 from submission.models import Article
 from core.models import File
 
@@ -9,7 +10,9 @@ class Command(BaseCommand):
 
     help = """
         Dumps the text of galley files into the database, which populates the
-        full-text searching indexes
+        full-text searching indexes. Texts are extracted in parallel and only
+        for files that changed since they were last extracted. An interrupted
+        run resumes where it stopped when run again with the same flags.
     """
 
     def add_arguments(self, parser):
@@ -17,31 +20,63 @@ class Command(BaseCommand):
         parser.add_argument('--article-id', type=int)
         parser.add_argument('--file-id', type=int)
         parser.add_argument('--all', action="store_true", default=False)
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help="Number of processes extracting texts, defaults to the "
+                 "number of CPUs",
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=text_extraction.DEFAULT_BATCH_SIZE,
+            help="Number of articles stored per transaction",
+        )
+        parser.add_argument(
+            '--force', action="store_true", default=False,
+            help="Extract texts even from files that haven't changed",
+        )
+        parser.add_argument(
+            '--restart', action="store_true", default=False,
+            help="Ignore the progress of a previous interrupted run",
+        )
 
     def handle(self, *args, **options):
-        errors = []
         if options["file_id"]:
             file_ = File.objects.get(id=options["file_id"])
             file_.index_full_text()
         elif options["article_id"] or options["journal_code"] or options["all"]:
             articles = Article.objects.all()
+            scope = ["all"]
             if options["journal_code"]:
                 articles = articles.filter(journal__code=options["journal_code"])
+                scope = ["journal", options["journal_code"]]
             if options["article_id"]:
                 articles = articles.filter(id=options["article_id"])
+                scope.extend(["article", str(options["article_id"])])
 
-            for article in articles:
-                print(f"Processing Article {article.pk}")
-                try:
-                    article.index_full_text()
-                except Exception as e:
-                    self.stderr.write("%s" % e)
-                    errors.append((article.id, e))
-        if errors:
-            self.stderr.write("Errors Found:")
-            for id, err in errors:
-                self.stderr.write("%d: %s" % (id, repr(err)))
+            checkpoint = text_extraction.get_checkpoint_path(
+                "full_text_{}".format("_".join(scope)),
+            )
+            if options["restart"]:
+                text_extraction.clear_checkpoint(checkpoint)
 
+            stats = text_extraction.index_articles(
+                articles,
+                processes=options["processes"],
+                batch_size=options["batch_size"],
+                force=options["force"],
+                checkpoint=checkpoint,
+                progress=self.print_progress,
+            )
+            if stats["errors"]:
+                self.stderr.write("Errors Found:")
+                for id, err in stats["errors"]:
+                    self.stderr.write("%d: %s" % (id, err))
         else:
             self.stderr.write("At least one filtering flag must be provided")
             self.print_help("manage.py", "dump_file_text_to_db.py")
+
+    def print_progress(self, stats):
+        self.stdout.write(
+            "Processed {articles} articles: {indexed} indexed, {unchanged} "
+            "unchanged, {skipped} without text".format(**stats)
+        )
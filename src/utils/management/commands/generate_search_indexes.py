@@ -29,10 +29,6 @@ class Command(BaseCommand):
     help = "Generates database indexes for full text search (idempotent)"
 
     INDEXING_SQL_TEMPLATES = {
-        # We use GIN over GiST indexes as the former are more performant during
-        # Lookups at the expense of lower build/update performance 
-        # https://www.postgresql.org/docs/current/textsearch-indexes.html
-        "postgresql": "CREATE INDEX {idx_name} ON {table} USING gin({col});",
         "mysql": "CREATE FULLTEXT INDEX {idx_name} on {table}({col});",
     }
 
@@ -41,13 +37,11 @@ class Command(BaseCommand):
             logger.info('Full Text search not enabled')
             return
         cursor = connection.cursor()
-        if connection.vendor in self.INDEXING_SQL_TEMPLATES:
-            if connection.vendor == "postgresql":
-                try:
-                    cursor.execute("CREATE EXTENSION btree_gin;")
-                except ProgrammingError:
-                    pass # Ignore if already exists
-
+        if connection.vendor == "postgresql":
+            # Searches run against the GIN indexed search documents of
+            # articles rather than against each column
+            call_command("rebuild_search_documents")
+        elif connection.vendor in self.INDEXING_SQL_TEMPLATES:
             for table, col in self.get_columns_to_index(connection.vendor):
                 idx_name = f"{col}_ft_idx"
                 sql = self.INDEXING_SQL_TEMPLATES[connection.vendor].format(
@@ -68,8 +62,6 @@ class Command(BaseCommand):
 
     def get_columns_to_index(self, vendor):
         for table, col in FT_SEARCH_COLUMNS:
-            if table == "core_filetext" and vendor =="postgresql":
-                continue
             yield table, col
 
         for table, col in FT_SEARCH_TRANSLATABLE_COLUMNS:
@@ -8,5 +8,24 @@ class Command(BaseCommand):
 
     help = "CLI interface for generating sitemap files."
 
+    def add_arguments(self, parser):
+        """Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument(
+            '--force', action='store_true', default=False,
+            help='Regenerate every sitemap, even those that are unchanged.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of processes used to generate journal sitemaps.',
+        )
+
     def handle(self, *args, **options):
-        logic.write_all_sitemaps(cli=True)
+        logic.write_all_sitemaps(
+            cli=True,
+            force=options['force'],
+            workers=options['workers'],
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models.query import QuerySet
+
+from submission import models
+
+
+class Command(BaseCommand):
+    """ Recalculates the effective last modified date of articles."""
+
+    help = "Recalculates the effective last modified date of articles from " \
+           "their related objects. Only needed for articles that predate " \
+           "the effective_last_modified field, which is otherwise kept up " \
+           "to date as the related objects change."
+
+    def add_arguments(self, parser):
+        """Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('journal_codes', nargs='*', default=None)
+
+    def handle(self, *args, **options):
+        """ Walks the related objects of each article, which is expensive.
+
+        :param args: None
+        :param options: Dictionary containing 'journal_codes'
+        :return: None
+        """
+        articles = models.Article.objects.all()
+        if options.get('journal_codes'):
+            articles = articles.filter(
+                journal__code__in=options['journal_codes'],
+            )
+
+        for article in articles.order_by('pk').iterator():
+            last_modified = article.best_last_modified_date()
+            if last_modified != article.effective_last_modified:
+                QuerySet.update(
+                    models.Article.objects.filter(pk=article.pk),
+                    effective_last_modified=last_modified,
+                )
+        self.stdout.write("Rebuilt effective last modified dates")
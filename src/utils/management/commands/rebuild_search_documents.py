@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from submission import models, search
+
+
+class Command(BaseCommand):
+    """ Rebuilds the full text search documents of articles."""
+
+    help = "Rebuilds the full text search documents of articles (Postgresql " \
+           "only). Documents are otherwise kept up to date as articles and " \
+           "their authors, keywords and galleys change, so this is only " \
+           "needed after upgrading or importing data with raw SQL."
+
+    def add_arguments(self, parser):
+        """Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('journal_codes', nargs='*', default=None)
+        parser.add_argument(
+            '--batch_size', type=int, default=search.REBUILD_BATCH_SIZE,
+            help="Number of articles indexed per query",
+        )
+
+    def handle(self, *args, **options):
+        """ Rebuilds the documents in batches, one query per batch.
+
+        :param args: None
+        :param options: Dictionary containing 'journal_codes' and 'batch_size'
+        :return: None
+        """
+        if not search.is_enabled():
+            self.stdout.write(
+                "Search documents are only used with Postgresql"
+            )
+            return
+
+        articles = models.Article.objects.all()
+        if options.get('journal_codes'):
+            articles = articles.filter(
+                journal__code__in=options['journal_codes'],
+            )
+        rebuilt = search.rebuild_search_documents(
+            articles, batch_size=options['batch_size'],
+        )
+        self.stdout.write("Rebuilt {} search documents".format(rebuilt))
@@ -8,7 +8,7 @@ from django.core.cache import cache
 
 from journal import models as journal_models
 from submission import models as submission_models
-from core import models as core_models, files
+from core import models as core_models, files, galley_cache, xslt
 
 
 class Command(BaseCommand):
@@ -24,6 +24,10 @@ class Command(BaseCommand):
         """
         parser.add_argument('--journal_code')
         parser.add_argument('--folder_path')
+        parser.add_argument(
+            '--no_render', action='store_true', default=False,
+            help="Don't render the updated galleys to HTML",
+        )
 
     def handle(self, *args, **options):
         """ Updates all render galleys from a folder.
@@ -47,6 +51,7 @@ class Command(BaseCommand):
             sys.exit()
 
         article_folders = os.listdir(journal_folder)
+        updated_galleys = []
 
         for folder in article_folders:
             try:
@@ -65,6 +70,7 @@ class Command(BaseCommand):
                         article.render_galley.file.unlink_file()
                         shutil.copyfile(os.path.join(journal_folder, folder, file),
                                         article.render_galley.file.self_article_path())
+                        updated_galleys.append(article.render_galley)
                         print('Existing render galley updated.')
                     else:
                         print('Article does not have a render galley, creating one.')
@@ -87,6 +93,7 @@ class Command(BaseCommand):
 
                         article.render_galley = galley_object
                         article.save()
+                        updated_galleys.append(galley_object)
                         print('New file and galley created.')
                 else:
                     print('No file was found in folder {0}'.format(folder))
@@ -95,3 +102,11 @@ class Command(BaseCommand):
 
         cache.clear()
         print('Cache cleared.')
+
+        if not options.get('no_render'):
+            # Galleys of a journal share stylesheets, which are compiled once
+            for galley in updated_galleys:
+                galley_cache.warm_galley(galley)
+            print('{0} galleys rendered. XSLT stylesheets compiled: {compiled}'
+                  ', reused: {reused}'.format(
+                      len(updated_galleys), **xslt.get_stats()))
@@ -3,7 +3,7 @@ import difflib
 from django.core.management.base import BaseCommand, CommandError
 
 from submission import models
-from core import files, models as core_models
+from core import files, models as core_models, xslt
 
 
 class Command(BaseCommand):
@@ -23,7 +23,8 @@ class Command(BaseCommand):
         )
         parser.add_argument(
             'article_id',
-            help="The article ID against which the test will be run"
+            nargs='+',
+            help="The IDs of the articles against which the test will be run"
         )
 
     def handle(self, *args, **options):
@@ -34,15 +35,27 @@ class Command(BaseCommand):
         :return: None
         """
         try:
-            article = models.Article.objects.get(pk=options["article_id"])
             xsl_file = core_models.XSLFile.objects.get(
                 label=options["xslfile_label"])
-        except models.Article.DoesNotExist:
-            raise CommandError("Couldn't find the article")
-
         except core_models.XSLFile.DoesNotExist:
             raise CommandError("Couldn't find the xsl file")
 
+        articles = models.Article.objects.filter(pk__in=options["article_id"])
+        if len(articles) != len(set(options["article_id"])):
+            raise CommandError("Couldn't find the article")
+
+        for article in articles:
+            self.diff_article(article, xsl_file)
+
+        # Stylesheets are compiled once and reused across articles
+        print("XSLT stylesheets compiled: {compiled}, "
+              "reused: {reused}".format(**xslt.get_stats()))
+
+    def diff_article(self, article, xsl_file):
+        """ Prints the diff between the current render of an article's XML
+        galley and its render with the given XSLFile
+        """
+        print("Article {id}".format(id=article.pk))
         xml_galleys = article.galley_set.filter(
             file__mime_type__in=files.XML_MIMETYPES,
         )
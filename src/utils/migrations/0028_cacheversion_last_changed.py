@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 21:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0027_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cacheversion',
+            name='last_changed',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
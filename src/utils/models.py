@@ -164,6 +164,16 @@ class Version(models.Model):
         return 'Version {number}, upgraded {date}'.format(number=self.number, date=self.date)
 
 
+class CacheVersion(models.Model):
+    """ The version of some cached data, see utils.cache_versions"""
+    name = models.CharField(max_length=255, unique=True)
+    version = models.BigIntegerField()
+    last_changed = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.name, self.version)
+
+
 class Plugin(models.Model):
     name = models.CharField(max_length=200)
     version = models.CharField(max_length=10)
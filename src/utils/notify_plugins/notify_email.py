@@ -1,3 +1,4 @@
+import base64
 import re
 
 from collections import Iterable
@@ -6,10 +7,13 @@ from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.utils.html import strip_tags
 
-from utils import setting_handler
+from cron import jobs
+from utils import mail
 from utils import notify
 
 SANITIZE_FROM_RE = re.compile("\r|\n|\t|\"|<|>|,")
+# Number of messages sent over each connection by send_emails
+BATCH_SIZE = 100
 
 
 def sanitize_from(from_):
@@ -17,13 +21,41 @@ def sanitize_from(from_):
 
 
 def send_email(subject, to, html, journal, request, bcc=None, cc=None, attachment=None, replyto=None):
+    msg = build_email(subject, to, html, journal, request, bcc=bcc, cc=cc, replyto=replyto)
+    return send_message.enqueue(**serialize_message(msg))
 
+
+def send_emails(messages, batch_size=BATCH_SIZE):
+    """ Sends several emails, each batch over a single connection to the
+    mail server
+    :param messages: A list of EmailMultiAlternatives, see build_email
+    :param batch_size: Number of messages sent over each connection
+    """
+    for i in range(0, len(messages), batch_size):
+        send_message_batch.enqueue(
+            messages=[
+                serialize_message(msg) for msg in messages[i:i + batch_size]
+            ],
+        )
+
+
+def get_journal_subject(subject, journal):
+    """ Prefixes an email subject with the journal code, using the journal's
+    custom subject setting if there is one
+    """
+    subject_setting = mail.get_email_subject(subject, journal)
+    return "[{0}] {1}".format(journal.code, subject_setting if subject_setting else subject)
+
+
+def build_email(subject, to, html, journal, request, bcc=None, cc=None, replyto=None):
+
+    sender_config = mail.get_sender_config(journal)
     if journal:
-        from_email = setting_handler.get_setting('general', 'from_address', journal).value
+        from_email = sender_config.from_address
         html = "{0}<br />{1}".format(html, journal.name)
     elif request.repository:
         # fetches the default setting for this email.
-        subject = setting_handler.get_email_subject_setting('email_subject', subject, journal=None)
+        subject = mail.get_email_subject(subject, None)
         from_email = request.press.main_contact
     else:
         from_email = request.press.main_contact
@@ -52,12 +84,8 @@ def send_email(subject, to, html, journal, request, bcc=None, cc=None, attachmen
     if replyto:
         reply_to = replyto
 
-    if not reply_to:
-        custom_reply_to = setting_handler.get_setting(
-            'general', 'replyto_address', journal,
-        ).value
-        if custom_reply_to:
-            reply_to = (custom_reply_to,)
+    if not reply_to and sender_config.reply_to:
+        reply_to = (sender_config.reply_to,)
 
 
     msg = EmailMultiAlternatives(subject, strip_tags(html), full_from_string, to, bcc=bcc, cc=cc, reply_to=reply_to)
@@ -69,7 +97,57 @@ def send_email(subject, to, html, journal, request, bcc=None, cc=None, attachmen
             msg.attach(file.name, file.read(), file.content_type)
             file.close()
 
-    return msg.send()
+    return msg
+
+
+def serialize_message(msg):
+    """ Turns an email message into JSON serialisable keyword arguments for
+    send_message
+    """
+    attachments = []
+    for name, content, mimetype in msg.attachments:
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        attachments.append(
+            (name, base64.b64encode(content).decode('ascii'), mimetype)
+        )
+    return {
+        'subject': msg.subject,
+        'body': msg.body,
+        'from_email': msg.from_email,
+        'to': msg.to,
+        'cc': msg.cc,
+        'bcc': msg.bcc,
+        'reply_to': msg.reply_to,
+        'headers': msg.extra_headers,
+        'alternatives': msg.alternatives,
+        'attachments': attachments,
+    }
+
+
+def deserialize_message(attachments=None, alternatives=None, **kwargs):
+    msg = EmailMultiAlternatives(**kwargs)
+    for content, mimetype in alternatives or []:
+        msg.attach_alternative(content, mimetype)
+    for name, content, mimetype in attachments or []:
+        msg.attach(name, base64.b64decode(content), mimetype)
+    return msg
+
+
+@jobs.job(queue='email', priority=jobs.PRIORITY_HIGH)
+def send_message(**message):
+    """ Sends an email message serialised by serialize_message"""
+    return mail.send_messages([deserialize_message(**message)])
+
+
+@jobs.job(queue='email')
+def send_message_batch(messages):
+    """ Sends email messages serialised by serialize_message, reusing the
+    connection to the mail server
+    """
+    return mail.send_messages(
+        [deserialize_message(**message) for message in messages],
+    )
 
 
 def notify_hook(**kwargs):
@@ -93,13 +171,18 @@ def notify_hook(**kwargs):
     attachment = kwargs.pop('attachment', None)
     request = kwargs.pop('request', None)
     task = kwargs.pop('task', None)
+    # a list the email is added to rather than sent, so that the caller
+    # can send several of them together with send_emails
+    outbox = kwargs.pop('outbox', None)
 
     if request and request.journal:
-        subject_setting = setting_handler.get_email_subject_setting('email_subject', subject, request.journal)
-        subject = "[{0}] {1}".format(request.journal.code, subject_setting if subject_setting else subject)
+        subject = get_journal_subject(subject, request.journal)
 
     # call the method
-    if not task:
+    if outbox is not None:
+        outbox.append(build_email(subject, to, html, request.journal, request, bcc, cc))
+        response = None
+    elif not task:
         response = send_email(subject, to, html, request.journal, request, bcc, cc, attachment)
     else:
         response = send_email(task.email_subject, task.email_to, task.email_html, task.email_journal, request,
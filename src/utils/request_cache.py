@@ -0,0 +1,65 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import threading
+
+# NB: this module should not import any others in the application, so that
+# low level helpers (e.g. utils.setting_handler) can use it freely.
+
+_local = threading.local()
+
+
+def get_cache(namespace):
+    """ Returns the memo dict for the given namespace on the current request
+
+    Returns None when called outside of a request/response cycle (e.g.
+    management commands and cron jobs), in which case callers should not
+    memoize anything.
+    :param namespace: (str) A name identifying the caller
+    :return: dict or None
+    """
+    store = getattr(_local, 'store', None)
+    if store is None:
+        return None
+    return store.setdefault(namespace, {})
+
+
+def clear(namespace=None):
+    """ Drops the memo for a namespace (or all of them) on the current request
+    :param namespace: (str) A name identifying the caller, None for all.
+    """
+    store = getattr(_local, 'store', None)
+    if store is None:
+        return
+    if namespace is None:
+        store.clear()
+    else:
+        store.pop(namespace, None)
+
+
+def activate():
+    _local.store = {}
+
+
+def deactivate():
+    if hasattr(_local, 'store'):
+        del _local.store
+
+
+class RequestCacheMiddleware(object):
+    """ Scopes the request cache to a single request/response cycle.
+
+    It should be the first middleware so that the cache is available to all
+    the others and is always torn down.
+    """
+
+    @staticmethod
+    def process_request(request):
+        activate()
+
+    @staticmethod
+    def process_response(request, response):
+        deactivate()
+        return response
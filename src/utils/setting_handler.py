@@ -6,17 +6,28 @@ __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 import json
 import os
 import codecs
+from hashlib import sha1
 
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache as django_cache
+from django.db.models import Q
 from django.utils import translation
 
 from core import models as core_models
-from utils import models
+from utils import cache_versions, models, request_cache
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+SETTING_CACHE_NAMESPACE = 'setting_handler'
+SETTING_CACHE_VERSION = 'setting_handler'
+
+# Cached in place of a SettingValue when a journal has no value of its own,
+# so that fallbacks to the default don't hit the database either.
+_MISSING = 'setting_handler:missing'
+
+cache_versions.preload(SETTING_CACHE_VERSION)
+
 
 def create_setting(
         setting_group_name,
@@ -83,6 +94,8 @@ def get_setting(
     If not journal is passed it returns the default setting directly. If
     default is True it will attempt t return the base language or the default value
     (in that order).
+    Lookups are memoized for the current request and stored in the shared
+    cache, both are invalidated whenever a SettingValue is saved.
     :setting_group: (str) The group__name of the Setting
     :setting_name: (str) The name of the Setting
     :journal: (Journal object) The journal for which this setting is relevant.
@@ -91,39 +104,208 @@ def get_setting(
     :default: If True, returns the default SettingValue when no journal specific
         value is present
     """
-    setting = core_models.Setting.objects.get(
-        name=setting_name,
-        group__name=setting_group_name,
+    setting_name = str(setting_name)
+    setting_value = _get_cached_setting_value(
+        setting_group_name,
+        setting_name,
+        journal,
     )
-    lang = translation.get_language() if not setting.is_translatable else settings.LANGUAGE_CODE
+    if setting_value != _MISSING:
+        return setting_value
 
-    with translation.override(lang):
-        try:
-            return core_models.SettingValue.objects.get(
-                setting__group__name=setting_group_name,
-                setting=setting,
-                journal=journal,
+    if journal is not None:
+        if create:
+            logger.warning(
+                "Passing 'create' to get_setting has been deprecated in "
+                "in favour of returning the default value"
+            )
+        if default or create:
+            # return press wide setting
+            return get_setting(
+                setting_group_name,
+                setting_name,
+                None,
+                create,
+            )
+        else:
+            return None
+    else:
+        raise core_models.SettingValue.DoesNotExist(
+            "No default value for setting {0}:{1}".format(
+                setting_group_name, setting_name,
+            )
+        )
+
+
+def get_settings(setting_group_name, journal):
+    """
+    Returns the SettingValues of every setting in a group in a single query
+
+    Journal specific values take precedence over the defaults. The results
+    also prime the cache used by get_setting.
+    :setting_group_name: (str) The name of the SettingGroup
+    :journal: (Journal object) The journal for which the settings are
+        relevant. If None, returns the default values
+    :return: A dict of setting name to SettingValue
+    """
+    return get_group_settings([setting_group_name], journal)[setting_group_name]
+
+
+def get_group_settings(setting_group_names, journal):
+    """
+    Returns the SettingValues of every setting in several groups in a
+    single query, see get_settings.
+    :setting_group_names: (list) The names of the SettingGroups
+    :journal: (Journal object) The journal for which the settings are
+        relevant. If None, returns the default values
+    :return: A dict of group name to a dict of setting name to SettingValue
+    """
+    setting_values = core_models.SettingValue.objects.filter(
+        setting__group__name__in=setting_group_names,
+    ).select_related(
+        'setting',
+        'setting__group',
+    )
+    if journal is None:
+        setting_values = setting_values.filter(journal__isnull=True)
+    else:
+        setting_values = setting_values.filter(
+            Q(journal=journal) | Q(journal__isnull=True),
+        )
+
+    defaults = {group_name: {} for group_name in setting_group_names}
+    overrides = {group_name: {} for group_name in setting_group_names}
+    for setting_value in setting_values:
+        group_name = setting_value.setting.group.name
+        if setting_value.journal_id is None:
+            defaults[group_name][setting_value.setting.name] = setting_value
+        else:
+            overrides[group_name][setting_value.setting.name] = setting_value
+
+    to_cache = {}
+    for group_name in setting_group_names:
+        group_defaults = defaults[group_name]
+        group_overrides = overrides[group_name]
+        for name, setting_value in group_defaults.items():
+            to_cache[(group_name, name, None)] = setting_value
+        if journal is not None:
+            for name in set(group_defaults) | set(group_overrides):
+                to_cache[(group_name, name, journal)] = group_overrides.get(
+                    name, _MISSING,
+                )
+    _prime_setting_cache(to_cache)
+
+    return {
+        group_name: dict(defaults[group_name], **overrides[group_name])
+        for group_name in setting_group_names
+    }
+
+
+def invalidate_setting_cache():
+    """
+    Invalidates every cached setting lookup.
+
+    Rather than tracking down every key that could be affected by a change
+    (journals fall back to the default values) the version of the cache is
+    bumped, which orphans all the existing keys. The version is kept in the
+    database so that every process sees the change.
+    """
+    cache_versions.bump(SETTING_CACHE_VERSION)
+    request_cache.clear(SETTING_CACHE_NAMESPACE)
+
+
+def get_setting_cache_version():
+    """ Returns the current version of the setting cache, which changes
+    whenever a setting value is saved. Callers can key their own caches of
+    derived values on it.
+    """
+    return cache_versions.get_version(SETTING_CACHE_VERSION)
+
+
+def _setting_cache_key(version, setting_group_name, setting_name, journal):
+    raw_key = "{0}:{1}:{2}:{3}:{4}".format(
+        version,
+        setting_group_name,
+        setting_name,
+        journal.pk if journal else None,
+        translation.get_language(),
+    )
+    return "setting_handler:{0}".format(
+        sha1(raw_key.encode('utf-8')).hexdigest(),
+    )
+
+
+def _fetch_setting_value(setting_group_name, setting_name, journal):
+    """ Returns the SettingValue for the journal or _MISSING if there is none
+    :raises Setting.DoesNotExist: if the setting itself doesn't exist
+    """
+    try:
+        return core_models.SettingValue.objects.select_related(
+            'setting',
+            'setting__group',
+        ).get(
+            setting__group__name=setting_group_name,
+            setting__name=setting_name,
+            journal=journal,
+        )
+    except core_models.SettingValue.DoesNotExist:
+        # Raises Setting.DoesNotExist for unknown settings
+        core_models.Setting.objects.get(
+            name=setting_name,
+            group__name=setting_group_name,
+        )
+        return _MISSING
+
+
+def _get_cached_setting_value(setting_group_name, setting_name, journal):
+    memo = request_cache.get_cache(SETTING_CACHE_NAMESPACE)
+    memo_key = (
+        setting_group_name,
+        setting_name,
+        journal.pk if journal else None,
+        translation.get_language(),
+    )
+    if memo is not None and memo_key in memo:
+        return memo[memo_key]
+
+    key = _setting_cache_key(
+        get_setting_cache_version(),
+        setting_group_name,
+        setting_name,
+        journal,
+    )
+    setting_value = django_cache.get(key)
+    if setting_value is None:
+        setting_value = _fetch_setting_value(
+            setting_group_name,
+            setting_name,
+            journal,
+        )
+        django_cache.set(key, setting_value, settings.SETTING_CACHE_TIMEOUT)
+
+    if memo is not None:
+        memo[memo_key] = setting_value
+    return setting_value
+
+
+def _prime_setting_cache(setting_values):
+    """ Stores the results of a bulk lookup in both cache tiers
+    :param setting_values: A dict of (group name, setting name, journal) to
+        a SettingValue or _MISSING
+    """
+    memo = request_cache.get_cache(SETTING_CACHE_NAMESPACE)
+    version = get_setting_cache_version()
+    language = translation.get_language()
+    to_cache = {}
+    for (group_name, name, journal), setting_value in setting_values.items():
+        key = _setting_cache_key(version, group_name, name, journal)
+        to_cache[key] = setting_value
+        if memo is not None:
+            memo_key = (
+                group_name, name, journal.pk if journal else None, language,
             )
-        except ObjectDoesNotExist:
-            if journal is not None:
-                if create:
-                    logger.warning(
-                        "Passing 'create' to get_setting has been deprecated in "
-                        "in favour of returning the default value"
-                    )
-                if default or create:
-                    # return press wide setting
-                    journal = None
-                    return get_setting(
-                        setting_group_name,
-                        setting,
-                        journal,
-                        create,
-                    )
-                else:
-                    return None
-            else:
-                raise
+            memo[memo_key] = setting_value
+    django_cache.set_many(to_cache, settings.SETTING_CACHE_TIMEOUT)
 
 
 def get_requestless_setting(setting_group, setting, journal):
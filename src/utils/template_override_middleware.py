@@ -16,7 +16,7 @@ from django.template.loaders.base import Loader as BaseLoader
 from django.utils._os import safe_join
 from django.utils.deprecation import RemovedInDjango20Warning
 
-from utils import setting_handler, function_cache
+from utils import request_cache, setting_handler
 
 _local = threading.local()
 
@@ -35,12 +35,26 @@ class ThemeEngineMiddleware(object):
 
 
 class Loader(BaseLoader):
+    """ Loads templates from the theme of the current site, falling back to
+    the clean theme and then the engine's directories.
+
+    Outside of DEBUG, compiled templates are kept in memory keyed by the
+    theme directories they were looked up in, so each theme has its own
+    cache and switching a journal's theme needs no invalidation.
+    """
+
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.template_cache = {}
 
-    @function_cache.cache(120)
     def query_theme_dirs(self, journal):
+        # get_setting is cached and invalidated when the setting is saved
         return setting_handler.get_setting('general', 'journal_theme', journal).value
 
     def get_theme_dirs(self):
+        memo = request_cache.get_cache('theme_loader')
+        if memo is not None and 'theme_dirs' in memo:
+            return memo['theme_dirs']
 
         if hasattr(_local, 'request'):
 
@@ -68,8 +82,52 @@ class Loader(BaseLoader):
         if settings.DEBUG and hasattr(_local, 'request') and _local.request.GET.get('theme'):
             theme_setting = _local.request.GET.get('theme')
 
-        return [os.path.join(settings.BASE_DIR, 'themes', theme_setting, 'templates'),
-                os.path.join(settings.BASE_DIR, 'themes', 'clean', 'templates')] + self.engine.dirs
+        theme_dirs = [os.path.join(settings.BASE_DIR, 'themes', theme_setting, 'templates'),
+                      os.path.join(settings.BASE_DIR, 'themes', 'clean', 'templates')] + self.engine.dirs
+
+        if memo is not None:
+            memo['theme_dirs'] = theme_dirs
+        return theme_dirs
+
+    def get_template(self, template_name, template_dirs=None, skip=None):
+        """ Returns a compiled template from the in-memory cache, loading it
+        from the theme directories on a miss.
+        """
+        if settings.DEBUG or template_dirs:
+            return super().get_template(template_name, template_dirs, skip)
+
+        theme_dirs = self.get_dirs()
+        key = self.cache_key(template_name, theme_dirs, skip)
+        cached = self.template_cache.get(key)
+        if cached is TemplateDoesNotExist:
+            raise TemplateDoesNotExist(template_name)
+        elif cached is not None:
+            return cached
+
+        try:
+            template = super().get_template(template_name, theme_dirs, skip)
+        except TemplateDoesNotExist:
+            self.template_cache[key] = TemplateDoesNotExist
+            raise
+        self.template_cache[key] = template
+        return template
+
+    @staticmethod
+    def cache_key(template_name, template_dirs, skip=None):
+        skipped = ()
+        if skip:
+            # Templates extending a template with the same name (e.g. a theme
+            # overriding the clean theme) are looked up again with the
+            # extending template skipped.
+            skipped = tuple(
+                origin.name for origin in skip
+                if origin.template_name == template_name
+            )
+        return tuple(template_dirs), template_name, skipped
+
+    def reset(self):
+        """ Empties the template cache (e.g. after installing a theme)"""
+        self.template_cache.clear()
 
     def get_dirs(self):
         return self.get_theme_dirs()
@@ -3,15 +3,32 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
+from datetime import timedelta
+import gzip
 import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
+from django.template import engines, TemplateDoesNotExist
 from django.test import TestCase, override_settings
 from django.utils import timezone
 from django.core import mail
 from django.contrib.contenttypes.models import ContentType
 
-from utils import merge_settings, transactional_emails, models, oidc
+from utils import (
+    function_cache,
+    merge_settings,
+    models,
+    oidc,
+    setting_handler,
+    template_override_middleware,
+    transactional_emails,
+)
+from utils import mail as utils_mail
 from utils.forms import FakeModelForm, KeywordModelForm
+from utils import logic as utils_logic
 from utils.logic import generate_sitemap
 from utils.testing import helpers
 from journal import models as journal_models
@@ -209,6 +226,256 @@ class UtilsTests(TestCase):
         )
 
 
+class TestSitemapWriting(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.press = helpers.create_press()
+        cls.journal, _ = helpers.create_journals()
+        cls.article = helpers.create_submission(
+            journal_id=cls.journal.pk,
+            stage=submission_models.STAGE_PUBLISHED,
+            date_published=timezone.now() - timedelta(days=1),
+        )
+        cls.issue = helpers.create_issue(
+            journal=cls.journal, vol=1, number=1, articles=[cls.article],
+        )
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+
+    def sitemap_path(self, file_name):
+        return os.path.join(
+            self.base_dir, 'files', 'sitemaps', self.journal.code, file_name,
+        )
+
+    def test_issue_sitemap_written_with_gzip_copy(self):
+        with override_settings(BASE_DIR=self.base_dir):
+            names, written = utils_logic.write_issue_sitemap(self.issue)
+
+        self.assertTrue(written)
+        self.assertEqual(names, ['{}_sitemap.xml'.format(self.issue.pk)])
+        with open(self.sitemap_path(names[0]), 'rb') as sitemap:
+            content = sitemap.read()
+        with gzip.open(self.sitemap_path(names[0] + '.gz'), 'rb') as sitemap:
+            self.assertEqual(sitemap.read(), content)
+        self.assertIn(self.article.url.encode('utf-8'), content)
+
+    def test_unchanged_issue_sitemap_is_skipped(self):
+        with override_settings(BASE_DIR=self.base_dir):
+            utils_logic.write_issue_sitemap(self.issue)
+            _, written = utils_logic.write_issue_sitemap(self.issue)
+            self.assertFalse(written)
+
+            self.article.title = 'An updated title'
+            self.article.save()
+            _, written = utils_logic.write_issue_sitemap(self.issue)
+            self.assertTrue(written)
+
+    def test_unchanged_journal_sitemap_is_skipped(self):
+        with override_settings(BASE_DIR=self.base_dir):
+            self.assertTrue(utils_logic.write_journal_sitemap(self.journal))
+            self.assertFalse(utils_logic.write_journal_sitemap(self.journal))
+            self.assertTrue(
+                utils_logic.write_journal_sitemap(self.journal, force=True),
+            )
+
+    @mock.patch('utils.logic.SITEMAP_MAX_URLS', 1)
+    def test_large_issue_sitemap_is_sharded(self):
+        second_article = helpers.create_submission(
+            journal_id=self.journal.pk,
+            stage=submission_models.STAGE_PUBLISHED,
+            date_published=timezone.now() - timedelta(days=1),
+        )
+        self.issue.articles.add(second_article)
+
+        with override_settings(BASE_DIR=self.base_dir):
+            messages = utils_logic.write_journal_sitemaps(self.journal)
+
+        self.assertTrue(messages)
+        expected_names = [
+            '{}_sitemap_1.xml'.format(self.issue.pk),
+            '{}_sitemap_2.xml'.format(self.issue.pk),
+        ]
+        for name in expected_names:
+            self.assertTrue(os.path.exists(self.sitemap_path(name)))
+        with open(self.sitemap_path('sitemap.xml')) as journal_sitemap:
+            content = journal_sitemap.read()
+        for name in expected_names:
+            self.assertIn(name, content)
+
+    def test_stale_issue_sitemaps_are_removed(self):
+        second_article = helpers.create_submission(
+            journal_id=self.journal.pk,
+            stage=submission_models.STAGE_PUBLISHED,
+            date_published=timezone.now() - timedelta(days=1),
+        )
+        self.issue.articles.add(second_article)
+        shards = [
+            '{}_sitemap_1.xml'.format(self.issue.pk),
+            '{}_sitemap_2.xml'.format(self.issue.pk),
+        ]
+
+        with override_settings(BASE_DIR=self.base_dir):
+            with mock.patch('utils.logic.SITEMAP_MAX_URLS', 1):
+                utils_logic.write_journal_sitemaps(self.journal)
+            self.assertTrue(os.path.exists(self.sitemap_path(shards[1])))
+
+            utils_logic.write_journal_sitemaps(self.journal)
+
+        self.assertTrue(os.path.exists(
+            self.sitemap_path('{}_sitemap.xml'.format(self.issue.pk)),
+        ))
+        for shard in shards:
+            for suffix in ('', '.gz', '.sig'):
+                self.assertFalse(
+                    os.path.exists(self.sitemap_path(shard + suffix)),
+                )
+
+
+class TestFunctionCache(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.press = helpers.create_press()
+        cls.journal_one, cls.journal_two = helpers.create_journals()
+
+    def setUp(self):
+        function_cache.reset_stats()
+        self.calls = []
+
+    def test_none_is_cached(self):
+        @function_cache.memoize(60, cache_none=True)
+        def get_nothing(value):
+            self.calls.append(value)
+            return None
+
+        self.assertIsNone(get_nothing('none-is-cached'))
+        self.assertIsNone(get_nothing('none-is-cached'))
+        self.assertEqual(self.calls, ['none-is-cached'])
+        self.assertEqual(
+            function_cache.get_stats()[get_nothing.cache_name],
+            {'misses': 1, 'hits': 1},
+        )
+
+    def test_none_is_not_cached_by_default(self):
+        @function_cache.cache(60)
+        def get_nothing(value):
+            self.calls.append(value)
+            return None
+
+        self.assertIsNone(get_nothing('none-is-not-cached'))
+        self.assertIsNone(get_nothing('none-is-not-cached'))
+        self.assertEqual(
+            self.calls, ['none-is-not-cached', 'none-is-not-cached'],
+        )
+
+    def test_models_keyed_by_pk(self):
+        @function_cache.memoize(60)
+        def get_code(journal):
+            self.calls.append(journal.pk)
+            return journal.code
+
+        self.assertEqual(get_code(self.journal_one), self.journal_one.code)
+        self.assertEqual(get_code(self.journal_two), self.journal_two.code)
+        self.assertEqual(
+            get_code(journal_models.Journal.objects.get(pk=self.journal_one.pk)),
+            self.journal_one.code,
+        )
+        self.assertEqual(self.calls, [self.journal_one.pk, self.journal_two.pk])
+
+    def test_models_keyed_by_last_modified(self):
+        article = helpers.create_article(self.journal_one)
+
+        @function_cache.memoize(60)
+        def get_title(article):
+            self.calls.append(article.pk)
+            return article.title
+
+        get_title(article)
+        article.title = 'A new title'
+        article.save()
+
+        self.assertEqual(get_title(article), 'A new title')
+        self.assertEqual(self.calls, [article.pk, article.pk])
+
+    def test_tag_invalidation_on_save(self):
+        @function_cache.memoize(
+            60, tags=lambda journal: [function_cache.model_tag(journal)],
+        )
+        def get_journal_description(journal):
+            self.calls.append(journal.pk)
+            return journal.description
+
+        function_cache.invalidate_on_change(journal_models.Journal)
+        get_journal_description(self.journal_one)
+        get_journal_description(self.journal_two)
+        self.journal_one.save()
+        get_journal_description(self.journal_one)
+        get_journal_description(self.journal_two)
+
+        self.assertEqual(
+            self.calls,
+            [self.journal_one.pk, self.journal_two.pk, self.journal_one.pk],
+        )
+
+
+class TestMailDispatch(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.press = helpers.create_press()
+        cls.journal_one, cls.journal_two = helpers.create_journals()
+
+    def setUp(self):
+        utils_mail.close_connection()
+        utils_mail.reset_stats()
+
+    def test_sender_config_is_cached_until_settings_change(self):
+        setting_handler.save_setting(
+            'general', 'from_address', self.journal_one, 'one@janeway.systems',
+        )
+        config = utils_mail.get_sender_config(self.journal_one)
+        self.assertEqual(config.from_address, 'one@janeway.systems')
+
+        # Only the version of the setting cache is read, once per setting
+        with self.assertNumQueries(2):
+            utils_mail.get_sender_config(self.journal_one)
+
+        setting_handler.save_setting(
+            'general', 'from_address', self.journal_one, 'new@janeway.systems',
+        )
+        config = utils_mail.get_sender_config(self.journal_one)
+        self.assertEqual(config.from_address, 'new@janeway.systems')
+
+    def test_unknown_email_subject_is_returned_as_is(self):
+        self.assertEqual(
+            utils_mail.get_email_subject('Not a setting', self.journal_one),
+            'Not a setting',
+        )
+
+    def test_connection_is_reused(self):
+        for i in range(3):
+            utils_mail.send_messages([
+                mail.EmailMessage('Subject', 'Body', to=['{}@janeway.systems'.format(i)]),
+                mail.EmailMessage('Subject', 'Body', to=['other@janeway.systems']),
+            ])
+
+        stats = utils_mail.get_stats()
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(stats['messages'], 6)
+        self.assertEqual(stats['batches'], 3)
+        self.assertEqual(stats['connections'], 1)
+
+    def test_expired_connection_is_replaced(self):
+        utils_mail.send_messages([mail.EmailMessage('Subject', 'Body', to=['a@janeway.systems'])])
+        with mock.patch.object(utils_mail, 'CONNECTION_MAX_AGE', -1):
+            utils_mail.send_messages([mail.EmailMessage('Subject', 'Body', to=['a@janeway.systems'])])
+
+        self.assertEqual(utils_mail.get_stats()['connections'], 2)
+
+
 class TestMergeSettings(TestCase):
 
     def test_recursive_merge(self):
@@ -372,3 +639,33 @@ class TestOIDC(TestCase):
             oidc_user.first_name,
             'Andrew',
         )
+
+
+class TestThemeLoader(TestCase):
+
+    def setUp(self):
+        self.loader = template_override_middleware.Loader(
+            engines['django'].engine,
+        )
+
+    @override_settings(DEBUG=False)
+    def test_compiled_templates_are_cached(self):
+        template = self.loader.get_template('404.html')
+
+        self.assertIs(self.loader.get_template('404.html'), template)
+
+    @override_settings(DEBUG=False)
+    def test_missing_templates_are_cached(self):
+        with self.assertRaises(TemplateDoesNotExist):
+            self.loader.get_template('not/a/template.html')
+
+        self.assertIn(
+            TemplateDoesNotExist,
+            self.loader.template_cache.values(),
+        )
+
+    def test_cache_key_depends_on_theme(self):
+        clean_key = self.loader.cache_key('404.html', ['themes/clean'])
+        material_key = self.loader.cache_key('404.html', ['themes/material'])
+
+        self.assertNotEqual(clean_key, material_key)